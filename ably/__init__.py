@@ -21,8 +21,9 @@ requests_log.setLevel(logging.WARNING)
 
 from ably.rest.rest import AblyRest
 from ably.rest.auth import Auth
-from ably.types.capability import Capability
+from ably.types.capability import Capability, FrozenCapability
 from ably.types.channeloptions import ChannelOptions
 from ably.types.options import Options
 from ably.util.crypto import CipherParams
 from ably.util.exceptions import AblyException, AblyAuthException, IncompatibleClientIdException
+from ably.util.exceptions import CircuitOpenException
@@ -0,0 +1,189 @@
+"""Non-blocking HTTP transport for the asyncio client.
+
+Requires Python 3.5+ and aiohttp (``pip install ably[async]``).
+"""
+from __future__ import absolute_import
+
+import asyncio
+import functools
+import json
+import logging
+import time
+
+import aiohttp
+from requests.utils import parse_header_links
+
+from ably.http.http import Http, Response
+from ably.util.exceptions import AblyException, AblyAuthException
+from ably.util.exceptions import CircuitOpenException
+
+log = logging.getLogger(__name__)
+
+
+def reauth_if_expired(func):
+    @functools.wraps(func)
+    async def wrapper(rest, *args, **kwargs):
+        if kwargs.get("skip_auth"):
+            return await func(rest, *args, **kwargs)
+
+        num_tries = 5
+        for i in range(num_tries):
+            try:
+                return await func(rest, *args, **kwargs)
+            except AblyException as e:
+                if (e.code == 40140 and i < (num_tries - 1) and
+                        rest.retry_budget.try_retry()):
+                    await rest.reauth()
+                    continue
+                raise
+    return wrapper
+
+
+class AiohttpResponse(object):
+    """
+    A fully read aiohttp response exposing the parts of the
+    requests.Response interface that `Response` and `AblyException` use
+    """
+
+    def __init__(self, response, content):
+        self.__response = response
+        self.__content = content
+
+    @property
+    def status_code(self):
+        return self.__response.status
+
+    @property
+    def headers(self):
+        return self.__response.headers
+
+    @property
+    def content(self):
+        return self.__content
+
+    @property
+    def text(self):
+        return self.__content.decode(self.__response.charset or 'utf-8')
+
+    @property
+    def links(self):
+        header = self.headers.get('link')
+        if not header:
+            return {}
+        return {link.get('rel') or link.get('url'): link
+                for link in parse_header_links(header)}
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.__content), chunk_size):
+            yield self.__content[start:start + chunk_size]
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self):
+        # the body was read in full, and the connection released
+        pass
+
+
+async def read_response(response, json_backend=None):
+    """Reads the body of an aiohttp response and wraps it in a `Response`"""
+    content = await response.read()
+    return Response(AiohttpResponse(response, content), json_backend)
+
+
+class AsyncHttp(Http):
+    def __init__(self, ably, options):
+        super(AsyncHttp, self).__init__(ably, options)
+        if self.options.hedge_requests:
+            raise ValueError("hedge_requests isn't supported by the asyncio client")
+        self.__session = None
+
+    def _create_session(self):
+        # requests are made with the aiohttp session, see `session`
+        return None
+
+    def pool_stats(self):
+        """Not counted for the aiohttp connections, returns {}"""
+        return {}
+
+    async def reauth(self):
+        try:
+            await self.auth.authorise(force=True)
+        except AblyAuthException as e:
+            if e.code == 40101:
+                e.message = ("The provided token is not renewable and there is"
+                             " no means to generate a new token")
+            raise e
+
+    @reauth_if_expired
+    async def make_request(self, method, path, headers=None, body=None,
+                           native_data=None, skip_auth=False, timeout=None,
+                           stream=False):
+        # the body of the response is always read before it is returned:
+        # with `stream` its items are still decoded one at a time by
+        # Response.iter_native, but from memory
+        body = self._prepare_body(body, native_data)
+        auth_headers = None
+        if not skip_auth:
+            auth_headers = await self.auth._get_auth_headers()
+        all_headers = self._prepare_headers(body, headers, skip_auth,
+                                            auth_headers=auth_headers)
+
+        hosts = self._get_hosts()
+        client_timeout = aiohttp.ClientTimeout(
+            sock_connect=self.http_open_timeout,
+            sock_read=self.http_request_timeout)
+        self.retry_budget.record_request()
+        requested_at = time.time()
+        for retry_count, host in enumerate(hosts):
+            try:
+                breaker = self._circuit_breaker(host, path)
+            except CircuitOpenException as e:
+                # nothing was sent, so go on to the next host at once
+                error = e
+                continue
+            url = self._url_for(host, path)
+            sent_at = time.time()
+            try:
+                async with self.session.request(
+                        method, url, data=body, headers=all_headers,
+                        timeout=client_timeout) as response:
+                    response = await read_response(response, self.json_backend)
+            except Exception as e:
+                self._record_failure(host, breaker)
+                error = e
+            else:
+                try:
+                    AblyException.raise_for_response(response)
+                    self._record_success(host, breaker, time.time() - sent_at)
+                    return response
+                except AblyException as e:
+                    if not e.is_server_error:
+                        self._record_success(host, breaker, time.time() - sent_at)
+                        raise e
+                    self._record_failure(host, breaker)
+                    error = e
+
+            # if last try, or out of time or retry budget, throw exception up
+            delay = self._retry_delay(retry_count, len(hosts), requested_at)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+        raise error
+
+    @property
+    def session(self):
+        """The aiohttp session shared by every request of this client. It
+        is created on first use so it binds to the running event loop.
+        At most `http_pool_maxsize` connections are open to each host."""
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.options.http_pool_maxsize,
+                    force_close=not self.options.keep_alive))
+        return self.__session
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
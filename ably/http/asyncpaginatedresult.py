@@ -0,0 +1,89 @@
+"""PaginatedResult for the asyncio client. Requires Python 3.5+."""
+from __future__ import absolute_import
+
+import asyncio
+import logging
+
+from ably.http.paginatedresult import PaginatedResult
+
+log = logging.getLogger(__name__)
+
+
+class AsyncPaginatedResult(PaginatedResult):
+    """A PaginatedResult whose `first()` and `next()` are coroutines"""
+
+    def iter_items(self, prefetch=1):
+        """Returns an async iterator over the items of this page and of every
+        page after it, see `PaginatedResult.iter_items`. A task fetches up
+        to `prefetch` pages ahead; call `aclose()` on the iterator to stop
+        it when not iterating to the end.
+        """
+        return AsyncItemIterator(self, prefetch)
+
+    async def _get_rel(self, rel_req):
+        page = super(AsyncPaginatedResult, self)._get_rel(rel_req)
+        if page is None:
+            return None
+        return await page
+
+    @classmethod
+    async def paginated_query_with_request(cls, http, request, response_processor):
+        response = await http.request(request)
+        return cls.from_response(http, request, response, response_processor)
+
+
+class AsyncItemIterator(object):
+    def __init__(self, page, prefetch):
+        self.__page = page
+        self.__items = iter(page.items)
+        self.__prefetch = prefetch
+        self.__pages = asyncio.Queue()
+        self.__slots = asyncio.Semaphore(max(prefetch, 1))
+        self.__task = None
+        self.__done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__done:
+            raise StopAsyncIteration
+        if self.__task is None and self.__prefetch >= 1:
+            self.__task = asyncio.ensure_future(self.__fetch())
+        while True:
+            for item in self.__items:
+                return item
+
+            if self.__prefetch < 1:
+                self.__page = await self.__page.next()
+                if self.__page is None:
+                    self.__done = True
+                    raise StopAsyncIteration
+                self.__items = iter(self.__page.items)
+                continue
+
+            page, error = await self.__pages.get()
+            if error is not None:
+                self.__done = True
+                raise error
+            if page is None:
+                self.__done = True
+                raise StopAsyncIteration
+            self.__slots.release()
+            self.__items = iter(page.items)
+
+    async def __fetch(self):
+        page = self.__page
+        try:
+            while page.has_next():
+                await self.__slots.acquire()
+                page = await page.next()
+                self.__pages.put_nowait((page, None))
+        except Exception as e:
+            self.__pages.put_nowait((None, e))
+        else:
+            self.__pages.put_nowait((None, None))
+
+    async def aclose(self):
+        if self.__task is not None:
+            self.__task.cancel()
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """Stops sending requests to a failing endpoint for a while.
+
+    Closed, requests go through and consecutive failures are counted. After
+    `failure_threshold` of them the breaker opens and requests are refused
+    until `reset_timeout` seconds pass. It is then half open: up to
+    `half_open_max_calls` probe requests go through, and the first outcome
+    closes it again or reopens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.__failure_threshold = failure_threshold
+        self.__reset_timeout = reset_timeout
+        self.__half_open_max_calls = half_open_max_calls
+        self.__lock = threading.Lock()
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probes = 0
+
+    def allow_request(self):
+        """Returns whether a request can be sent now. Every allowed request
+        must be followed by `record_success` or `record_failure`."""
+        with self.__lock:
+            if self.__state == self.OPEN:
+                if time.time() - self.__opened_at < self.__reset_timeout:
+                    return False
+                self.__state = self.HALF_OPEN
+                self.__probes = 0
+            if self.__state == self.HALF_OPEN:
+                if self.__probes >= self.__half_open_max_calls:
+                    return False
+                self.__probes += 1
+            return True
+
+    def record_success(self):
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+
+    def record_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if (self.__state == self.HALF_OPEN or
+                    self.__failures >= self.__failure_threshold):
+                self.__state = self.OPEN
+                self.__opened_at = time.time()
+
+    @property
+    def state(self):
+        with self.__lock:
+            if (self.__state == self.OPEN and
+                    time.time() - self.__opened_at >= self.__reset_timeout):
+                return self.HALF_OPEN
+            return self.__state
+
+
+class CircuitBreakers(object):
+    """The circuit breakers of a client, one per host, or per host and kind
+    of request (publish, history, presence, auth or other) with `by_path`.
+    Pass an instance as the `circuit_breakers` option to enable them; it
+    can be shared by several clients."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 half_open_max_calls=1, by_path=False):
+        self.__failure_threshold = failure_threshold
+        self.__reset_timeout = reset_timeout
+        self.__half_open_max_calls = half_open_max_calls
+        self.__by_path = by_path
+        self.__breakers = {}
+        self.__lock = threading.Lock()
+
+    def get(self, host, path):
+        """Returns the breaker for requests to `path` on `host`"""
+        key = (host, self.path_class(path)) if self.__by_path else host
+        breaker = self.__breakers.get(key)
+        if breaker is None:
+            with self.__lock:
+                breaker = self.__breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(self.__failure_threshold,
+                                             self.__reset_timeout,
+                                             self.__half_open_max_calls)
+                    self.__breakers[key] = breaker
+        return breaker
+
+    @staticmethod
+    def path_class(path):
+        path = path.split('?', 1)[0]
+        if path.endswith('/publish') or path == '/messages':
+            return 'publish'
+        if path.endswith('/history'):
+            return 'history'
+        if '/presence' in path:
+            return 'presence'
+        if path.endswith('/requestToken'):
+            return 'auth'
+        return 'other'
+
+    def states(self):
+        """Returns the state of every breaker, keyed by host or by
+        (host, path class)"""
+        with self.__lock:
+            breakers = dict(self.__breakers)
+        return dict((key, breaker.state) for key, breaker in breakers.items())
+
+    @property
+    def by_path(self):
+        return self.__by_path
@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+
+import collections
+import threading
+import time
+
+
+class HostHealthTracker(object):
+    """Remembers how the requests sent to each REST host went, so that
+    requests are sent first to the host most likely to answer quickly.
+
+    Once the primary host fails and a fallback host answers, that fallback
+    is used first for `fallback_retry_timeout` seconds before trying the
+    primary host again. Other hosts are ordered by whether they failed in
+    that period, and then by the average latency of their responses.
+    """
+    # weight of the last response in the latency average
+    latency_weight = 0.3
+    # response times kept for latency_percentile, and needed for it
+    latency_samples = 100
+    min_latency_samples = 20
+
+    def __init__(self, primary_host, fallback_hosts, fallback_retry_timeout):
+        self.__primary_host = primary_host
+        self.__hosts = [primary_host] + list(fallback_hosts)
+        self.__fallback_retry_timeout = fallback_retry_timeout
+        self.__lock = threading.Lock()
+        self.__latency = {}
+        self.__latencies = collections.deque(maxlen=self.latency_samples)
+        self.__failed_at = {}
+        self.__sticky_host = None
+        self.__sticky_until = 0
+
+    def ordered_hosts(self):
+        """Returns every host, the one to try first first"""
+        now = time.time()
+        with self.__lock:
+            recently_failed = set(
+                host for host, failed_at in self.__failed_at.items()
+                if now - failed_at < self.__fallback_retry_timeout)
+            positions = dict((host, i) for i, host in enumerate(self.__hosts))
+
+            def score(host):
+                failed = host in recently_failed
+                return (failed,
+                        self.__failed_at[host] if failed else 0,
+                        host != self.__primary_host,
+                        self.__latency.get(host, 0),
+                        positions[host])
+
+            hosts = sorted(self.__hosts, key=score)
+            if self.__sticky_host is not None and now < self.__sticky_until:
+                hosts.remove(self.__sticky_host)
+                hosts.insert(0, self.__sticky_host)
+        return hosts
+
+    def latency_percentile(self, percentile):
+        """Returns the `percentile` (0 to 100) of the latest response times
+        of any host, or None if too few have been recorded"""
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+        if len(latencies) < self.min_latency_samples:
+            return None
+        index = int(round(percentile / 100.0 * (len(latencies) - 1)))
+        return latencies[index]
+
+    def record_success(self, host, latency):
+        with self.__lock:
+            self.__latencies.append(latency)
+            previous = self.__latency.get(host)
+            if previous is None:
+                self.__latency[host] = latency
+            else:
+                self.__latency[host] = (self.latency_weight * latency +
+                                        (1 - self.latency_weight) * previous)
+            self.__failed_at.pop(host, None)
+            if host != self.__primary_host and self.sticky_host is None:
+                self.__sticky_host = host
+                self.__sticky_until = time.time() + self.__fallback_retry_timeout
+
+    def record_failure(self, host):
+        with self.__lock:
+            self.__failed_at[host] = time.time()
+            if host == self.__sticky_host:
+                self.__sticky_host = None
+
+    @property
+    def primary_host(self):
+        return self.__primary_host
+
+    @property
+    def sticky_host(self):
+        """The fallback host requests go to first, if any"""
+        if self.__sticky_host is not None and time.time() < self.__sticky_until:
+            return self.__sticky_host
+        return None
+
+    @property
+    def fallback_retry_timeout(self):
+        return self.__fallback_retry_timeout
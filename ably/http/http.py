@@ -1,21 +1,31 @@
 from __future__ import absolute_import
 
+import codecs
 import functools
 import itertools
 import logging
+import random
+import threading
 import time
 import json
 
 from six.moves import range
-from six.moves.urllib.parse import urljoin
+from six.moves.urllib.parse import urljoin, urlparse
+
+from concurrent import futures
 
 import requests
+from requests.adapters import HTTPAdapter
 import msgpack
 
 from ably.rest.auth import Auth
+from ably.http.hosthealth import HostHealthTracker
 from ably.http.httputils import HttpUtils
+from ably.http.retrybudget import unlimited_retry_budget
 from ably.transport.defaults import Defaults
 from ably.util.exceptions import AblyException, AblyAuthException
+from ably.util.exceptions import CircuitOpenException
+from ably.util.jsonbackend import get_json_backend
 
 log = logging.getLogger(__name__)
 
@@ -31,7 +41,8 @@ def reauth_if_expired(func):
             try:
                 return func(rest, *args, **kwargs)
             except AblyException as e:
-                if e.code == 40140 and i < (num_tries - 1):
+                if (e.code == 40140 and i < (num_tries - 1) and
+                        rest.retry_budget.try_retry()):
                     rest.reauth()
                     continue
                 raise
@@ -39,15 +50,18 @@ def reauth_if_expired(func):
 
 
 class Request(object):
-    def __init__(self, method='GET', url='/', headers=None, body=None, skip_auth=False):
+    def __init__(self, method='GET', url='/', headers=None, body=None, skip_auth=False,
+                 stream=False):
         self.__method = method
         self.__headers = headers or {}
         self.__body = body
         self.__skip_auth = skip_auth
         self.__url = url
+        self.__stream = stream
 
     def with_relative_url(self, relative_url):
-        return Request(self.method, urljoin(self.url, relative_url), self.headers, self.body, self.skip_auth)
+        return Request(self.method, urljoin(self.url, relative_url), self.headers, self.body, self.skip_auth,
+                       self.stream)
 
     @property
     def method(self):
@@ -69,49 +83,214 @@ class Request(object):
     def skip_auth(self):
         return self.__skip_auth
 
+    @property
+    def stream(self):
+        return self.__stream
+
 
 class Response(object):
     """
     Composition for requests.Response with delegation
     """
+    STREAM_CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, response):
+    def __init__(self, response, json_backend=None):
         self.__response = response
+        self.__json_backend = get_json_backend(json_backend)
 
     def to_native(self):
         content_type = self.__response.headers.get('content-type')
         if content_type == 'application/x-msgpack':
             return msgpack.unpackb(self.__response.content, encoding='utf-8')
         elif content_type == 'application/json':
-            return self.json()
+            return self.__json_backend.loads(self.__response.content)
+        else:
+            raise ValueError("Unsuported content type")
+
+    def iter_native(self):
+        """Yields the elements of an array response one at a time, decoding
+        the body as it is read so the whole of it is never in memory. For
+        this to help the request must have been made with `stream=True`."""
+        content_type = self.__response.headers.get('content-type')
+        chunks = self.__response.iter_content(self.STREAM_CHUNK_SIZE)
+        if content_type == 'application/x-msgpack':
+            return _iter_msgpack_array(chunks)
+        elif content_type == 'application/json':
+            return _iter_json_array(chunks)
         else:
             raise ValueError("Unsuported content type")
 
+    @property
+    def json_backend(self):
+        return self.__json_backend
+
     def __getattr__(self, attr):
         return getattr(self.__response, attr)
 
 
+def _iter_msgpack_array(chunks):
+    unpacker = msgpack.Unpacker(encoding='utf-8')
+
+    def read(operation):
+        while True:
+            try:
+                return operation()
+            except msgpack.OutOfData:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise ValueError("Truncated msgpack response")
+                unpacker.feed(chunk)
+
+    for _ in range(read(unpacker.read_array_header)):
+        yield read(unpacker.unpack)
+
+
+def _iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    # the delimiters allowed before the next element; None when a value is
+    # expected, and ']' also closes an empty array
+    delimiters = '['
+
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf):
+            if buf[pos] == ']' and delimiters in (']', ',]'):
+                return
+            if buf[pos] == ']' and delimiters is None:
+                # rejected by json.loads too
+                raise ValueError("Trailing comma in JSON array")
+            if delimiters is not None and buf[pos] in delimiters:
+                delimiters = ']' if buf[pos] == '[' else None
+                pos += 1
+                continue
+            if delimiters in (None, ']'):
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    pass
+                else:
+                    # a value ending the buffer (a number) may continue
+                    if end < len(buf) or eof:
+                        yield value
+                        pos = end
+                        delimiters = ',]'
+                        continue
+
+        if eof:
+            raise ValueError("Truncated or invalid JSON response")
+        # need more data: read at least as much as is buffered so that an
+        # element spanning many chunks is not parsed again for each one
+        buf = buf[pos:]
+        pos = 0
+        wanted = max(len(buf), 1)
+        received = []
+        while wanted > 0:
+            chunk = next(chunks, None)
+            if chunk is None:
+                received.append(utf8_decoder.decode(b'', final=True))
+                eof = True
+                break
+            text = utf8_decoder.decode(chunk)
+            received.append(text)
+            wanted -= len(text)
+        buf += ''.join(received)
+
+
+def _close_response(future):
+    if (not future.cancelled() and future.exception() is None and
+            future.result() is not None):
+        future.result().close()
+
+
 class Http(object):
     CONNECTION_RETRY_DEFAULTS = {
         'http_open_timeout': 4,
         'http_request_timeout': 15,
         'http_max_retry_count': 3,
         'http_max_retry_duration': 10,
+        'fallback_retry_timeout': 600,
+        'http_retry_backoff': 0.05,
+        'http_retry_backoff_max': 1,
     }
+    # hedge delay used until enough response times have been recorded
+    HEDGE_DEFAULT_DELAY = 1
 
     def __init__(self, ably, options):
         options = options or {}
         self.__ably = ably
         self.__options = options
 
-        self.__session = requests.Session()
+        self.__session = self._create_session()
+        self.__host_adapters = {}
+        self.__host_adapters_lock = threading.Lock()
+        self.__host_health = None
+        self.__hedge_executor = None
+        self.__hedge_executor_lock = threading.Lock()
         self.__auth = None
+        # (auth headers, merged headers) by kind of request
+        self.__default_headers = {}
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.options.http_pool_connections,
+                              pool_maxsize=self.options.http_pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.options.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def _mount_host_adapter(self, url):
+        """Gives the host of `url` a connection pool of its own, so that
+        requests to fallback hosts don't evict the connections kept to the
+        primary one"""
+        parsed = urlparse(url)
+        prefix = '%s://%s/' % (parsed.scheme, parsed.netloc)
+        if prefix in self.__host_adapters:
+            return
+        with self.__host_adapters_lock:
+            if prefix not in self.__host_adapters:
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.options.http_pool_maxsize)
+                self.__session.mount(prefix, adapter)
+                self.__host_adapters[prefix] = adapter
+
+    def pool_stats(self):
+        """Returns counters of the connection pools of the blocking client,
+        keyed by 'scheme://host:port': the connections opened, the requests
+        made, the connections now idle in the pool and the pool size"""
+        stats = {}
+        adapters = set(self.__session.adapters.values())
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                idle = 0
+                maxsize = 0
+                if pool.pool is not None:
+                    idle = len([conn for conn in list(pool.pool.queue)
+                                if conn is not None])
+                    maxsize = pool.pool.maxsize
+                stats['%s://%s:%s' % (pool.scheme, pool.host, pool.port)] = {
+                    'connections': pool.num_connections,
+                    'requests': pool.num_requests,
+                    'idle': idle,
+                    'maxsize': maxsize,
+                }
+        return stats
 
     def dump_body(self, body):
         if self.options.use_binary_protocol:
             return msgpack.packb(body, use_bin_type=False)
         else:
-            return json.dumps(body, separators=(',', ':'))
+            return self.json_backend.dumps(body, compact=True)
 
     def reauth(self):
         try:
@@ -124,76 +303,275 @@ class Http(object):
 
     @reauth_if_expired
     def make_request(self, method, path, headers=None, body=None,
-                     native_data=None, skip_auth=False, timeout=None):
-        fallback_hosts = Defaults.get_fallback_rest_hosts(self.__options)
-        if fallback_hosts:
-            fallback_hosts.insert(0, self.preferred_host)
-            fallback_hosts = itertools.cycle(fallback_hosts)
+                     native_data=None, skip_auth=False, timeout=None,
+                     stream=False):
+        body = self._prepare_body(body, native_data)
+        all_headers = self._prepare_headers(body, headers, skip_auth)
+
+        hosts = self._get_hosts()
+        send_kwargs = {'stream': True} if stream else {}
+        hedged = (method == 'GET' and self.options.hedge_requests and
+                  len(set(hosts)) > 1)
+        # hosts a hedged request was sent to already, not to be retried
+        skip = set()
+        self.retry_budget.record_request()
+        requested_at = time.time()
+        for retry_count, host in enumerate(hosts):
+            if host in skip:
+                skip.remove(host)
+                continue
+            try:
+                if hedged and retry_count == 0:
+                    return self._send_hedged(host, hosts[1], skip, method,
+                                             path, body, all_headers,
+                                             send_kwargs)
+                return self._send(host, method, path, body, all_headers,
+                                  send_kwargs)
+            except CircuitOpenException as e:
+                # nothing was sent, so go on to the next host at once
+                error = e
+                continue
+            except AblyException as e:
+                if not e.is_server_error:
+                    raise e
+                error = e
+            except Exception as e:
+                # Need to catch `Exception`, see:
+                # https://github.com/kennethreitz/requests/issues/1236#issuecomment-133312626
+                error = e
+
+            # if last try, or out of time or retry budget, throw exception up
+            delay = self._retry_delay(retry_count, len(hosts) - len(skip),
+                                      requested_at)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+        raise error
+
+    def _retry_delay(self, retry_count, num_hosts, requested_at):
+        """Returns the seconds to wait after the failed attempt `retry_count`
+        before the next one, or None if there shouldn't be another: it was
+        the last host, http_max_retry_duration would be passed, or the
+        retry budget is spent. The delay is an exponential backoff with
+        full jitter."""
+        if retry_count >= num_hosts - 1:
+            return None
+        backoff = min(self.http_retry_backoff_max,
+                      self.http_retry_backoff * 2 ** retry_count)
+        delay = random.uniform(0, backoff)
+        if time.time() - requested_at + delay > self.http_max_retry_duration:
+            return None
+        if not self.retry_budget.try_retry():
+            log.debug("Retry budget spent, not retrying")
+            return None
+        return delay
+
+    def _send(self, host, method, path, body, headers, send_kwargs):
+        """Makes one attempt of a request on `host`, recording how it went
+        in `host_health` and its circuit breaker. Server errors raise an
+        AblyException, and CircuitOpenException is raised without sending
+        anything while the circuit breaker is open."""
+        url = self._url_for(host, path)
+        self._mount_host_adapter(url)
+        request = requests.Request(method, url, data=body, headers=headers)
+        prepped = self.__session.prepare_request(request)
+        # only once nothing can fail before sending, as a half open breaker
+        # counts the requests it allows until they are recorded
+        breaker = self._circuit_breaker(host, path)
+        sent_at = time.time()
+        try:
+            response = self.__session.send(
+                prepped,
+                timeout=(self.http_open_timeout,
+                         self.http_request_timeout),
+                **send_kwargs)
+        except Exception:
+            self._record_failure(host, breaker)
+            raise
+
+        try:
+            AblyException.raise_for_response(response)
+        except AblyException as e:
+            if e.is_server_error:
+                self._record_failure(host, breaker)
+            else:
+                self._record_success(host, breaker, time.time() - sent_at)
+            raise
+        self._record_success(host, breaker, time.time() - sent_at)
+        return Response(response, self.json_backend)
+
+    def _circuit_breaker(self, host, path):
+        """Returns the circuit breaker of requests to `path` on `host`, None
+        if circuit breakers are disabled, raising CircuitOpenException if
+        the request must not be sent"""
+        breakers = self.options.circuit_breakers
+        if breakers is None:
+            return None
+        breaker = breakers.get(host, path)
+        if not breaker.allow_request():
+            raise CircuitOpenException(
+                "Circuit breaker open for %s, not sending request" % host,
+                503, 50390)
+        return breaker
+
+    def _record_success(self, host, breaker, latency):
+        self.host_health.record_success(host, latency)
+        if breaker is not None:
+            breaker.record_success()
+
+    def _record_failure(self, host, breaker):
+        self.host_health.record_failure(host)
+        if breaker is not None:
+            breaker.record_failure()
+
+    def _send_hedged(self, host, hedge_host, skip, *args):
+        """Sends the request to `host` on the calling thread and, if it
+        hasn't answered after the hedge delay, to `hedge_host` too from
+        `hedge_executor`. The response of `host` is returned unless it
+        failed with a server error, in which case that of `hedge_host` is
+        used if it was asked; a response not used is closed when it arrives,
+        as requests can't be cancelled once sent. If the request was sent to
+        `hedge_host` and failed there too, it is added to `skip` so that it
+        isn't retried."""
+        answered = threading.Event()
+        hedge = self.hedge_executor.submit(
+            self._send_hedge, answered, self.hedge_delay, host, hedge_host,
+            *args)
+        try:
+            response = self._send(host, *args)
+        except Exception as e:
+            answered.set()
+            error = e
+        else:
+            answered.set()
+            hedge.add_done_callback(_close_response)
+            return response
+
+        if isinstance(error, AblyException) and not error.is_server_error:
+            # the other host would answer the same
+            hedge.add_done_callback(_close_response)
+            raise error
+        try:
+            response = hedge.result()
+        except AblyException as e:
+            if not e.is_server_error:
+                raise
+        except Exception:
+            pass
+        else:
+            if response is None:
+                # it wasn't sent
+                raise error
+            return response
+        skip.add(hedge_host)
+        raise error
+
+    def _send_hedge(self, answered, delay, host, hedge_host, *args):
+        """Sends the request to `hedge_host` unless `answered` is set within
+        `delay` seconds or the retry budget is spent, returning its response
+        or None if it wasn't sent"""
+        if answered.wait(delay) or not self.retry_budget.try_retry():
+            return None
+        log.debug("No response from %s yet, also trying %s", host, hedge_host)
+        return self._send(hedge_host, *args)
+
+    @property
+    def hedge_executor(self):
+        """Threads running hedged requests, created on first use"""
+        if self.__hedge_executor is None:
+            with self.__hedge_executor_lock:
+                if self.__hedge_executor is None:
+                    self.__hedge_executor = futures.ThreadPoolExecutor(
+                        max_workers=2 * self.options.http_pool_maxsize)
+        return self.__hedge_executor
+
+    @property
+    def hedge_delay(self):
+        """Seconds to wait for the first host before asking another one:
+        the `hedge_percentile` of recent response times"""
+        delay = self.host_health.latency_percentile(self.options.hedge_percentile)
+        if delay is None:
+            return self.HEDGE_DEFAULT_DELAY
+        return delay
+
+    def _prepare_body(self, body, native_data):
         if native_data is not None and body is not None:
             raise ValueError("make_request takes either body or native_data")
         elif native_data is not None:
             body = self.dump_body(native_data)
-        if body:
-            all_headers = HttpUtils.default_post_headers(
-                self.options.use_binary_protocol)
-        else:
-            all_headers = HttpUtils.default_get_headers(
-                self.options.use_binary_protocol)
+        return body
+
+    def _prepare_headers(self, body, headers, skip_auth, auth_headers=None):
+        """Returns the headers for a request, without auth headers if
+        `skip_auth` is set. `auth_headers` can be passed in by callers that
+        need to obtain them some other way (see AsyncHttp).
 
+        Unless `headers` are given the headers returned are shared by
+        requests of the same kind and credentials, so must not be modified.
+        """
         if not skip_auth:
             if self.auth.auth_mechanism == Auth.Method.BASIC and self.preferred_scheme.lower() == 'http':
                 raise AblyException(
                     "Cannot use Basic Auth over non-TLS connections",
                     401,
                     40103)
-            all_headers.update(self.auth._get_auth_headers())
+            if auth_headers is None:
+                auth_headers = self.auth._get_auth_headers()
+
+        binary = self.options.use_binary_protocol
+        key = (bool(body), binary, skip_auth)
+        cached = self.__default_headers.get(key)
+        if cached is None or cached[0] is not auth_headers:
+            if body:
+                all_headers = HttpUtils.default_post_headers(binary)
+            else:
+                all_headers = HttpUtils.default_get_headers(binary)
+            if auth_headers:
+                all_headers.update(auth_headers)
+            cached = (auth_headers, all_headers)
+            self.__default_headers[key] = cached
+
+        all_headers = cached[1]
         if headers:
+            all_headers = dict(all_headers)
             all_headers.update(headers)
+        return all_headers
 
-        http_open_timeout = self.http_open_timeout
-        http_request_timeout = self.http_request_timeout
-        if fallback_hosts:
-            http_max_retry_count = self.http_max_retry_count
-        else:
-            http_max_retry_count = 1
-        http_max_retry_duration = self.http_max_retry_duration
-        requested_at = time.time()
-        for retry_count in range(http_max_retry_count):
-            host = next(fallback_hosts) if fallback_hosts else self.preferred_host
-            if self.options.environment:
-                host = self.options.environment + '-' + host
-
-            base_url = "%s://%s:%d" % (self.preferred_scheme,
-                                       host,
-                                       self.preferred_port)
-            url = urljoin(base_url, path)
-            request = requests.Request(method, url, data=body, headers=all_headers)
-            prepped = self.__session.prepare_request(request)
-            try:
-                response = self.__session.send(
-                    prepped,
-                    timeout=(http_open_timeout,
-                             http_request_timeout))
-            except Exception as e:
-                # Need to catch `Exception`, see:
-                # https://github.com/kennethreitz/requests/issues/1236#issuecomment-133312626
+    def _get_hosts(self):
+        """Returns the list of hosts to try, in order, one per attempt"""
+        hosts = self.host_health.ordered_hosts()
+        if len(hosts) == 1:
+            return hosts
 
-                # if last try or cumulative timeout is done, throw exception up
-                time_passed = time.time() - requested_at
-                if retry_count == http_max_retry_count - 1 or \
-                   time_passed > http_max_retry_duration:
-                    raise e
-            else:
-                try:
-                    AblyException.raise_for_response(response)
-                    return Response(response)
-                except AblyException as e:
-                    if not e.is_server_error:
-                        raise e
+        hosts = itertools.cycle(hosts)
+        return [next(hosts) for _ in range(self.http_max_retry_count)]
+
+    @property
+    def host_health(self):
+        """The HostHealthTracker ordering the hosts requests are sent to. It
+        is replaced if the host options change."""
+        host_health = self.__host_health
+        if host_health is None or host_health.primary_host != self.preferred_host:
+            host_health = HostHealthTracker(
+                self.preferred_host,
+                Defaults.get_fallback_rest_hosts(self.options),
+                self.fallback_retry_timeout)
+            self.__host_health = host_health
+        return host_health
+
+    def _url_for(self, host, path):
+        if self.options.environment:
+            host = self.options.environment + '-' + host
+
+        base_url = "%s://%s:%d" % (self.preferred_scheme,
+                                   host,
+                                   self.preferred_port)
+        return urljoin(base_url, path)
 
     def request(self, request):
+        kwargs = {'stream': True} if request.stream else {}
         return self.make_request(request.method, request.url, headers=request.headers, body=request.body,
-                                 skip_auth=request.skip_auth)
+                                 skip_auth=request.skip_auth, **kwargs)
 
     def get(self, url, headers=None, skip_auth=False, timeout=None):
         return self.make_request('GET', url, headers=headers, skip_auth=skip_auth, timeout=timeout)
@@ -217,6 +595,10 @@ class Http(object):
     def options(self):
         return self.__options
 
+    @property
+    def json_backend(self):
+        return self.options.json_backend
+
     @property
     def preferred_host(self):
         return Defaults.get_rest_host(self.options)
@@ -252,3 +634,25 @@ class Http(object):
         if self.options.http_max_retry_duration is not None:
             return self.options.http_max_retry_duration
         return self.CONNECTION_RETRY_DEFAULTS['http_max_retry_duration']
+
+    @property
+    def fallback_retry_timeout(self):
+        if self.options.fallback_retry_timeout is not None:
+            return self.options.fallback_retry_timeout
+        return self.CONNECTION_RETRY_DEFAULTS['fallback_retry_timeout']
+
+    @property
+    def http_retry_backoff(self):
+        if self.options.http_retry_backoff is not None:
+            return self.options.http_retry_backoff
+        return self.CONNECTION_RETRY_DEFAULTS['http_retry_backoff']
+
+    @property
+    def http_retry_backoff_max(self):
+        if self.options.http_retry_backoff_max is not None:
+            return self.options.http_retry_backoff_max
+        return self.CONNECTION_RETRY_DEFAULTS['http_retry_backoff_max']
+
+    @property
+    def retry_budget(self):
+        return self.options.retry_budget or unlimited_retry_budget
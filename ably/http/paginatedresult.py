@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
+import collections
 import logging
+import threading
 
 from ably.http.http import Request
 from ably.http.httputils import HttpUtils
@@ -10,13 +12,14 @@ log = logging.getLogger(__name__)
 
 class PaginatedResult(object):
     def __init__(self, http, items, content_type, rel_first, rel_next,
-                 response_processor):
+                 response_processor, response=None):
         self.__http = http
         self.__items = items
         self.__content_type = content_type
         self.__rel_first = rel_first
         self.__rel_next = rel_next
         self.__response_processor = response_processor
+        self.__response = response
 
     @property
     def items(self):
@@ -32,26 +35,112 @@ class PaginatedResult(object):
         return not self.has_next()
 
     def first(self):
-        return self.__get_rel(self.__rel_first) if self.__rel_first else None
+        return self._get_rel(self.__rel_first)
 
     def next(self):
-        return self.__get_rel(self.__rel_next) if self.__rel_next else None
-
-    def __get_rel(self, rel_req):
+        return self._get_rel(self.__rel_next)
+
+    def iter_items(self, prefetch=1):
+        """Yields the items of this page and of every page after it.
+
+        A background thread follows the `next` links and decodes up to
+        `prefetch` pages ahead of the page being consumed, so fetching
+        overlaps with processing while memory stays bounded. With a
+        `prefetch` of 0 pages are fetched one by one as they are needed.
+        """
+        if prefetch < 1:
+            page = self
+            while page is not None:
+                for item in page.items:
+                    yield item
+                page = page.next()
+            return
+
+        condition = threading.Condition()
+        # (page, error) fetched ahead, the last with a page of None
+        pages = collections.deque()
+        # set once the consumer is done, py2 has no nonlocal
+        stopped = []
+
+        def fetch():
+            page = self
+            try:
+                while page.has_next():
+                    with condition:
+                        # wait for the consumer to take a page, or to stop
+                        while len(pages) >= prefetch and not stopped:
+                            condition.wait()
+                        if stopped:
+                            return
+                    page = page.next()
+                    with condition:
+                        if stopped:
+                            page.close()
+                            return
+                        pages.append((page, None))
+                        condition.notify_all()
+                result = (None, None)
+            except Exception as e:
+                result = (None, e)
+            with condition:
+                pages.append(result)
+                condition.notify_all()
+
+        thread = threading.Thread(target=fetch, name='ably-prefetch')
+        thread.daemon = True
+        thread.start()
+        try:
+            for item in self.items:
+                yield item
+            while True:
+                with condition:
+                    while not pages:
+                        condition.wait()
+                    page, error = pages.popleft()
+                    condition.notify_all()
+                if error is not None:
+                    raise error
+                if page is None:
+                    return
+                for item in page.items:
+                    yield item
+        finally:
+            with condition:
+                stopped.append(True)
+                left = list(pages)
+                pages.clear()
+                condition.notify_all()
+            # pages fetched with stream=True hold a connection until read
+            for page, error in left:
+                if page is not None:
+                    page.close()
+
+    def close(self):
+        """Closes the response of this page. A page fetched with
+        `stream=True` keeps its connection until its items are read or it
+        is closed."""
+        if self.__response is not None:
+            self.__response.close()
+
+    def _get_rel(self, rel_req):
         if rel_req is None:
             return None
-        return PaginatedResult.paginated_query_with_request(self.__http, rel_req, self.__response_processor)
+        return self.paginated_query_with_request(self.__http, rel_req, self.__response_processor)
 
-    @staticmethod
-    def paginated_query(http, url, headers, response_processor):
+    @classmethod
+    def paginated_query(cls, http, url, headers, response_processor, stream=False):
         headers = headers or {}
-        req = Request(method='GET', url=url, headers=headers, body=None, skip_auth=False)
-        return PaginatedResult.paginated_query_with_request(http, req, response_processor)
+        req = Request(method='GET', url=url, headers=headers, body=None, skip_auth=False,
+                      stream=stream)
+        return cls.paginated_query_with_request(http, req, response_processor)
 
-    @staticmethod
-    def paginated_query_with_request(http, request, response_processor):
+    @classmethod
+    def paginated_query_with_request(cls, http, request, response_processor):
         response = http.request(request)
+        return cls.from_response(http, request, response, response_processor)
 
+    @classmethod
+    def from_response(cls, http, request, response, response_processor):
         items = response_processor(response)
 
         content_type = response.headers['Content-Type']
@@ -70,5 +159,5 @@ class PaginatedResult(object):
         else:
             next_rel_request = None
 
-        return PaginatedResult(http, items, content_type, first_rel_request,
-                               next_rel_request, response_processor)
+        return cls(http, items, content_type, first_rel_request,
+                   next_rel_request, response_processor, response)
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+
+class RetryBudget(object):
+    """Limits retries to a fraction of the requests made, so that when
+    Ably is having trouble clients don't multiply the load on it.
+
+    A token bucket: every request adds `ratio` tokens, and
+    `min_retries_per_second` are added as time passes so that clients
+    making few requests can still retry. Each retry takes a whole token.
+    The bucket holds at most `max_tokens`, which bounds the burst of
+    retries when failures start.
+    """
+
+    def __init__(self, ratio=0.1, min_retries_per_second=1, max_tokens=10):
+        self.__ratio = ratio
+        self.__min_retries_per_second = min_retries_per_second
+        self.__max_tokens = max_tokens
+        self.__tokens = max_tokens
+        self.__updated_at = time.time()
+        self.__lock = threading.Lock()
+
+    def record_request(self):
+        with self.__lock:
+            self.__deposit(self.__ratio)
+
+    def try_retry(self):
+        """Takes a token for a retry, returning False if there is none"""
+        with self.__lock:
+            self.__deposit(0)
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
+
+    def __deposit(self, tokens):
+        now = time.time()
+        tokens += (now - self.__updated_at) * self.__min_retries_per_second
+        self.__updated_at = now
+        self.__tokens = min(self.__max_tokens, self.__tokens + tokens)
+
+    @property
+    def tokens(self):
+        return self.__tokens
+
+    @property
+    def ratio(self):
+        return self.__ratio
+
+    @property
+    def min_retries_per_second(self):
+        return self.__min_retries_per_second
+
+    @property
+    def max_tokens(self):
+        return self.__max_tokens
+
+
+class UnlimitedRetryBudget(object):
+    """The budget of clients that weren't given a RetryBudget, which
+    allows every retry"""
+
+    def record_request(self):
+        pass
+
+    def try_retry(self):
+        return True
+
+
+unlimited_retry_budget = UnlimitedRetryBudget()
@@ -0,0 +1,189 @@
+"""Auth for the asyncio client. Requires Python 3.5+."""
+from __future__ import absolute_import
+
+import asyncio
+import inspect
+import logging
+import weakref
+
+from ably.http.asynchttp import read_response
+from ably.rest.auth import Auth
+from ably.types.tokendetails import TokenDetails
+
+__all__ = ["AsyncAuth"]
+
+log = logging.getLogger(__name__)
+
+
+class AsyncAuth(Auth):
+    """Auth whose network bound operations are coroutines.
+
+    `auth_callback` may be a plain function or a coroutine function.
+    """
+
+    def __init__(self, ably, options):
+        super(AsyncAuth, self).__init__(ably, options)
+        self.__pending_token = None
+
+    async def authorise(self, token_params=None, auth_options=None, force=False):
+        token_params, auth_options, force = self._prepare_authorise(
+            token_params, auth_options, force)
+
+        if self._can_use_cached_token(force):
+            return self.token_details
+
+        return await self._acquire_token(token_params, auth_options)
+
+    async def _acquire_token(self, token_params, auth_options, join=True):
+        """Requests and stores a new token, coroutines needing one while
+        it is requested waiting for it, see `Auth._acquire_token`"""
+        pending = self.__pending_token
+        if (join and pending is not None and
+                pending[:2] == (token_params, auth_options)):
+            return await asyncio.shield(pending[2])
+
+        future = asyncio.get_event_loop().create_future()
+        self.__pending_token = (token_params, auth_options, future)
+        stale = self.token_details
+        try:
+            token_details = self._store_token_details(
+                await self._obtain_token(token_params, auth_options, stale),
+                renewed=None if join else stale)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieved, as there may be no one waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(token_details)
+            return token_details
+        finally:
+            if self.__pending_token is not None and self.__pending_token[2] is future:
+                self.__pending_token = None
+
+    async def _obtain_token(self, token_params, auth_options, stale):
+        """See `Auth._obtain_token`. The token store is used from the
+        default executor, as its methods may block."""
+        store = self.auth_options.token_store
+        if store is None:
+            return await self.request_token(token_params, **auth_options)
+
+        loop = asyncio.get_event_loop()
+        key = self._token_store_key(token_params, auth_options)
+        token_details = await loop.run_in_executor(
+            None, self._stored_token, store, key, stale)
+        if token_details is not None:
+            return token_details
+        lock = store.lock(key)
+        locked = await loop.run_in_executor(None, self._lock_token_store, lock)
+        try:
+            token_details = await loop.run_in_executor(
+                None, self._stored_token, store, key, stale)
+            if token_details is None:
+                token_details = await self.request_token(token_params, **auth_options)
+                await loop.run_in_executor(
+                    None, self._put_stored_token, store, key, token_details)
+        finally:
+            if locked:
+                await loop.run_in_executor(None, self._unlock_token_store, lock)
+        return token_details
+
+    def _start_renewal(self, delay):
+        """Returns the handle of a call to `_renew_token` scheduled on the
+        running event loop after `delay` seconds"""
+        auth_ref = weakref.ref(self)
+
+        def renew():
+            auth = auth_ref()
+            if auth is not None:
+                asyncio.ensure_future(auth._renew_token())
+
+        return asyncio.get_event_loop().call_later(delay, renew)
+
+    async def _renew_token(self):
+        token_params, auth_options = self._renewal_params()
+        try:
+            await self._acquire_token(token_params, auth_options, join=False)
+        except Exception:
+            log.warning("Background token renewal failed", exc_info=True)
+
+    async def request_token(self, token_params=None,
+                            # auth_options
+                            key_name=None, key_secret=None, auth_callback=None,
+                            auth_url=None, auth_method=None, auth_headers=None,
+                            auth_params=None, query_time=None):
+        (token_params, key_name, key_secret, auth_callback, auth_url,
+         auth_method, auth_headers, auth_params, query_time) = \
+            self._resolve_request_token_options(
+                token_params, key_name, key_secret, auth_callback, auth_url,
+                auth_method, auth_headers, auth_params, query_time)
+
+        if auth_callback:
+            log.debug("using token auth with authCallback")
+            token_request = auth_callback(token_params)
+            if inspect.isawaitable(token_request):
+                token_request = await token_request
+        elif auth_url:
+            log.debug("using token auth with authUrl")
+
+            token_request = await self.token_request_from_auth_url(
+                auth_method, auth_url, token_params, auth_headers, auth_params)
+        else:
+            token_request = await self.create_token_request(
+                token_params, key_name=key_name, key_secret=key_secret,
+                query_time=query_time)
+
+        token_request = self._token_details_or_request(token_request)
+        if isinstance(token_request, TokenDetails):
+            return token_request
+
+        response = await self.ably.http.post(
+            self._token_path(token_request),
+            headers=auth_headers,
+            native_data=token_request.to_dict(),
+            skip_auth=True
+        )
+        return self._token_details_from_response(response)
+
+    async def create_token_request(self, token_params=None,
+                                   key_name=None, key_secret=None, query_time=None):
+        token_params = token_params or {}
+        key_name, key_secret = self._resolve_key(key_name, key_secret)
+
+        if token_params.get('timestamp'):
+            timestamp = token_params['timestamp']
+        else:
+            if query_time is None:
+                query_time = self.auth_options.query_time
+            if query_time:
+                timestamp = await self.ably.time()
+            else:
+                timestamp = self._timestamp()
+
+        return self._build_token_request(token_params, key_name, key_secret,
+                                         timestamp)
+
+    async def token_request_from_auth_url(self, method, url, token_params,
+                                          headers, auth_params):
+        params, body = self._auth_url_params(method, token_params, auth_params)
+        # unlike requests, aiohttp refuses None values
+        params = {k: v for k, v in params.items() if v is not None}
+        body = {k: v for k, v in body.items() if v is not None}
+
+        async with self.ably.http.session.request(
+                method, url, headers=headers, params=params,
+                data=body) as response:
+            response = await read_response(response)
+
+        return self._token_request_from_auth_url_response(response)
+
+    async def _get_auth_headers(self):
+        if self.auth_mechanism == Auth.Method.BASIC:
+            return self._basic_auth_headers()
+        else:
+            if self._token_needs_authorise():
+                await self.authorise()
+            return self._token_auth_headers()
@@ -0,0 +1,139 @@
+"""Channels for the asyncio client. Requires Python 3.5+."""
+from __future__ import absolute_import
+
+import asyncio
+import logging
+import time
+
+from ably.http.asyncpaginatedresult import AsyncPaginatedResult
+from ably.rest.channel import Channel, Channels
+from ably.rest.publishbuffer import PublishBuffer
+from ably.types.presence import Presence
+from ably.util.asyncutils import catch_all
+
+log = logging.getLogger(__name__)
+
+
+class AsyncPresence(Presence):
+    async def get(self, limit=None):
+        return await AsyncPaginatedResult.paginated_query(
+            self.http,
+            self._get_path(limit),
+            {},
+            self._presence_response_handler())
+
+    async def history(self, limit=None, direction=None, start=None, end=None):
+        return await AsyncPaginatedResult.paginated_query(
+            self.http,
+            self._history_path(limit, direction, start, end),
+            {},
+            self._presence_response_handler()
+        )
+
+
+class AsyncPublishBuffer(PublishBuffer):
+    """PublishBuffer for the asyncio client: futures are asyncio futures and
+    requests are sent by tasks on the event loop rather than a thread"""
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncPublishBuffer, self).__init__(*args, **kwargs)
+        self.__timer = None
+        self.__tasks = set()
+
+    def _new_future(self):
+        return asyncio.get_event_loop().create_future()
+
+    def _wake(self):
+        if self._is_full() or self._closed:
+            self.__send_next_batch()
+        elif self.__timer is None:
+            delay = self._pending_since + self.linger - time.time()
+            self.__timer = asyncio.get_event_loop().call_later(
+                max(delay, 0), self.__send_next_batch)
+
+    def __send_next_batch(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if not self._pending:
+            return
+        task = asyncio.ensure_future(self._send(self._take_batch()))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        if self._pending:
+            self._wake()
+
+    async def _send(self, batch):
+        try:
+            response = await self.channel.ably.http.post(
+                self.channel._publish_path, body=self._request_body(batch))
+        except Exception as e:
+            self._fail(batch, e)
+        else:
+            self._succeed(batch, response)
+
+    async def flush(self, timeout=None):
+        while self._pending:
+            self.__send_next_batch()
+        if self.__tasks:
+            __, pending = await asyncio.wait(set(self.__tasks), timeout=timeout)
+            return not pending
+        return True
+
+    async def close(self, timeout=None):
+        result = await self.flush(timeout)
+        self._detach()
+        return result
+
+    def _detach(self):
+        self._closed = True
+        while self._pending:
+            self.__send_next_batch()
+
+
+class AsyncChannel(Channel):
+    presence_class = AsyncPresence
+    publish_buffer_class = AsyncPublishBuffer
+
+    @catch_all
+    async def history(self, direction=None, limit=None, start=None, end=None, timeout=None,
+                      lazy=False):
+        """Returns the history for this channel, see `Channel.history` for
+        `lazy`"""
+        return await AsyncPaginatedResult.paginated_query(
+            self.ably.http,
+            self._history_path(direction, limit, start, end),
+            None,
+            self._message_response_handler(lazy=lazy)
+        )
+
+    @catch_all
+    async def publish(self, name=None, data=None, client_id=None,
+                      messages=None, timeout=None):
+        """Publishes a message on this channel.
+
+        Takes the same parameters as `Channel.publish`. With `batch_publish`
+        enabled the message joins the channel buffer and this returns once
+        the request carrying it is done, so concurrent calls share requests.
+        """
+        if self.publish_buffer is not None:
+            futures = self.publish_buffer.add(
+                self._messages_to_publish(name, data, client_id, messages))
+            responses = await asyncio.gather(*futures)
+            return responses if messages else responses[0]
+
+        return await self.ably.http.post(
+            self._publish_path,
+            body=self._publish_body(name, data, client_id, messages),
+            timeout=timeout
+            )
+
+    async def flush(self, timeout=None):
+        """Waits until the messages buffered by `publish` have been sent"""
+        if self.publish_buffer is None:
+            return True
+        return await self.publish_buffer.flush(timeout)
+
+
+class AsyncChannels(Channels):
+    channel_class = AsyncChannel
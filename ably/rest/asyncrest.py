@@ -0,0 +1,77 @@
+"""Ably Rest client running on an asyncio event loop.
+
+Requires Python 3.5+ and aiohttp (``pip install ably[async]``).
+"""
+from __future__ import absolute_import
+
+import logging
+
+from ably.http.asynchttp import AsyncHttp
+from ably.http.asyncpaginatedresult import AsyncPaginatedResult
+from ably.rest.asyncauth import AsyncAuth
+from ably.rest.asyncchannel import AsyncChannels
+from ably.rest.rest import AblyRest
+from ably.types.stats import make_stats_response_processor
+from ably.util.asyncutils import catch_all
+from ably.util.exceptions import AblyException
+
+log = logging.getLogger(__name__)
+
+
+class AsyncAblyRest(AblyRest):
+    """Ably Rest Client for asyncio
+
+    Takes the same arguments as `AblyRest`. Every method that talks to Ably
+    is a coroutine, and all requests share one pooled aiohttp session, so
+    many requests can be in flight on a single event loop thread. Call
+    `close()` (or use it as an async context manager) when done.
+    """
+    http_class = AsyncHttp
+    auth_class = AsyncAuth
+    channels_class = AsyncChannels
+
+    @catch_all
+    async def stats(self, direction=None, start=None, end=None, params=None,
+                    limit=None, paginated=None, unit=None, timeout=None):
+        """Returns the stats for this application"""
+        url = self._stats_path(direction, start, end, params, limit, unit)
+
+        stats_response_processor = make_stats_response_processor(
+            self.options.use_binary_protocol)
+
+        return await AsyncPaginatedResult.paginated_query(
+            self.http, url, None, stats_response_processor)
+
+    @catch_all
+    async def time(self, timeout=None):
+        """Returns the current server time in ms since the unix epoch"""
+        r = await self.http.get('/time', skip_auth=True, timeout=timeout)
+        return self._time_from_response(r)
+
+    @catch_all
+    async def publish_batch(self, batch, timeout=None):
+        """Publishes messages on several channels, see
+        `AblyRest.publish_batch`"""
+        results = {}
+        requests = self._batch_publish(batch, results)
+        outcome = None
+        while True:
+            try:
+                body = requests.send(outcome)
+            except StopIteration:
+                return results
+            try:
+                outcome = await self.http.post('/messages', body=body,
+                                                timeout=timeout)
+            except Exception as e:
+                outcome = e
+
+    async def close(self):
+        self.auth.stop_token_renewal()
+        await self.http.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excinfo):
+        await self.close()
@@ -1,16 +1,21 @@
 from __future__ import absolute_import
 
 import base64
+import hashlib
+import json
 import logging
+import threading
 import time
 import uuid
+import weakref
+
+from concurrent import futures
 
 import six
 import requests
 
-from ably.types.capability import Capability
 from ably.types.tokendetails import TokenDetails
-from ably.types.tokenrequest import TokenRequest
+from ably.types.tokenrequest import TokenRequest, TokenRequestFactory
 from ably.util.exceptions import AblyException, IncompatibleClientIdException
 
 __all__ = ["Auth"]
@@ -33,6 +38,15 @@ class Auth(object):
         self.__basic_credentials = None
         self.__auth_params = None
         self.__token_details = None
+        self.__renew_with = None
+        self.__renewal = None
+        self.__renewal_lock = threading.Lock()
+        self.__pending_token = None
+        self.__pending_token_lock = threading.Lock()
+        # (token_details, credentials, headers) of the current token
+        self.__token_auth = None
+        self.__basic_auth_headers = None
+        self.__token_request_factory = None
 
         must_use_token_auth = options.use_token_auth is True
         must_not_use_token_auth = options.use_token_auth is False
@@ -74,6 +88,125 @@ class Auth(object):
                              "auth_callback, auth_url, key, token or a TokenDetail")
 
     def authorise(self, token_params=None, auth_options=None, force=False):
+        token_params, auth_options, force = self._prepare_authorise(
+            token_params, auth_options, force)
+
+        if self._can_use_cached_token(force):
+            return self.__token_details
+
+        return self._acquire_token(token_params, auth_options, force=force)
+
+    def _acquire_token(self, token_params, auth_options, join=True, force=False):
+        """Requests and stores a new token. Threads needing one while
+        another is being requested with the same parameters wait for that
+        one instead of each requesting their own, and get its error if it
+        fails. Background renewals don't `join`, as the token being
+        requested may be the one they renew."""
+        with self.__pending_token_lock:
+            pending = self.__pending_token
+            if (join and pending is not None and
+                    pending[:2] == (token_params, auth_options)):
+                future = pending[2]
+                leader = False
+            elif join and not force and self._can_use_cached_token(force):
+                # obtained by another thread since this one checked
+                return self.__token_details
+            else:
+                future = futures.Future()
+                self.__pending_token = (token_params, auth_options, future)
+                leader = True
+        if not leader:
+            return future.result()
+
+        stale = self.__token_details
+        try:
+            token_details = self._store_token_details(
+                self._obtain_token(token_params, auth_options, stale),
+                renewed=None if join else stale)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(token_details)
+            return token_details
+        finally:
+            with self.__pending_token_lock:
+                if self.__pending_token is not None and self.__pending_token[2] is future:
+                    self.__pending_token = None
+
+    def _obtain_token(self, token_params, auth_options, stale):
+        """Returns a valid token other than `stale` from the token store,
+        if any, otherwise requests one and puts it there"""
+        store = self.auth_options.token_store
+        if store is None:
+            return self.request_token(token_params, **auth_options)
+
+        key = self._token_store_key(token_params, auth_options)
+        token_details = self._stored_token(store, key, stale)
+        if token_details is not None:
+            return token_details
+        lock = store.lock(key)
+        locked = self._lock_token_store(lock)
+        try:
+            # it may have been requested while waiting for the lock
+            token_details = self._stored_token(store, key, stale)
+            if token_details is None:
+                token_details = self.request_token(token_params, **auth_options)
+                self._put_stored_token(store, key, token_details)
+        finally:
+            if locked:
+                self._unlock_token_store(lock)
+        return token_details
+
+    @staticmethod
+    def _token_store_key(token_params, auth_options):
+        params = dict((k, v) for k, v in token_params.items()
+                      if k not in ('timestamp', 'nonce', 'mac'))
+        source = [auth_options.get('key_name'), auth_options.get('auth_url'),
+                  auth_options.get('auth_params'), params]
+        source = json.dumps(source, sort_keys=True, default=six.text_type)
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def _stored_token(self, store, key, stale):
+        try:
+            token_details = store.get(key)
+        except Exception:
+            log.warning("Failed to read token store", exc_info=True)
+            return None
+        if (token_details is None or
+                token_details.is_expired(self._timestamp()) or
+                (stale is not None and token_details.token == stale.token)):
+            return None
+        return token_details
+
+    @staticmethod
+    def _put_stored_token(store, key, token_details):
+        try:
+            store.set(key, token_details)
+        except Exception:
+            log.warning("Failed to write token store", exc_info=True)
+
+    @staticmethod
+    def _lock_token_store(lock):
+        """Returns whether `lock` was acquired. Without it the token is
+        requested anyway."""
+        try:
+            return lock.acquire()
+        except Exception:
+            log.warning("Failed to lock token store", exc_info=True)
+            return False
+
+    @staticmethod
+    def _unlock_token_store(lock):
+        """Releases `lock`, logging rather than raising failures (e.g. a
+        lock that expired meanwhile), which would otherwise replace the
+        token obtained"""
+        try:
+            lock.release()
+        except Exception:
+            log.warning("Failed to unlock token store", exc_info=True)
+
+    def _prepare_authorise(self, token_params, auth_options, force):
         self.__auth_mechanism = Auth.Method.TOKEN
 
         if token_params is None:
@@ -89,28 +222,141 @@ class Auth(object):
             self.auth_options.merge(auth_options)
         auth_options = dict(self.auth_options.auth_options)
         token_params.setdefault('client_id', self.client_id)
-
-        if self.__token_details:
-            if not self.__token_details.is_expired(self._timestamp()):
-                if not force:
-                    log.debug(
-                        "using cached token; expires = %d",
-                        self.__token_details.expires
-                    )
-                    return self.__token_details
-            else:
-                # token has expired
-                self.__token_details = None
-
-        self.__token_details = self.request_token(token_params, **auth_options)
+        self.__renew_with = (token_params, auth_options)
+        return token_params, auth_options, force
+
+    def _can_use_cached_token(self, force):
+        # an expired token is left in place rather than cleared, as another
+        # thread may be storing its replacement
+        token_details = self.__token_details
+        if (token_details and not force and
+                not token_details.is_expired(self._timestamp())):
+            log.debug("using cached token; expires = %s", token_details.expires)
+            return True
+        return False
+
+    def _store_token_details(self, token_details, renewed=None):
+        """Makes `token_details` the token used. `renewed` is the token it
+        replaces when it was obtained by a background renewal."""
+        self.__token_details = token_details
         self._configure_client_id(self.__token_details.client_id)
-        return self.__token_details
+        self._schedule_renewal(token_details, renewed)
+        return token_details
+
+    def _schedule_renewal(self, token_details, renewed=None):
+        """With `token_renew_fraction` set, arranges for a new token to be
+        requested once that fraction of the life of `token_details` has
+        passed, replacing any renewal scheduled before. Requests keep using
+        the current token meanwhile, and it is replaced only once the new
+        one is obtained."""
+        delay = self._renewal_delay(token_details)
+        if (delay is not None and renewed is not None and
+                token_details.expires is not None and
+                renewed.expires is not None and
+                token_details.expires <= renewed.expires):
+            # e.g. an auth_callback returning a cached token, which would
+            # be renewed again straight away
+            log.warning("Background token renewal got a token expiring no "
+                        "later, not renewing it in the background")
+            delay = None
+        with self.__renewal_lock:
+            if self.__renewal is not None:
+                self.__renewal.cancel()
+                self.__renewal = None
+            if delay is not None:
+                log.debug("renewing token in %.1fs", delay)
+                self.__renewal = self._start_renewal(delay)
+
+    def _renewal_delay(self, token_details):
+        """Returns the seconds after which `token_details` is renewed in
+        the background, None if it isn't"""
+        fraction = self.auth_options.token_renew_fraction
+        if (fraction is None or self.__renew_with is None or
+                token_details.expires is None or not self._can_renew()):
+            return None
+        now = self._timestamp()
+        issued = token_details.issued or now
+        renew_at = issued + fraction * (token_details.expires - issued)
+        # before the token is considered expired, when requests would block
+        # on getting a new one
+        renew_at = min(renew_at, token_details.expires -
+                       TokenDetails.TOKEN_EXPIRY_BUFFER)
+        return max(0, renew_at - now) / 1000.0
+
+    def _can_renew(self):
+        return bool(self.auth_options.auth_callback or
+                    self.auth_options.auth_url or
+                    self.auth_options.key_secret)
+
+    def _start_renewal(self, delay):
+        """Returns a started timer calling `_renew_token` after `delay`
+        seconds, which doesn't keep the client alive"""
+        timer = threading.Timer(delay, _renew_token, (weakref.ref(self),))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _renew_token(self):
+        token_params, auth_options = self._renewal_params()
+        try:
+            self._acquire_token(token_params, auth_options, join=False)
+        except Exception:
+            # the current token is used until it expires, then requests
+            # get a new one themselves
+            log.warning("Background token renewal failed", exc_info=True)
+
+    def _renewal_params(self):
+        """Returns the token params and auth options of the last authorise"""
+        token_params, auth_options = self.__renew_with
+        return dict(token_params), dict(auth_options)
+
+    def stop_token_renewal(self):
+        """Cancels the background renewal of the token, if any"""
+        with self.__renewal_lock:
+            if self.__renewal is not None:
+                self.__renewal.cancel()
+                self.__renewal = None
 
     def request_token(self, token_params=None,
                       # auth_options
                       key_name=None, key_secret=None, auth_callback=None,
                       auth_url=None, auth_method=None, auth_headers=None,
                       auth_params=None, query_time=None):
+        (token_params, key_name, key_secret, auth_callback, auth_url,
+         auth_method, auth_headers, auth_params, query_time) = \
+            self._resolve_request_token_options(
+                token_params, key_name, key_secret, auth_callback, auth_url,
+                auth_method, auth_headers, auth_params, query_time)
+
+        if auth_callback:
+            log.debug("using token auth with authCallback")
+            token_request = auth_callback(token_params)
+        elif auth_url:
+            log.debug("using token auth with authUrl")
+
+            token_request = self.token_request_from_auth_url(
+                auth_method, auth_url, token_params, auth_headers, auth_params)
+        else:
+            token_request = self.create_token_request(
+                token_params, key_name=key_name, key_secret=key_secret,
+                query_time=query_time)
+
+        token_request = self._token_details_or_request(token_request)
+        if isinstance(token_request, TokenDetails):
+            return token_request
+
+        response = self.ably.http.post(
+            self._token_path(token_request),
+            headers=auth_headers,
+            native_data=token_request.to_dict(),
+            skip_auth=True
+        )
+        return self._token_details_from_response(response)
+
+    def _resolve_request_token_options(self, token_params, key_name,
+                                       key_secret, auth_callback, auth_url,
+                                       auth_method, auth_headers, auth_params,
+                                       query_time):
         token_params = token_params or {}
         token_params = dict(self.auth_options.default_token_params,
                             **token_params)
@@ -132,39 +378,32 @@ class Auth(object):
         auth_headers = auth_headers or self.auth_options.auth_headers or {}
 
         log.debug("Token Params: %s" % token_params)
-        if auth_callback:
-            log.debug("using token auth with authCallback")
-            token_request = auth_callback(token_params)
-        elif auth_url:
-            log.debug("using token auth with authUrl")
+        return (token_params, key_name, key_secret, auth_callback, auth_url,
+                auth_method, auth_headers, auth_params, query_time)
 
-            token_request = self.token_request_from_auth_url(
-                auth_method, auth_url, token_params, auth_headers, auth_params)
-        else:
-            token_request = self.create_token_request(
-                token_params, key_name=key_name, key_secret=key_secret,
-                query_time=query_time)
+    @staticmethod
+    def _token_details_or_request(token_request):
+        """Converts whatever an auth_callback or auth_url returned into either
+        a TokenDetails or a TokenRequest that still has to be exchanged"""
         if isinstance(token_request, TokenDetails):
             return token_request
         elif isinstance(token_request, dict) and 'issued' in token_request:
             return TokenDetails.from_dict(token_request)
         elif isinstance(token_request, dict):
-            token_request = TokenRequest(**token_request)
+            return TokenRequest(**token_request)
         elif isinstance(token_request, six.text_type):
             return TokenDetails(token=token_request)
         # python2
         elif isinstance(token_request, six.binary_type) and six.binary_type == str:
             return TokenDetails(token=token_request)
+        return token_request
 
-        token_path = "/keys/%s/requestToken" % token_request.key_name
-
-        response = self.ably.http.post(
-            token_path,
-            headers=auth_headers,
-            native_data=token_request.to_dict(),
-            skip_auth=True
-        )
+    @staticmethod
+    def _token_path(token_request):
+        return "/keys/%s/requestToken" % token_request.key_name
 
+    @staticmethod
+    def _token_details_from_response(response):
         AblyException.raise_for_response(response)
         response_dict = response.to_native()
         log.debug("Token: %s" % str(response_dict.get("token")))
@@ -173,58 +412,62 @@ class Auth(object):
     def create_token_request(self, token_params=None,
                              key_name=None, key_secret=None, query_time=None):
         token_params = token_params or {}
-        token_request = {}
-
-        key_name = key_name or self.auth_options.key_name
-        key_secret = key_secret or self.auth_options.key_secret
-        if not key_name or not key_secret:
-            log.debug('key_name or key_secret blank')
-            raise AblyException("No key specified: no means to generate a token", 401, 40101)
+        key_name, key_secret = self._resolve_key(key_name, key_secret)
 
-        token_request['key_name'] = key_name
         if token_params.get('timestamp'):
-            token_request['timestamp'] = token_params['timestamp']
+            timestamp = token_params['timestamp']
         else:
             if query_time is None:
                 query_time = self.auth_options.query_time
             if query_time:
-                token_request['timestamp'] = self.ably.time()
+                timestamp = self.ably.time()
             else:
-                token_request['timestamp'] = self._timestamp()
-
-        token_request['timestamp'] = int(token_request['timestamp'])
+                timestamp = self._timestamp()
 
-        token_request['ttl'] = token_params.get('ttl') or TokenDetails.DEFAULTS['ttl']
+        return self._build_token_request(token_params, key_name, key_secret,
+                                         timestamp)
 
-        if token_params.get('capability') is None:
-            token_request["capability"] = ""
-        else:
-            token_request['capability'] = six.text_type(
-                Capability(token_params['capability'])
-            )
-
-        token_request["client_id"] = (
-            token_params.get('client_id') or self.client_id)
-
-        # Note: There is no expectation that the client
-        # specifies the nonce; this is done by the library
-        # However, this can be overridden by the client
-        # simply for testing purposes
-        token_request["nonce"] = token_params.get('nonce') or self._random_nonce()
-
-        token_request = TokenRequest(**token_request)
+    def _resolve_key(self, key_name, key_secret):
+        key_name = key_name or self.auth_options.key_name
+        key_secret = key_secret or self.auth_options.key_secret
+        if not key_name or not key_secret:
+            log.debug('key_name or key_secret blank')
+            raise AblyException("No key specified: no means to generate a token", 401, 40101)
+        return key_name, key_secret
+
+    def _build_token_request(self, token_params, key_name, key_secret,
+                             timestamp):
+        factory = self._token_request_factory(key_name, key_secret)
+        token_request = factory.create(
+            ttl=token_params.get('ttl') or TokenDetails.DEFAULTS['ttl'],
+            capability=token_params.get('capability'),
+            client_id=token_params.get('client_id') or self.client_id,
+            timestamp=timestamp,
+            # Note: There is no expectation that the client
+            # specifies the nonce; this is done by the library
+            # However, this can be overridden by the client
+            # simply for testing purposes
+            nonce=token_params.get('nonce') or self._random_nonce())
 
-        if token_params.get('mac') is None:
+        if token_params.get('mac') is not None:
             # Note: There is no expectation that the client
             # specifies the mac; this is done by the library
             # However, this can be overridden by the client
             # simply for testing purposes.
-            token_request.sign_request(key_secret.encode('utf8'))
-        else:
             token_request.mac = token_params['mac']
 
         return token_request
 
+    def _token_request_factory(self, key_name, key_secret):
+        """Returns the TokenRequestFactory signing with the key, kept while
+        the same key is used"""
+        factory = self.__token_request_factory
+        if factory is None or factory[0] != (key_name, key_secret):
+            factory = ((key_name, key_secret), TokenRequestFactory(
+                key_name=key_name, key_secret=key_secret))
+            self.__token_request_factory = factory
+        return factory[1]
+
     @property
     def ably(self):
         return self.__ably
@@ -248,9 +491,20 @@ class Auth(object):
     @property
     def token_credentials(self):
         if self.__token_details:
-            token = self.__token_details.token
-            token_key = base64.b64encode(token.encode('utf-8'))
-            return token_key.decode('ascii')
+            return self._token_auth()[1]
+
+    def _token_auth(self):
+        """Returns the current token details with its credentials and auth
+        headers, computed once per token"""
+        token_details = self.__token_details
+        token_auth = self.__token_auth
+        if token_auth is None or token_auth[0] is not token_details:
+            token = token_details.token
+            credentials = base64.b64encode(token.encode('utf-8')).decode('ascii')
+            token_auth = (token_details, credentials,
+                          {'Authorization': 'Bearer %s' % credentials})
+            self.__token_auth = token_auth
+        return token_auth
 
     @property
     def token_details(self):
@@ -285,15 +539,29 @@ class Auth(object):
             return self.client_id == assumed_client_id
 
     def _get_auth_headers(self):
+        """Returns the auth headers of a request. They are shared by every
+        request using the same credentials, so must not be modified."""
         if self.__auth_mechanism == Auth.Method.BASIC:
-            return {
-                'Authorization': 'Basic %s' % self.basic_credentials,
-            }
+            return self._basic_auth_headers()
         else:
-            self.authorise()
-            return {
-                'Authorization': 'Bearer %s' % self.token_credentials,
+            if self._token_needs_authorise():
+                self.authorise()
+            return self._token_auth_headers()
+
+    def _token_needs_authorise(self):
+        token_details = self.__token_details
+        return (token_details is None or
+                token_details.is_expired(self._timestamp()))
+
+    def _basic_auth_headers(self):
+        if self.__basic_auth_headers is None:
+            self.__basic_auth_headers = {
+                'Authorization': 'Basic %s' % self.basic_credentials,
             }
+        return self.__basic_auth_headers
+
+    def _token_auth_headers(self):
+        return self._token_auth()[2]
 
     def _timestamp(self):
         """Returns the local time in milliseconds since the unix epoch"""
@@ -304,20 +572,35 @@ class Auth(object):
 
     def token_request_from_auth_url(self, method, url, token_params,
                                     headers, auth_params):
+        params, body = self._auth_url_params(method, token_params, auth_params)
+
+        from ably.http.http import Response
+        response = Response(requests.request(
+            method, url, headers=headers, params=params, data=body))
+
+        return self._token_request_from_auth_url_response(response)
+
+    @staticmethod
+    def _auth_url_params(method, token_params, auth_params):
         if method == 'GET':
             body = {}
             params = dict(auth_params, **token_params)
         elif method == 'POST':
             params = {}
             body = dict(auth_params, **token_params)
+        return params, body
 
-        from ably.http.http import Response
-        response = Response(requests.request(
-            method, url, headers=headers, params=params, data=body))
-
+    @staticmethod
+    def _token_request_from_auth_url_response(response):
         AblyException.raise_for_response(response)
         try:
             token_request = response.to_native()
         except ValueError:
             token_request = response.text
         return token_request
+
+
+def _renew_token(auth_ref):
+    auth = auth_ref()
+    if auth is not None:
+        auth._renew_token()
@@ -2,17 +2,16 @@ from __future__ import absolute_import
 
 import calendar
 import logging
-import json
 from collections import OrderedDict
 
 import six
-import msgpack
 from six.moves.urllib.parse import urlencode, quote
 
 from ably.http.paginatedresult import PaginatedResult
 from ably.types.message import (
     Message, make_message_response_handler, make_encrypted_message_response_handler,
-    MessageJSONEncoder)
+    message_packer)
+from ably.rest.publishbuffer import PublishBuffer
 from ably.types.presence import Presence
 from ably.util.crypto import get_cipher
 from ably.util.exceptions import catch_all, IncompatibleClientIdException
@@ -20,13 +19,30 @@ from ably.util.exceptions import catch_all, IncompatibleClientIdException
 log = logging.getLogger(__name__)
 
 
+def check_client_id(auth, message):
+    """Raises if `message` can't be published with the client_id of `auth`"""
+    if message.client_id == '*':
+        raise IncompatibleClientIdException(
+            'Wildcard client_id is reserved and cannot be used when publishing messages',
+            400, 40012)
+    elif message.client_id is not None and not auth.can_assume_client_id(message.client_id):
+        raise IncompatibleClientIdException(
+            'Cannot publish with client_id \'{}\' as it is incompatible with the '
+            'current configured client_id \'{}\''.format(message.client_id, auth.client_id),
+            400, 40012)
+
+
 class Channel(object):
+    presence_class = Presence
+    publish_buffer_class = PublishBuffer
+
     def __init__(self, ably, name, options):
         self.__ably = ably
         self.__name = name
         self.__base_path = '/channels/%s/' % quote(name)
+        self.__publish_buffer = None
         self.options = options
-        self.__presence = Presence(self)
+        self.__presence = self.presence_class(self)
 
     def _format_time_param(self, t):
         try:
@@ -35,8 +51,25 @@ class Channel(object):
             return '%s' % t
 
     @catch_all
-    def history(self, direction=None, limit=None, start=None, end=None, timeout=None):
-        """Returns the history for this channel"""
+    def history(self, direction=None, limit=None, start=None, end=None, timeout=None,
+                stream=False, lazy=False):
+        """Returns the history for this channel
+
+        With `stream=True` the messages of each page are decoded one at a
+        time as the response is read, instead of all at once, and `items`
+        is an iterator which has to be consumed for the connection to be
+        released. With `lazy=True` the data of each message is only
+        decoded when it is first read.
+        """
+        return PaginatedResult.paginated_query(
+            self.ably.http,
+            self._history_path(direction, limit, start, end),
+            None,
+            self._message_response_handler(stream, lazy),
+            stream=stream
+        )
+
+    def _history_path(self, direction=None, limit=None, start=None, end=None):
         params = {}
 
         if direction:
@@ -54,20 +87,16 @@ class Channel(object):
 
         if params:
             path = path + '?' + urlencode(params)
+        return path
 
+    def _message_response_handler(self, stream=False, lazy=False):
         if self.__cipher:
-            message_handler = make_encrypted_message_response_handler(
-                self.__cipher, self.ably.options.use_binary_protocol)
+            return make_encrypted_message_response_handler(
+                self.__cipher, self.ably.options.use_binary_protocol, stream,
+                lazy, self.options.crypto_executor)
         else:
-            message_handler = make_message_response_handler(
-                self.ably.options.use_binary_protocol)
-
-        return PaginatedResult.paginated_query(
-            self.ably.http,
-            path,
-            None,
-            message_handler
-        )
+            return make_message_response_handler(
+                self.ably.options.use_binary_protocol, stream, lazy)
 
     @catch_all
     def publish(self, name=None, data=None, client_id=None,
@@ -81,47 +110,80 @@ class Channel(object):
             Specify this param OR `name` and `data`.
 
         :attention: You can publish using `name` and `data` OR `messages`, never all three.
+
+        If the channel options enable `batch_publish` the messages are
+        buffered and a `concurrent.futures.Future` is returned instead of
+        the response, or a list of them if `messages` was given.
         """
+        if self.__publish_buffer is not None:
+            futures = self.__publish_buffer.add(
+                self._messages_to_publish(name, data, client_id, messages))
+            return futures if messages else futures[0]
+
+        return self.ably.http.post(
+            self._publish_path,
+            body=self._publish_body(name, data, client_id, messages),
+            timeout=timeout
+            )
+
+    def flush(self, timeout=None):
+        """Waits until the messages buffered by `publish` have been sent.
+        Returns False if `timeout` seconds passed first."""
+        if self.__publish_buffer is None:
+            return True
+        return self.__publish_buffer.flush(timeout)
+
+    @staticmethod
+    def _messages_to_publish(name=None, data=None, client_id=None,
+                             messages=None):
         if not messages:
             messages = [Message(name, data, client_id)]
+        return messages
 
+    def _prepare_messages(self, messages):
+        """Checks the client_id of the messages and encrypts them if needed"""
         request_body_list = []
         for m in messages:
-            if m.client_id == '*':
-                raise IncompatibleClientIdException(
-                    'Wildcard client_id is reserved and cannot be used when publishing messages',
-                    400, 40012)
-            elif m.client_id is not None and not self.ably.auth.can_assume_client_id(m.client_id):
-                raise IncompatibleClientIdException(
-                    'Cannot publish with client_id \'{}\' as it is incompatible with the '
-                    'current configured client_id \'{}\''.format(m.client_id, self.ably.auth.client_id),
-                    400, 40012)
-
-            if self.encrypted:
-                m.encrypt(self.__cipher)
-
+            check_client_id(self.ably.auth, m)
             request_body_list.append(m)
 
+        if self.encrypted:
+            Message.encrypt_many(request_body_list, self.__cipher,
+                                 self.options.crypto_executor)
+        return request_body_list
+
+    def _encode_messages(self, messages):
+        """Returns every message serialised on its own"""
+        messages = self._prepare_messages(messages)
+        if self.ably.options.use_binary_protocol:
+            return [m.as_msgpack() for m in messages]
+        json_backend = self.ably.options.json_backend
+        return [m.as_json(json_backend) for m in messages]
+
+    def _publish_body(self, name=None, data=None, client_id=None,
+                      messages=None):
+        request_body_list = self._prepare_messages(
+            self._messages_to_publish(name, data, client_id, messages))
+
         if not self.ably.options.use_binary_protocol:
+            json_backend = self.ably.options.json_backend
             if len(request_body_list) == 1:
-                request_body = request_body_list[0].as_json()
+                request_body = request_body_list[0].as_json(json_backend)
             else:
-                request_body = json.dumps(request_body_list, cls=MessageJSONEncoder)
+                request_body = json_backend.dumps(
+                    [message.as_dict(json_backend=json_backend)
+                     for message in request_body_list], compact=True)
         else:
             if len(request_body_list) == 1:
                 request_body = request_body_list[0].as_msgpack()
             else:
-                request_body = msgpack.packb(
-                    [message.as_dict(binary=True) for message in request_body_list],
-                    use_bin_type=True)
+                request_body = message_packer.pack(request_body_list)
 
-        path = '/channels/%s/publish' % self.__name
+        return request_body
 
-        return self.ably.http.post(
-            path,
-            body=request_body,
-            timeout=timeout
-            )
+    @property
+    def _publish_path(self):
+        return '/channels/%s/publish' % self.__name
 
     @property
     def ably(self):
@@ -151,6 +213,10 @@ class Channel(object):
     def presence(self):
         return self.__presence
 
+    @property
+    def publish_buffer(self):
+        return self.__publish_buffer
+
     @options.setter
     def options(self, options):
         self.__options = options
@@ -160,8 +226,18 @@ class Channel(object):
         else:
             self.__cipher = None
 
+        if self.__publish_buffer is not None:
+            self.__publish_buffer._detach()
+        if options and options.batch_publish:
+            self.__publish_buffer = self.publish_buffer_class.from_options(
+                self, options)
+        else:
+            self.__publish_buffer = None
+
 
 class Channels(object):
+    channel_class = Channel
+
     def __init__(self, rest):
         self.__ably = rest
         self.__attached = OrderedDict()
@@ -171,7 +247,7 @@ class Channels(object):
             name = name.decode('ascii')
 
         if name not in self.__attached:
-            result = self.__attached[name] = Channel(self.__ably, name, options)
+            result = self.__attached[name] = self.channel_class(self.__ably, name, options)
         else:
             result = self.__attached[name]
             if options is not None:
@@ -0,0 +1,201 @@
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import msgpack
+import six
+
+from ably.util.exceptions import AblyException
+
+log = logging.getLogger(__name__)
+
+
+class PublishBuffer(object):
+    """Merges the messages published on a channel into fewer requests.
+
+    Messages are encoded as soon as they are added and sent by a background
+    thread once `linger` seconds have passed since the oldest pending one
+    was added, or as soon as `max_messages` or `max_bytes` are reached.
+    Each message gets a Future that resolves with the publish response, or
+    with the AblyException that failed the request carrying it.
+    """
+
+    def __init__(self, channel, linger, max_messages, max_bytes):
+        self.__channel = channel
+        self.__linger = linger
+        self.__max_messages = max_messages
+        self.__max_bytes = max_bytes
+
+        self._condition = threading.Condition()
+        self._pending = collections.deque()
+        self._pending_bytes = 0
+        self._pending_since = None
+        self._in_flight = 0
+        self._flushing = 0
+        self._closed = False
+        self.__thread = None
+
+    @classmethod
+    def from_options(cls, channel, options):
+        return cls(channel, options.batch_linger, options.batch_max_messages,
+                   options.batch_max_bytes)
+
+    def add(self, messages):
+        """Encodes `messages` and queues them, returning a future each"""
+        # kept as bytes, so that max_bytes counts bytes rather than
+        # characters of the JSON
+        encoded = [item.encode('utf-8') if isinstance(item, six.text_type) else item
+                   for item in self.__channel._encode_messages(messages)]
+        futures = []
+        with self._condition:
+            if self._closed:
+                raise AblyException("Publish buffer is closed", 400, 40000)
+            if not self._pending:
+                self._pending_since = time.time()
+            for item in encoded:
+                future = self._new_future()
+                self._pending.append((item, future))
+                self._pending_bytes += len(item)
+                futures.append(future)
+            self._wake()
+        return futures
+
+    def flush(self, timeout=None):
+        """Sends pending messages now and waits until every request is done.
+        Returns False if `timeout` seconds passed first."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout=None):
+        """Flushes the buffer and stops its thread"""
+        result = self.flush(timeout)
+        self._detach()
+        return result
+
+    def _new_future(self):
+        return Future()
+
+    def _wake(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(
+                target=self._run,
+                name='ably-publish-%s' % self.__channel.name)
+            self.__thread.daemon = True
+            self.__thread.start()
+        self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    self.__thread = None
+                    return
+                deadline = self._pending_since + self.__linger
+                while not (self._is_full() or self._flushing or self._closed):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._take_batch()
+                self._in_flight += 1
+            try:
+                self._send(batch)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def _is_full(self):
+        return (len(self._pending) >= self.__max_messages or
+                self._pending_bytes >= self.__max_bytes)
+
+    def _take_batch(self):
+        """Removes from the queue the messages for the next request. Must
+        be called with the condition held."""
+        batch = []
+        batch_bytes = 0
+        while self._pending and len(batch) < self.__max_messages:
+            item_len = len(self._pending[0][0])
+            if batch and batch_bytes + item_len > self.__max_bytes:
+                break
+            batch.append(self._pending.popleft())
+            batch_bytes += item_len
+        self._pending_bytes -= batch_bytes
+        if not self._pending:
+            self._pending_since = None
+        # else the messages left are sent by the deadline of the oldest one
+        return batch
+
+    def _request_body(self, batch):
+        """Joins messages that were encoded one by one into the body of a
+        single publish request, without encoding them again"""
+        items = [item for item, future in batch]
+        if self.__channel.ably.options.use_binary_protocol:
+            return msgpack.Packer().pack_array_header(len(items)) + b''.join(items)
+        return b'[' + b','.join(items) + b']'
+
+    def _send(self, batch):
+        log.debug("Publishing %d buffered messages on %s",
+                  len(batch), self.__channel.name)
+        try:
+            response = self.__channel.ably.http.post(
+                self.__channel._publish_path, body=self._request_body(batch))
+        except Exception as e:
+            self._fail(batch, e)
+        else:
+            self._succeed(batch, response)
+
+    @staticmethod
+    def _succeed(batch, response):
+        for item, future in batch:
+            if not future.done():
+                future.set_result(response)
+
+    @staticmethod
+    def _fail(batch, e):
+        e = AblyException.from_exception(e)
+        for item, future in batch:
+            if not future.done():
+                future.set_exception(e)
+
+    def _detach(self):
+        """Stops accepting messages, sending the pending ones right away,
+        without waiting for them"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def channel(self):
+        return self.__channel
+
+    @property
+    def linger(self):
+        return self.__linger
+
+    @property
+    def max_messages(self):
+        return self.__max_messages
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
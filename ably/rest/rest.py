@@ -3,13 +3,17 @@ from __future__ import absolute_import
 import calendar
 import logging
 
+import msgpack
+import six
 from six.moves.urllib.parse import urlencode
 
-from ably.http.http import Http
+from ably.http.http import Http, Response
 from ably.http.paginatedresult import PaginatedResult
 from ably.rest.auth import Auth
-from ably.rest.channel import Channels
+from ably.rest.channel import Channels, check_client_id
 from ably.util.exceptions import AblyException, catch_all
+from ably.types.batchresult import BatchPublishResult
+from ably.types.message import Message
 from ably.types.options import Options
 from ably.types.stats import make_stats_response_processor
 from ably.types.tokendetails import TokenDetails
@@ -19,6 +23,13 @@ log = logging.getLogger(__name__)
 
 class AblyRest(object):
     """Ably Rest Client"""
+    http_class = Http
+    auth_class = Auth
+    channels_class = Channels
+
+    # Most channels a single batch publish request can address
+    batch_max_channels = 100
+
     def __init__(self, key=None, token=None, token_details=None, **kwargs):
         """Create an AblyRest instance.
 
@@ -41,6 +52,10 @@ class AblyRest(object):
           - `auth_callback`: Undocumented
           - `auth_url`: Undocumented
           - `keep_alive`: use persistent connections. Defaults to True
+          - `http_pool_connections`: number of connection pools kept for
+            hosts other than the Ably REST hosts. Defaults to 10
+          - `http_pool_maxsize`: connections kept open to each host.
+            Defaults to 10
         """
         if key is not None and ('key_name' in kwargs or 'key_secret' in kwargs):
             raise ValueError("key and key_name or key_secret are mutually exclusive. "
@@ -60,16 +75,11 @@ class AblyRest(object):
         else:
             options = Options(**kwargs)
 
-        # if self.__keep_alive:
-        #     self.__session = requests.Session()
-        # else:
-        #     self.__session = None
-
-        self.__http = Http(self, options)
-        self.__auth = Auth(self, options)
+        self.__http = self.http_class(self, options)
+        self.__auth = self.auth_class(self, options)
         self.__http.auth = self.__auth
 
-        self.__channels = Channels(self)
+        self.__channels = self.channels_class(self)
         self.__options = options
 
     def _format_time_param(self, t):
@@ -82,6 +92,17 @@ class AblyRest(object):
     def stats(self, direction=None, start=None, end=None, params=None,
               limit=None, paginated=None, unit=None, timeout=None):
         """Returns the stats for this application"""
+        url = self._stats_path(direction, start, end, params, limit, unit)
+
+        stats_response_processor = make_stats_response_processor(
+            self.options.use_binary_protocol)
+
+        return PaginatedResult.paginated_query(self.http,
+                                               url, None,
+                                               stats_response_processor)
+
+    def _stats_path(self, direction=None, start=None, end=None, params=None,
+                    limit=None, unit=None):
         params = params or {}
 
         if direction:
@@ -103,20 +124,162 @@ class AblyRest(object):
         url = '/stats'
         if params:
             url += '?' + urlencode(params)
-
-        stats_response_processor = make_stats_response_processor(
-            self.options.use_binary_protocol)
-
-        return PaginatedResult.paginated_query(self.http,
-                                               url, None,
-                                               stats_response_processor)
+        return url
 
     @catch_all
     def time(self, timeout=None):
         """Returns the current server time in ms since the unix epoch"""
         r = self.http.get('/time', skip_auth=True, timeout=timeout)
-        AblyException.raise_for_response(r)
-        return r.to_native()[0]
+        return self._time_from_response(r)
+
+    @staticmethod
+    def _time_from_response(response):
+        AblyException.raise_for_response(response)
+        return response.to_native()[0]
+
+    @catch_all
+    def publish_batch(self, batch, timeout=None):
+        """Publishes messages on several channels with as few requests as
+        possible.
+
+        :Parameters:
+        - `batch`: dict mapping channel names to a list of `Message` objects
+          (or a single `Message`). Channels without encryption that are
+          given the very same list share a single copy of it in the request.
+
+        Returns a dict mapping each channel name to a `BatchPublishResult`.
+        A request that fails only fails the channels it was for.
+        """
+        results = {}
+        requests = self._batch_publish(batch, results)
+        outcome = None
+        while True:
+            try:
+                body = requests.send(outcome)
+            except StopIteration:
+                return results
+            try:
+                outcome = self.http.post('/messages', body=body, timeout=timeout)
+            except Exception as e:
+                outcome = e
+
+    def _batch_publish(self, batch, results):
+        """Generator yielding the body of each request of `publish_batch`.
+        It is sent back the response of the request, or the exception it
+        raised, and records the outcome for its channels in `results`.
+        This way the sync and asyncio clients only differ in how they
+        make the requests."""
+        for specs, body in self._batch_publish_requests(batch):
+            outcome = yield body
+            native = error = None
+            if isinstance(outcome, Exception):
+                error = outcome
+            else:
+                try:
+                    native = outcome.to_native()
+                except Exception as e:
+                    error = e
+            if error is not None:
+                error = AblyException.from_exception(error)
+            results.update(self._batch_publish_results(specs, native, error))
+
+    def _batch_publish_requests(self, batch):
+        """Encodes the messages of every channel once, and returns the
+        (specs, body) pair of each request needed to publish them"""
+        binary = self.options.use_binary_protocol
+        specs = []
+        shared_specs = {}
+        for name, messages in six.iteritems(batch):
+            if isinstance(name, six.binary_type):
+                name = name.decode('ascii')
+            channel = self.channels.get(name) if name in self.channels else None
+            encrypted = channel is not None and channel.encrypted
+
+            spec = None if encrypted else shared_specs.get(id(messages))
+            if spec is None:
+                spec_messages = [messages] if isinstance(messages, Message) else messages
+                if encrypted:
+                    # encrypting changes the messages, which may be shared
+                    spec_messages = [Message(m.name, m.data, m.client_id,
+                                             id=m.id, connection_id=m.connection_id,
+                                             timestamp=m.timestamp, encoding=m.encoding)
+                                     for m in spec_messages]
+                    spec_messages = channel._prepare_messages(spec_messages)
+                else:
+                    for m in spec_messages:
+                        check_client_id(self.auth, m)
+                spec = {
+                    'channels': [],
+                    'messages': [m.as_dict(binary=binary,
+                                           json_backend=self.options.json_backend)
+                                 for m in spec_messages],
+                }
+                specs.append(spec)
+                if not encrypted:
+                    shared_specs[id(messages)] = spec
+            spec['channels'].append(name)
+
+        requests = []
+        request_specs = []
+        request_channels = 0
+        for spec in specs:
+            channels = spec['channels']
+            while channels:
+                room = self.batch_max_channels - request_channels
+                request_specs.append({'channels': channels[:room],
+                                      'messages': spec['messages']})
+                channels = channels[room:]
+                request_channels += len(request_specs[-1]['channels'])
+                if request_channels == self.batch_max_channels:
+                    requests.append(request_specs)
+                    request_specs = []
+                    request_channels = 0
+        if request_specs:
+            requests.append(request_specs)
+
+        return [(request_specs, self._dump_batch(request_specs))
+                for request_specs in requests]
+
+    def _dump_batch(self, specs):
+        if self.options.use_binary_protocol:
+            return msgpack.packb(specs, use_bin_type=True)
+        return self.options.json_backend.dumps(specs, compact=True)
+
+    @staticmethod
+    def _batch_publish_results(specs, native=None, error=None):
+        """Maps each channel in `specs` to its BatchPublishResult, from the
+        response of the request or from the error that failed it"""
+        if error is not None and error.status_code == 400 and error.response is not None:
+            # a partial failure carries the per channel results
+            response = error.response
+            if not isinstance(response, Response):
+                response = Response(response)
+            try:
+                native = response.to_native()
+            except Exception:
+                native = None
+
+        results = {}
+        pending = [native]
+        while pending:
+            obj = pending.pop()
+            if isinstance(obj, list):
+                pending.extend(obj)
+            elif isinstance(obj, dict) and 'channel' in obj:
+                results[obj['channel']] = BatchPublishResult.from_dict(obj)
+            elif isinstance(obj, dict) and 'batchResponse' in obj:
+                pending.append(obj['batchResponse'])
+            elif isinstance(obj, dict) and 'error' in obj and error is None:
+                error = BatchPublishResult.error_from_dict(obj['error'])
+
+        if error is None:
+            error = AblyException("No result for channel in batch response",
+                                  500, 50000)
+        for spec in specs:
+            for name in spec['channels']:
+                if name not in results:
+                    results[name] = BatchPublishResult(name, error=error)
+        return results
 
     @property
     def client_id(self):
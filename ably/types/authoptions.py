@@ -10,7 +10,8 @@ class AuthOptions(object):
                  auth_token=None, auth_headers=None, auth_params=None,
                  key_name=None, key_secret=None, key=None, query_time=False,
                  token_details=None, use_token_auth=None,
-                 default_token_params=None):
+                 default_token_params=None, token_renew_fraction=None,
+                 token_store=None):
         self.__auth_options = {}
         self.auth_options['auth_callback'] = auth_callback
         self.auth_options['auth_url'] = auth_url
@@ -20,6 +21,8 @@ class AuthOptions(object):
         self.auth_options['auth_params'] = auth_params
         self.__token_details = token_details
         self.__use_token_auth = use_token_auth
+        self.token_renew_fraction = token_renew_fraction
+        self.__token_store = token_store
         default_token_params = default_token_params or {}
         default_token_params.pop('timestamp', None)
         self.default_token_params = default_token_params
@@ -152,5 +155,27 @@ class AuthOptions(object):
     def default_token_params(self, value):
         self.__default_token_params = value
 
+    @property
+    def token_renew_fraction(self):
+        """Fraction of the life of a token after which a new one is
+        requested in the background, None to only renew expired tokens"""
+        return self.__token_renew_fraction
+
+    @token_renew_fraction.setter
+    def token_renew_fraction(self, value):
+        if value is not None and not 0 < value < 1:
+            raise ValueError("token_renew_fraction must be between 0 and 1")
+        self.__token_renew_fraction = value
+
+    @property
+    def token_store(self):
+        """The TokenStore tokens are shared through, see
+        `ably.util.tokenstore`"""
+        return self.__token_store
+
+    @token_store.setter
+    def token_store(self, value):
+        self.__token_store = value
+
     def __unicode__(self):
         return six.text_type(self.__dict__)
@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+
+from ably.util.exceptions import AblyException
+
+
+class BatchPublishResult(object):
+    """The outcome of publishing on one channel of a batch publish"""
+
+    def __init__(self, channel, message_id=None, error=None):
+        self.__channel = channel
+        self.__message_id = message_id
+        self.__error = error
+
+    @property
+    def channel(self):
+        return self.__channel
+
+    @property
+    def message_id(self):
+        return self.__message_id
+
+    @property
+    def error(self):
+        """An AblyException if publishing on the channel failed"""
+        return self.__error
+
+    @property
+    def success(self):
+        return self.__error is None
+
+    @staticmethod
+    def error_from_dict(obj):
+        obj = obj or {}
+        return AblyException(message=obj.get('message', ''),
+                             status_code=obj.get('statusCode', 500),
+                             code=int(obj.get('code', 50000)))
+
+    @staticmethod
+    def from_dict(obj):
+        error = obj.get('error')
+        if error is not None:
+            error = BatchPublishResult.error_from_dict(error)
+        return BatchPublishResult(obj.get('channel'),
+                                  message_id=obj.get('messageId'),
+                                  error=error)
@@ -1,8 +1,9 @@
 from __future__ import absolute_import
 
-from collections import MutableMapping
+from collections import Mapping, MutableMapping, OrderedDict
 import json
 import logging
+import threading
 
 import six
 
@@ -11,19 +12,39 @@ from ably.util.unicodemixin import UnicodeMixin
 log = logging.getLogger(__name__)
 
 
+def _c14n_of(capability):
+    sorted_ops = {
+        k: sorted(v)
+        for k, v in six.iteritems(capability)
+    }
+    return six.text_type(json.dumps(sorted_ops, sort_keys=True))
+
+
 class Capability(MutableMapping, UnicodeMixin):
+    """The resources of a token and the operations allowed on them.
+
+    Operations are kept in frozensets, so a capability only changes through
+    its own methods, and its canonical string is computed once per change.
+    See `FrozenCapability` for an immutable, hashable capability.
+    """
+    # most capabilities kept by `frozen`
+    max_cached = 256
+    __cache = OrderedDict()
+    __cache_lock = threading.Lock()
+
     def __init__(self, obj={}):
         self.__dict = dict(obj)
+        self.__c14n = None
         for k, v in six.iteritems(obj):
             self[k] = v
 
     def __eq__(self, other):
-        if isinstance(other, Capability):
+        if isinstance(other, (Capability, FrozenCapability)):
             return Capability.c14n(self) == Capability.c14n(other)
         return NotImplemented
 
     def __ne__(self, other):
-        if isinstance(other, Capability):
+        if isinstance(other, (Capability, FrozenCapability)):
             return Capability.c14n(self) != Capability.c14n(other)
         return NotImplemented
 
@@ -53,10 +74,12 @@ class Capability(MutableMapping, UnicodeMixin):
                 raise ValueError('Operations must be strings')
             operations.add(val)
 
-        self.__dict[key] = operations
+        self.__dict[key] = frozenset(operations)
+        self.__c14n = None
 
     def __delitem__(self, key):
         del self.__dict[key]
+        self.__c14n = None
 
     def setdefault(self, key, default):
         if key not in self:
@@ -69,15 +92,115 @@ class Capability(MutableMapping, UnicodeMixin):
         self[resource] = list(operations)
 
     def add_operation_to_resource(self, operation, resource):
-        self.setdefault(resource, []).append(operation)
+        self[resource] = self.get(resource, frozenset()) | frozenset([operation])
 
     def __unicode__(self):
         return Capability.c14n(self)
 
+    def freeze(self):
+        """Returns the FrozenCapability with the same resources and
+        operations"""
+        return Capability.frozen(self)
+
     @staticmethod
     def c14n(capability):
-        sorted_ops = {
-            k: sorted(v)
-            for k, v in six.iteritems(capability)
-        }
-        return six.text_type(json.dumps(sorted_ops, sort_keys=True))
+        if isinstance(capability, FrozenCapability):
+            return six.text_type(capability)
+        if isinstance(capability, Capability):
+            if capability.__c14n is None:
+                capability.__c14n = Capability.canonical(capability.__dict)
+            return capability.__c14n
+        return _c14n_of(capability)
+
+    @classmethod
+    def canonical(cls, obj):
+        """Returns the canonical string of the capability `obj`, a
+        Capability, a dict of resources to operations or a JSON string,
+        see `frozen`"""
+        if isinstance(obj, Capability):
+            return Capability.c14n(obj)
+        return six.text_type(cls.frozen(obj))
+
+    @classmethod
+    def frozen(cls, obj):
+        """Returns the FrozenCapability of the capability `obj`, a
+        Capability, a dict of resources to operations or a JSON string.
+        The last `max_cached` different capabilities are kept, so those
+        built from the same template share one FrozenCapability and
+        canonical string."""
+        if isinstance(obj, FrozenCapability):
+            return obj
+        cache = cls.__cache
+        try:
+            if isinstance(obj, six.string_types):
+                key = obj
+            else:
+                key = frozenset(
+                    (resource, frozenset([operations])
+                     if isinstance(operations, six.string_types)
+                     else frozenset(operations))
+                    for resource, operations in six.iteritems(obj))
+            with cls.__cache_lock:
+                # moved to the end, as the least recently used go first
+                frozen = cache[key] = cache.pop(key)
+        except TypeError:
+            # invalid, Capability will say why
+            return FrozenCapability(Capability(obj))
+        except KeyError:
+            pass
+        else:
+            return frozen
+
+        if isinstance(obj, six.string_types):
+            frozen = FrozenCapability(Capability(json.loads(obj)))
+        else:
+            frozen = FrozenCapability(obj)
+        with cls.__cache_lock:
+            frozen = cache.setdefault(key, frozen)
+            while len(cache) > cls.max_cached:
+                cache.popitem(last=False)
+        return frozen
+
+
+class FrozenCapability(Mapping, UnicodeMixin):
+    """An immutable and hashable Capability. Capabilities equal to each
+    other have the same hash, whether they are frozen or not.
+
+    `Capability.frozen` returns the same FrozenCapability for equal
+    capabilities recently frozen.
+    """
+
+    def __init__(self, obj={}):
+        if not isinstance(obj, Capability):
+            obj = Capability(obj)
+        self.__dict = dict(obj)
+        self.__c14n = _c14n_of(self.__dict)
+        self.__hash = hash(self.__c14n)
+
+    def __eq__(self, other):
+        if isinstance(other, (Capability, FrozenCapability)):
+            return self.__c14n == Capability.c14n(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, (Capability, FrozenCapability)):
+            return self.__c14n != Capability.c14n(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return self.__hash
+
+    def __getitem__(self, key):
+        return self.__dict[key]
+
+    def __iter__(self):
+        return iter(self.__dict)
+
+    def __len__(self):
+        return len(self.__dict)
+
+    def __contains__(self, key):
+        return key in self.__dict
+
+    def __unicode__(self):
+        return self.__c14n
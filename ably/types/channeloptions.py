@@ -1,9 +1,33 @@
 class ChannelOptions(object):
-    def __init__(self, encrypted=False, cipher_params=None):
+    def __init__(self, encrypted=False, cipher_params=None,
+                 batch_publish=False, batch_linger=0.01,
+                 batch_max_messages=100, batch_max_bytes=65536,
+                 crypto_executor=None):
+        """
+        :Parameters:
+          - `encrypted`: encrypt messages published on the channel
+          - `cipher_params`: a CipherParams, required if `encrypted`
+          - `batch_publish`: buffer published messages and send the ones
+            published within `batch_linger` seconds in a single request.
+            `Channel.publish` then returns futures instead of blocking.
+          - `batch_linger`: seconds to wait for more messages
+          - `batch_max_messages`: most messages sent in one request
+          - `batch_max_bytes`: most encoded bytes sent in one request
+          - `crypto_executor`: a `concurrent.futures.ThreadPoolExecutor`
+            whose threads decrypt the pages of history, and with the CTR
+            and GCM modes encrypt published messages, in parallel
+        """
         self.__encrypted = encrypted
         self.__cipher_params = cipher_params
         if encrypted and cipher_params is None:
             raise ValueError("Must set cipher_params if encrypted is True")
+        if batch_max_messages < 1:
+            raise ValueError("batch_max_messages must be at least 1")
+        self.__batch_publish = batch_publish
+        self.__batch_linger = batch_linger
+        self.__batch_max_messages = batch_max_messages
+        self.__batch_max_bytes = batch_max_bytes
+        self.__crypto_executor = crypto_executor
 
     @property
     def encrypted(self):
@@ -12,3 +36,23 @@ class ChannelOptions(object):
     @property
     def cipher_params(self):
         return self.__cipher_params
+
+    @property
+    def batch_publish(self):
+        return self.__batch_publish
+
+    @property
+    def batch_linger(self):
+        return self.__batch_linger
+
+    @property
+    def batch_max_messages(self):
+        return self.__batch_max_messages
+
+    @property
+    def batch_max_bytes(self):
+        return self.__batch_max_bytes
+
+    @property
+    def crypto_executor(self):
+        return self.__crypto_executor
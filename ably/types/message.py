@@ -1,8 +1,10 @@
 from __future__ import absolute_import
 
 import base64
+import binascii
 import json
 import logging
+import threading
 import time
 
 import six
@@ -12,11 +14,15 @@ from ably.types.typedbuffer import TypedBuffer
 from ably.types.mixins import EncodeDataMixin
 from ably.util.crypto import CipherData
 from ably.util.exceptions import AblyException
+from ably.util.jsonbackend import get_json_backend
 
 log = logging.getLogger(__name__)
 
 
 class Message(EncodeDataMixin):
+    __slots__ = ('__name', '__id', '__client_id', '__data', '__timestamp',
+                 '__connection_id', '__raw')
+
     def __init__(self, name=None, data=None, client_id=None,
                  id=None, connection_id=None, timestamp=None,
                  encoding=''):
@@ -35,6 +41,7 @@ class Message(EncodeDataMixin):
         self.__data = data
         self.__timestamp = timestamp
         self.__connection_id = connection_id
+        self.__raw = None
         super(Message, self).__init__(encoding)
 
     def __eq__(self, other):
@@ -62,8 +69,34 @@ class Message(EncodeDataMixin):
 
     @property
     def data(self):
+        if self.__raw is not None:
+            self.__decode_raw()
         return self.__data
 
+    @property
+    def encoding(self):
+        if self.__raw is not None:
+            self.__decode_raw()
+        return super(Message, self).encoding
+
+    @encoding.setter
+    def encoding(self, encoding):
+        self.__raw = None
+        EncodeDataMixin.encoding.fset(self, encoding)
+
+    def __decode_raw(self):
+        # the raw data is only dropped once decoded, so that a failure is
+        # raised again on the next read, and threads reading it meanwhile
+        # decode it themselves rather than seeing it half done
+        raw = self.__raw
+        if raw is None:
+            return
+        data, encoding, cipher, json_backend = raw
+        decoded_data = self.decode(data, encoding, cipher, json_backend)
+        self.__data = decoded_data['data']
+        EncodeDataMixin.encoding.fset(self, decoded_data['encoding'])
+        self.__raw = None
+
     @property
     def connection_id(self):
         return self.__connection_id
@@ -80,17 +113,39 @@ class Message(EncodeDataMixin):
         if isinstance(self.data, CipherData):
             return
 
-        elif isinstance(self.data, six.text_type):
-            self._encoding_array.append('utf-8')
-
-        if isinstance(self.data, dict) or isinstance(self.data, list):
-            self._encoding_array.append('json')
-            self._encoding_array.append('utf-8')
-
-        typed_data = TypedBuffer.from_obj(self.data)
+        typed_data = self._typed_data_to_encrypt()
         if typed_data.buffer is None:
             return True
         encrypted_data = channel_cipher.encrypt(typed_data.buffer)
+        self._set_encrypted_data(encrypted_data, typed_data, channel_cipher)
+
+    @staticmethod
+    def encrypt_many(messages, channel_cipher, executor=None):
+        """Encrypts the data of `messages`, like `encrypt` would, with a
+        single `channel_cipher.encrypt_many` call, given `executor`"""
+        to_encrypt = []
+        for message in messages:
+            if isinstance(message.data, CipherData):
+                continue
+            typed_data = message._typed_data_to_encrypt()
+            if typed_data.buffer is not None:
+                to_encrypt.append((message, typed_data))
+
+        encrypted = channel_cipher.encrypt_many(
+            [typed_data.buffer for message, typed_data in to_encrypt], executor)
+        for (message, typed_data), encrypted_data in zip(to_encrypt, encrypted):
+            message._set_encrypted_data(encrypted_data, typed_data, channel_cipher)
+
+    def _typed_data_to_encrypt(self):
+        if isinstance(self.data, six.text_type):
+            self._encoding_array += ('utf-8',)
+
+        if isinstance(self.data, dict) or isinstance(self.data, list):
+            self._encoding_array += ('json', 'utf-8')
+
+        return TypedBuffer.from_obj(self.data)
+
+    def _set_encrypted_data(self, encrypted_data, typed_data, channel_cipher):
         self.__data = CipherData(encrypted_data, typed_data.type,
                                  cipher_type=channel_cipher.cipher_type)
 
@@ -104,18 +159,20 @@ class Message(EncodeDataMixin):
         return decrypted_typed_buffer.decode()
 
     def decrypt(self, channel_cipher):
-        decrypted_data = self.decrypt_data(channel_cipher, self.__data)
+        decrypted_data = self.decrypt_data(channel_cipher, self.data)
         if decrypted_data is not None:
             self.__data = decrypted_data
 
-    def as_dict(self, binary=False):
+    def _wire_data(self, binary=False, json_backend=None):
+        """Returns the data to send for this message, with its encoding
+        string (or None) and CipherData type"""
         data = self.data
         data_type = None
-        encoding = self._encoding_array[:]
+        encoding = list(self._encoding_array)
 
         if isinstance(data, dict) or isinstance(data, list):
             encoding.append('json')
-            data = json.dumps(data)
+            data = get_json_backend(json_backend).dumps(data)
         elif isinstance(data, six.text_type) and not binary:
             # text_type is always a unicode string
             pass
@@ -141,6 +198,12 @@ class Message(EncodeDataMixin):
                 data is None):
             raise AblyException("Invalid data payload", 400, 40011)
 
+        encoding = '/'.join(encoding).strip('/') if encoding else None
+        return data, encoding, data_type
+
+    def as_dict(self, binary=False, json_backend=None):
+        data, encoding, data_type = self._wire_data(binary, json_backend)
+
         request_body = {
             'name': self.name,
             'data': data,
@@ -150,7 +213,7 @@ class Message(EncodeDataMixin):
                         if v is not None}  # None values aren't included
 
         if encoding:
-            request_body['encoding'] = '/'.join(encoding).strip('/')
+            request_body['encoding'] = encoding
 
         if data_type:
             request_body['type'] = data_type
@@ -166,11 +229,17 @@ class Message(EncodeDataMixin):
 
         return request_body
 
-    def as_json(self):
-        return json.dumps(self.as_dict(), separators=(',', ':'))
+    def as_json(self, json_backend=None):
+        json_backend = get_json_backend(json_backend)
+        return json_backend.dumps(self.as_dict(json_backend=json_backend),
+                                  compact=True)
 
     @staticmethod
-    def from_dict(obj, cipher=None):
+    def from_dict(obj, cipher=None, lazy=False, json_backend=None):
+        """Builds a Message from its wire representation. With `lazy` the
+        data is only decoded, and decrypted, when `data` or `encoding` is
+        first read, so messages whose payload is never looked at don't pay
+        for it."""
         id = obj.get('id')
         name = obj.get('name')
         data = obj.get('data')
@@ -179,7 +248,18 @@ class Message(EncodeDataMixin):
         timestamp = obj.get('timestamp')
         encoding = obj.get('encoding', '')
 
-        decoded_data = Message.decode(data, encoding, cipher)
+        if lazy:
+            message = Message(
+                id=id,
+                name=name,
+                connection_id=connection_id,
+                client_id=client_id,
+                timestamp=timestamp,
+            )
+            message.__raw = (data, encoding, cipher, json_backend)
+            return message
+
+        decoded_data = Message.decode(data, encoding, cipher, json_backend)
 
         return Message(
             id=id,
@@ -191,26 +271,166 @@ class Message(EncodeDataMixin):
         )
 
     def as_msgpack(self):
-        return msgpack.packb(self.as_dict(binary=True), use_bin_type=True)
+        return message_packer.pack_message(self)
 
 
-def make_message_response_handler(binary):
+def make_message_response_handler(binary, stream=False, lazy=False):
     def message_response_handler(response):
+        json_backend = response.json_backend
+        if stream:
+            return (Message.from_dict(j, lazy=lazy, json_backend=json_backend)
+                    for j in response.iter_native())
         messages = response.to_native()
-        return [Message.from_dict(j) for j in messages]
+        return [Message.from_dict(j, lazy=lazy, json_backend=json_backend)
+                for j in messages]
     return message_response_handler
 
 
-def make_encrypted_message_response_handler(cipher, binary):
+def make_encrypted_message_response_handler(cipher, binary, stream=False,
+                                            lazy=False, executor=None):
     def encrypted_message_response_handler(response):
+        json_backend = response.json_backend
+        if stream:
+            return (Message.from_dict(j, cipher, lazy, json_backend)
+                    for j in response.iter_native())
         messages = response.to_native()
-        return [Message.from_dict(j, cipher) for j in messages]
+        if not lazy:
+            messages = decrypt_message_dicts(messages, cipher, executor)
+        return [Message.from_dict(j, cipher, lazy, json_backend)
+                for j in messages]
     return encrypted_message_response_handler
 
 
+def decrypt_message_dicts(messages, cipher, executor=None):
+    """Decrypts the data of the wire representation of `messages` with a
+    single `decrypt_many` call for each cipher type, returning them with the
+    base64 and cipher steps taken off their encoding. The decryption is
+    spread over the threads of `executor` if given."""
+    prefix = '%s+' % CipherData.ENCODING_ID
+    # (index and encoding, ciphertext) of the messages of each cipher type
+    by_cipher_type = {}
+    for i, message in enumerate(messages):
+        encoding = message.get('encoding') or ''
+        data = message.get('data')
+        steps = encoding.strip('/').split('/')
+        base64_encoded = steps[-1] == 'base64' and len(steps) > 1
+        cipher_step = steps[-2] if base64_encoded else steps[-1]
+        if not cipher_step.startswith(prefix) or data is None:
+            continue
+        if base64_encoded:
+            data = binascii.a2b_base64(data)
+            steps.pop()
+        steps.pop()
+        encrypted, ciphertexts = by_cipher_type.setdefault(
+            cipher_step[len(prefix):], ([], []))
+        encrypted.append((i, '/'.join(steps)))
+        ciphertexts.append(data)
+
+    if not by_cipher_type:
+        return messages
+    messages = list(messages)
+    for cipher_type, (encrypted, ciphertexts) in by_cipher_type.items():
+        type_cipher = cipher.cipher_for_type(cipher_type)
+        if type_cipher is None:
+            # left for decode to report
+            continue
+        decrypted = type_cipher.decrypt_many(ciphertexts, executor)
+        for (i, encoding), data in zip(encrypted, decrypted):
+            messages[i] = dict(messages[i], data=data, encoding=encoding)
+    return messages
+
+
+class MessagePacker(object):
+    """Serialises messages to msgpack, producing the same bytes as packing
+    their `as_dict(binary=True)`, but writing each field straight into the
+    output instead of building a dict per message first.
+
+    The underlying `msgpack.Packer` is reused, one per thread.
+    """
+    _name_key = msgpack.packb('name', use_bin_type=True)
+    _data_key = msgpack.packb('data', use_bin_type=True)
+    _timestamp_key = msgpack.packb('timestamp', use_bin_type=True)
+    _encoding_key = msgpack.packb('encoding', use_bin_type=True)
+    _type_key = msgpack.packb('type', use_bin_type=True)
+    _client_id_key = msgpack.packb('clientId', use_bin_type=True)
+    _id_key = msgpack.packb('id', use_bin_type=True)
+    _connection_id_key = msgpack.packb('connectionId', use_bin_type=True)
+
+    def __init__(self):
+        self.__local = threading.local()
+
+    @property
+    def _packer(self):
+        try:
+            return self.__local.packer
+        except AttributeError:
+            self.__local.packer = msgpack.Packer(use_bin_type=True)
+            return self.__local.packer
+
+    def pack(self, messages):
+        """Returns the msgpack array of `messages`"""
+        packer = self._packer
+        out = bytearray(packer.pack_array_header(len(messages)))
+        for message in messages:
+            self._write(out, packer, message)
+        return bytes(out)
+
+    def pack_message(self, message):
+        out = bytearray()
+        self._write(out, self._packer, message)
+        return bytes(out)
+
+    def _write(self, out, packer, message):
+        pack = packer.pack
+        data, encoding, data_type = message._wire_data(binary=True)
+        name = message.name
+        timestamp = message.timestamp or int(time.time() * 1000.0)
+        client_id = message.client_id
+        id = message.id
+        connection_id = message.connection_id
+
+        # the fields as_dict would include, in the same order
+        out += packer.pack_map_header(
+            1 + (name is not None) + (data is not None) + bool(encoding) +
+            bool(data_type) + bool(client_id) + bool(id) + bool(connection_id))
+        if name is not None:
+            out += self._name_key
+            out += pack(name)
+        if data is not None:
+            out += self._data_key
+            out += pack(data)
+        out += self._timestamp_key
+        out += pack(timestamp)
+        if encoding:
+            out += self._encoding_key
+            out += pack(encoding)
+        if data_type:
+            out += self._type_key
+            out += pack(data_type)
+        if client_id:
+            out += self._client_id_key
+            out += pack(client_id)
+        if id:
+            out += self._id_key
+            out += pack(id)
+        if connection_id:
+            out += self._connection_id_key
+            out += pack(connection_id)
+
+
+message_packer = MessagePacker()
+
+
 class MessageJSONEncoder(json.JSONEncoder):
+    """Encodes Messages for json.dumps(..., cls=MessageJSONEncoder), their
+    data being serialised with `json_backend`"""
+
+    def __init__(self, json_backend=None, **kwargs):
+        json.JSONEncoder.__init__(self, **kwargs)
+        self.json_backend = json_backend
+
     def default(self, message):
         if isinstance(message, Message):
-            return message.as_dict()
+            return message.as_dict(json_backend=self.json_backend)
         else:
             return json.JSONEncoder.default(self, message)
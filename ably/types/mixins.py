@@ -1,23 +1,47 @@
+import binascii
+
 import six
-import json
-import base64
 
 import logging
 
+from six.moves import intern
+
 from ably.util.crypto import CipherData
+from ably.util.jsonbackend import get_json_backend
 
 log = logging.getLogger(__name__)
 
+# encodings seen on the wire are few, so their tuples are shared by every
+# message using them instead of each holding its own list
+_encoding_tuples = {'': ()}
+_MAX_ENCODING_TUPLES = 256
+
+
+def encoding_tuple(encoding):
+    """Returns the steps of an encoding string as a shared tuple"""
+    try:
+        return _encoding_tuples[encoding]
+    except KeyError:
+        steps = tuple(intern(str(step))
+                      for step in encoding.strip('/').split('/'))
+        if len(_encoding_tuples) < _MAX_ENCODING_TUPLES:
+            _encoding_tuples[encoding] = steps
+        return steps
+
 
 class EncodeDataMixin(object):
+    __slots__ = ('_encoding_array',)
 
     def __init__(self, encoding):
         self.encoding = encoding
 
     @staticmethod
-    def decode(data, encoding='', cipher=None):
+    def decode(data, encoding='', cipher=None, json_backend=None):
         encoding = encoding.strip('/')
         encoding_list = encoding.split('/')
+        # base64 decoded data is left as bytes for the steps after it, and
+        # only copied into a bytearray if it is what is returned
+        base64_decoded = False
 
         while encoding_list:
             encoding = encoding_list.pop()
@@ -28,18 +52,25 @@ class EncodeDataMixin(object):
                     data = data.decode()
                 if isinstance(data, list) or isinstance(data, dict):
                     continue
-                data = json.loads(data)
-            elif encoding == 'base64' and isinstance(data, six.binary_type):
-                data = bytearray(base64.b64decode(data))
+                data = get_json_backend(json_backend).loads(data)
             elif encoding == 'base64':
-                data = bytearray(base64.b64decode(data.encode('utf-8')))
+                # reads ASCII str as well as bytes, without encoding it first
+                data = binascii.a2b_base64(data)
+                base64_decoded = True
             elif encoding.startswith('%s+' % CipherData.ENCODING_ID):
                 if not cipher:
                     log.error('Message cannot be decrypted as the channel is '
                               'not set up for encryption & decryption')
                     encoding_list.append(encoding)
                     break
-                data = cipher.decrypt(data)
+                cipher_type = encoding[len(CipherData.ENCODING_ID) + 1:]
+                type_cipher = cipher.cipher_for_type(cipher_type)
+                if type_cipher is None:
+                    log.error("Message cannot be decrypted as the channel "
+                              "cipher can't decrypt '%s'" % cipher_type)
+                    encoding_list.append(encoding)
+                    break
+                data = type_cipher.decrypt(data)
             elif encoding == 'utf-8' and isinstance(data, (six.binary_type,
                                                            bytearray)):
                 data = data.decode('utf-8')
@@ -51,6 +82,8 @@ class EncodeDataMixin(object):
                 encoding_list.append(encoding)
                 break
 
+        if base64_decoded and isinstance(data, six.binary_type):
+            data = bytearray(data)
         encoding = '/'.join(encoding_list)
         return {'encoding': encoding, 'data': data}
 
@@ -60,7 +93,4 @@ class EncodeDataMixin(object):
 
     @encoding.setter
     def encoding(self, encoding):
-        if not encoding:
-            self._encoding_array = []
-        else:
-            self._encoding_array = encoding.strip('/').split('/')
+        self._encoding_array = encoding_tuple(encoding or '')
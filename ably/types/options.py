@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from ably.types.authoptions import AuthOptions
 from ably.util.exceptions import AblyException
+from ably.util.jsonbackend import get_json_backend
 
 
 class Options(AuthOptions):
@@ -10,7 +11,11 @@ class Options(AuthOptions):
                  queue_messages=False, recover=False, environment=None,
                  http_open_timeout=None, http_request_timeout=None,
                  http_max_retry_count=None, http_max_retry_duration=None,
-                 **kwargs):
+                 json_backend=None, keep_alive=True, http_pool_connections=10,
+                 http_pool_maxsize=10, fallback_retry_timeout=None,
+                 hedge_requests=False, hedge_percentile=95, retry_budget=None,
+                 http_retry_backoff=None, http_retry_backoff_max=None,
+                 circuit_breakers=None, **kwargs):
         super(Options, self).__init__(**kwargs)
 
         # TODO check these defaults
@@ -30,6 +35,17 @@ class Options(AuthOptions):
         self.__http_request_timeout = http_request_timeout
         self.__http_max_retry_count = http_max_retry_count
         self.__http_max_retry_duration = http_max_retry_duration
+        self.__json_backend = get_json_backend(json_backend)
+        self.__keep_alive = keep_alive
+        self.__http_pool_connections = http_pool_connections
+        self.__http_pool_maxsize = http_pool_maxsize
+        self.__fallback_retry_timeout = fallback_retry_timeout
+        self.__hedge_requests = hedge_requests
+        self.__hedge_percentile = hedge_percentile
+        self.__retry_budget = retry_budget
+        self.__http_retry_backoff = http_retry_backoff
+        self.__http_retry_backoff_max = http_retry_backoff_max
+        self.__circuit_breakers = circuit_breakers
 
     @property
     def client_id(self):
@@ -147,3 +163,103 @@ class Options(AuthOptions):
     def http_max_retry_duration(self, value):
 
         self.__http_max_retry_duration = value
+
+    @property
+    def json_backend(self):
+        """Serialiser used by the JSON protocol, see `get_json_backend`"""
+        return self.__json_backend
+
+    @json_backend.setter
+    def json_backend(self, value):
+        self.__json_backend = get_json_backend(value)
+
+    @property
+    def keep_alive(self):
+        return self.__keep_alive
+
+    @keep_alive.setter
+    def keep_alive(self, value):
+        self.__keep_alive = value
+
+    @property
+    def http_pool_connections(self):
+        """Hosts whose connection pools are kept, for hosts other than the
+        Ably REST hosts (which get a pool each)"""
+        return self.__http_pool_connections
+
+    @http_pool_connections.setter
+    def http_pool_connections(self, value):
+        self.__http_pool_connections = value
+
+    @property
+    def http_pool_maxsize(self):
+        """Connections kept open to each host"""
+        return self.__http_pool_maxsize
+
+    @http_pool_maxsize.setter
+    def http_pool_maxsize(self, value):
+        self.__http_pool_maxsize = value
+
+    @property
+    def fallback_retry_timeout(self):
+        """Seconds requests keep going to a fallback host that answered
+        when the primary host failed"""
+        return self.__fallback_retry_timeout
+
+    @fallback_retry_timeout.setter
+    def fallback_retry_timeout(self, value):
+        self.__fallback_retry_timeout = value
+
+    @property
+    def hedge_requests(self):
+        """Whether GET requests not answered within the `hedge_percentile`
+        of recent response times are also sent to a fallback host"""
+        return self.__hedge_requests
+
+    @hedge_requests.setter
+    def hedge_requests(self, value):
+        self.__hedge_requests = value
+
+    @property
+    def hedge_percentile(self):
+        return self.__hedge_percentile
+
+    @hedge_percentile.setter
+    def hedge_percentile(self, value):
+        self.__hedge_percentile = value
+
+    @property
+    def retry_budget(self):
+        """The RetryBudget limiting the retries of this client, None for no
+        limit"""
+        return self.__retry_budget
+
+    @retry_budget.setter
+    def retry_budget(self, value):
+        self.__retry_budget = value
+
+    @property
+    def http_retry_backoff(self):
+        return self.__http_retry_backoff
+
+    @http_retry_backoff.setter
+    def http_retry_backoff(self, value):
+        self.__http_retry_backoff = value
+
+    @property
+    def http_retry_backoff_max(self):
+        return self.__http_retry_backoff_max
+
+    @http_retry_backoff_max.setter
+    def http_retry_backoff_max(self, value):
+        self.__http_retry_backoff_max = value
+
+    @property
+    def circuit_breakers(self):
+        """The CircuitBreakers failing requests fast to hosts that keep
+        failing, None to disable them"""
+        return self.__circuit_breakers
+
+    @circuit_breakers.setter
+    def circuit_breakers(self, value):
+        self.__circuit_breakers = value
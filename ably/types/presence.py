@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from datetime import datetime, timedelta
 
+from six.moves import intern
 from six.moves.urllib.parse import urlencode
 
 from ably.http.paginatedresult import PaginatedResult
@@ -28,6 +29,9 @@ class PresenceAction(object):
 
 
 class PresenceMessage(EncodeDataMixin):
+    __slots__ = ('__id', '__action', '__client_id', '__connection_id',
+                 '__data', '__encoding', '__timestamp')
+
     def __init__(self, id=None, action=None, client_id=None,
                  data=None, encoding=None, connection_id=None,
                  timestamp=None):
@@ -36,11 +40,11 @@ class PresenceMessage(EncodeDataMixin):
         self.__client_id = client_id
         self.__connection_id = connection_id
         self.__data = data
-        self.__encoding = encoding
+        self.__encoding = intern(str(encoding)) if encoding else encoding
         self.__timestamp = timestamp
 
     @staticmethod
-    def from_dict(obj, cipher=None):
+    def from_dict(obj, cipher=None, json_backend=None):
         id = obj.get('id')
         action = obj.get('action', PresenceAction.ENTER)
         client_id = obj.get('clientId')
@@ -54,7 +58,7 @@ class PresenceMessage(EncodeDataMixin):
 
         data = obj.get('data')
 
-        decoded_data = PresenceMessage.decode(data, encoding, cipher)
+        decoded_data = PresenceMessage.decode(data, encoding, cipher, json_backend)
 
         return PresenceMessage(
             id=id,
@@ -116,26 +120,41 @@ class Presence(object):
             path += ('?' + urlencode(qs))
         return path
 
-    def get(self, limit=None):
+    def get(self, limit=None, stream=False):
+        """Returns the members present on the channel.
+
+        With `stream=True` the items of the page are decoded one at a time
+        as the response is read and `items` is an iterator, which has to be
+        consumed for the connection to be released.
+        """
+        return PaginatedResult.paginated_query(
+            self.__http,
+            self._get_path(limit),
+            {},
+            self._presence_response_handler(stream),
+            stream=stream)
+
+    def _get_path(self, limit=None):
         qs = {}
         if limit:
             if limit > 1000:
                 raise ValueError("The maximum allowed limit is 1000")
             qs['limit'] = limit
-        path = self._path_with_qs('%s/presence' % self.__base_path.rstrip('/'), qs)
-
-        if self.__cipher:
-            presence_handler = make_encrypted_presence_response_handler(self.__cipher, self.__binary)
-        else:
-            presence_handler = make_presence_response_handler(self.__binary)
+        return self._path_with_qs('%s/presence' % self.__base_path.rstrip('/'), qs)
 
+    def history(self, limit=None, direction=None, start=None, end=None,
+                stream=False):
+        """Returns the presence history of the channel, see `get` for
+        `stream`"""
         return PaginatedResult.paginated_query(
             self.__http,
-            path,
+            self._history_path(limit, direction, start, end),
             {},
-            presence_handler)
+            self._presence_response_handler(stream),
+            stream=stream
+        )
 
-    def history(self, limit=None, direction=None, start=None, end=None):
+    def _history_path(self, limit=None, direction=None, start=None, end=None):
         qs = {}
         if limit:
             if limit > 1000:
@@ -157,31 +176,39 @@ class Presence(object):
         if 'start' in qs and 'end' in qs and qs['start'] > qs['end']:
             raise ValueError("'end' parameter has to be greater than or equal to 'start'")
 
-        path = self._path_with_qs('%s/presence/history' % self.__base_path.rstrip('/'), qs)
+        return self._path_with_qs('%s/presence/history' % self.__base_path.rstrip('/'), qs)
 
+    def _presence_response_handler(self, stream=False):
         if self.__cipher:
-            presence_handler = make_encrypted_presence_response_handler(
-                self.__cipher, self.__binary)
+            return make_encrypted_presence_response_handler(
+                self.__cipher, self.__binary, stream)
         else:
-            presence_handler = make_presence_response_handler(self.__binary)
+            return make_presence_response_handler(self.__binary, stream)
 
-        return PaginatedResult.paginated_query(
-            self.__http,
-            path,
-            {},
-            presence_handler
-        )
+    @property
+    def http(self):
+        return self.__http
 
 
-def make_presence_response_handler(binary):
+def make_presence_response_handler(binary, stream=False):
     def presence_response_handler(response):
+        json_backend = response.json_backend
+        if stream:
+            return (PresenceMessage.from_dict(message, json_backend=json_backend)
+                    for message in response.iter_native())
         messages = response.to_native()
-        return [PresenceMessage.from_dict(message) for message in messages]
+        return [PresenceMessage.from_dict(message, json_backend=json_backend)
+                for message in messages]
     return presence_response_handler
 
 
-def make_encrypted_presence_response_handler(cipher, binary):
+def make_encrypted_presence_response_handler(cipher, binary, stream=False):
     def encrypted_presence_response_handler(response):
+        json_backend = response.json_backend
+        if stream:
+            return (PresenceMessage.from_dict(message, cipher, json_backend)
+                    for message in response.iter_native())
         messages = response.to_native()
-        return [PresenceMessage.from_dict(message, cipher) for message in messages]
+        return [PresenceMessage.from_dict(message, cipher, json_backend)
+                for message in messages]
     return encrypted_presence_response_handler
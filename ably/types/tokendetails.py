@@ -56,6 +56,15 @@ class TokenDetails(object):
         else:
             return self.__expires < timestamp + self.TOKEN_EXPIRY_BUFFER
 
+    def to_dict(self):
+        return {
+            'token': self.token,
+            'expires': self.expires,
+            'issued': self.issued,
+            'capability': six.text_type(self.capability),
+            'clientId': self.client_id,
+        }
+
     @staticmethod
     def from_dict(obj):
         kwargs = {
@@ -1,11 +1,16 @@
 
 import base64
+import binascii
+import os
+import time
 
 import six
 
 import hashlib
 import hmac
 
+from ably.types.capability import Capability
+
 
 class TokenRequest(object):
 
@@ -82,3 +87,84 @@ class TokenRequest(object):
     @property
     def timestamp(self):
         return self.__timestamp
+
+
+class TokenRequestFactory(object):
+    """Mints signed TokenRequests for one key, for auth servers creating
+    many of them. The HMAC key is set up once, and the canonical strings of
+    capabilities are looked up in the cache of `Capability.canonical`.
+
+    Tokens requests get the `ttl`, `capability` and `client_id` given here
+    unless `create` is passed others.
+    """
+    def __init__(self, key=None, key_name=None, key_secret=None, ttl=None,
+                 capability=None, client_id=None):
+        if key is not None:
+            key_name, key_secret = key.split(':', 1)
+        if not key_name or not key_secret:
+            raise ValueError("TokenRequestFactory needs a key")
+        if isinstance(key_secret, six.text_type):
+            key_secret = key_secret.encode('utf8')
+        self.__key_name = key_name
+        self.__hmac = hmac.new(key_secret, digestmod=hashlib.sha256)
+        self.__ttl = ttl
+        self.__capability = capability
+        self.__client_id = client_id
+
+    def create(self, ttl=None, capability=None, client_id=None,
+               timestamp=None, nonce=None):
+        """Returns a signed TokenRequest. `timestamp` defaults to now, in
+        milliseconds since the epoch, and `nonce` to a random one."""
+        if timestamp is None:
+            timestamp = time.time() * 1000
+        return self.__create(ttl, capability, client_id, int(timestamp), nonce)
+
+    def create_many(self, token_params, timestamp=None):
+        """Returns a signed TokenRequest for each dict of `token_params`,
+        with the keys taken by `create`, all with the same default
+        timestamp"""
+        if timestamp is None:
+            timestamp = time.time() * 1000
+        timestamp = int(timestamp)
+        create = self.__create
+        return [create(params.get('ttl'), params.get('capability'),
+                       params.get('client_id'),
+                       int(params.get('timestamp') or timestamp),
+                       params.get('nonce'))
+                for params in token_params]
+
+    def __create(self, ttl, capability, client_id, timestamp, nonce):
+        ttl = ttl or self.__ttl
+        if capability is None:
+            capability = self.__capability
+        capability = self.capability_string(capability)
+        client_id = client_id or self.__client_id
+        nonce = nonce or binascii.hexlify(os.urandom(8)).decode('ascii')
+
+        sign_text = six.u("\n").join([
+            self.__key_name,
+            six.text_type(ttl or ""),
+            capability,
+            client_id or "",
+            "%d" % timestamp,
+            nonce,
+            "",
+        ])
+        mac = self.__hmac.copy()
+        mac.update(sign_text.encode('utf8'))
+        mac = base64.b64encode(mac.digest()).decode('utf8')
+        return TokenRequest(key_name=self.__key_name, client_id=client_id,
+                            nonce=nonce, mac=mac, capability=capability,
+                            ttl=ttl, timestamp=timestamp)
+
+    @staticmethod
+    def capability_string(capability):
+        """Returns the canonical JSON of `capability`, see
+        `Capability.canonical`, or '' for None"""
+        if capability is None:
+            return ''
+        return Capability.canonical(capability)
+
+    @property
+    def key_name(self):
+        return self.__key_name
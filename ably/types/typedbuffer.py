@@ -42,6 +42,8 @@ _decoders[DataType.JSONOBJECT] = lambda b: json.loads(b.decode('utf-8'))
 
 
 class TypedBuffer(object):
+    __slots__ = ('__buffer', '__type')
+
     def __init__(self, buffer, type):
         self.__buffer = buffer
         self.__type = type
@@ -0,0 +1,22 @@
+"""Helpers shared by the asyncio client. Requires Python 3.5+."""
+from __future__ import absolute_import
+
+import functools
+import logging
+
+from ably.util.exceptions import AblyException
+
+log = logging.getLogger(__name__)
+
+
+def catch_all(func):
+    """Coroutine counterpart of `ably.util.exceptions.catch_all`"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            log.exception(e)
+            raise AblyException.from_exception(e)
+
+    return wrapper
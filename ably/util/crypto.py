@@ -1,18 +1,40 @@
 from __future__ import absolute_import
 
+import hmac
 import logging
+import struct
 
 import six
 from six.moves import range
 
 from Crypto.Cipher import AES
 from Crypto import Random
+from Crypto.Util import Counter
+from Crypto.Util.strxor import strxor
 
 from ably.types.typedbuffer import TypedBuffer
 from ably.util.exceptions import AblyException
 
 log = logging.getLogger(__name__)
 
+# PKCS#7 padding of each length
+_PADDINGS = [six.int2byte(size) * size for size in range(256)]
+
+
+def _accepts_buffers():
+    # pycryptodome takes any buffer, memoryview slices included, and can
+    # write the ciphertext over the plaintext; pycrypto only takes strings
+    if six.PY2:
+        return False
+    try:
+        block = bytearray(16)
+        AES.new(b'\0' * 16, AES.MODE_ECB).encrypt(block, output=block)
+    except TypeError:
+        return False
+    return True
+
+_BUFFER_API = _accepts_buffers()
+
 
 class CipherParams(object):
     def __init__(self, algorithm='AES', mode='CBC', secret_key=None,
@@ -44,8 +66,46 @@ class CipherParams(object):
         return self.__mode
 
 
-class CbcChannelCipher(object):
+class ChannelCipher(object):
+    """Base of the ciphers of channels, one for each mode"""
+
+    def __init__(self):
+        # ciphers with the same key for the other cipher types
+        self.__ciphers = {}
+
+    def cipher_for_type(self, cipher_type):
+        """Returns a cipher with the same key decrypting data encrypted
+        with `cipher_type`, such as 'aes-128-cbc', or None if there is none,
+        for channels whose messages were encrypted in another mode"""
+        if cipher_type == self.cipher_type:
+            return self
+        try:
+            return self.__ciphers[cipher_type]
+        except KeyError:
+            pass
+
+        cipher = None
+        try:
+            algorithm, key_length, mode = cipher_type.split('-')
+            if algorithm == 'aes' and int(key_length) == len(self.secret_key) * 8:
+                cipher = get_cipher(CipherParams(
+                    algorithm='AES', mode=mode.upper(), secret_key=self.secret_key))
+        except (ValueError, NotImplementedError):
+            pass
+        self.__ciphers[cipher_type] = cipher
+        return cipher
+
+
+class CbcChannelCipher(ChannelCipher):
+    # most bytes encrypted by encrypt_many, or decrypted by decrypt_many, in
+    # one AES call
+    chunk_size = 64 * 1024
+    # smallest message encrypted, or decrypted, in place; below this passing
+    # buffers to pycryptodome costs more than copying
+    in_place_min_size = 16 * 1024
+
     def __init__(self, cipher_params):
+        super(CbcChannelCipher, self).__init__()
         self.__secret_key = (cipher_params.secret_key or
                              self.__random(cipher_params.key_length / 8))
         self.__iv = cipher_params.iv or self.__random(16)
@@ -58,53 +118,162 @@ class CbcChannelCipher(object):
         self.__mode = cipher_params.mode
         self.__key_length = cipher_params.key_length
         self.__encryptor = AES.new(self.__secret_key, AES.MODE_CBC, self.__iv)
+        # CBC decryption is done by hand on top of this, so that the key is
+        # expanded once rather than for every message
+        self.__decryptor = AES.new(self.__secret_key, AES.MODE_ECB)
 
-    def __pad(self, data):
-        padding_size = self.__block_size - (len(data) % self.__block_size)
-
-        padding_char = six.int2byte(padding_size)
-        padded = data + padding_char * padding_size
-
-        return padded
-
-    def __unpad(self, data):
+    def __padding_size(self, data):
         padding_size = six.indexbytes(data, -1)
 
-        if padding_size > len(data):
-            # Too short
-            raise AblyException('invalid-padding', 0, 0)
-
-        if padding_size == 0:
-            # Missing padding
+        if padding_size == 0 or padding_size > min(len(data), self.__block_size):
+            # Missing padding, or too short
             raise AblyException('invalid-padding', 0, 0)
 
-        for i in range(padding_size):
+        # the padding bytes are compared at once, taking the same time
+        # whichever of them is wrong
+        if not hmac.compare_digest(six.binary_type(data[-padding_size:]),
+                                   _PADDINGS[padding_size]):
             # Invalid padding bytes
-            if padding_size != six.indexbytes(data, -i - 1):
-                raise AblyException('invalid-padding', 0, 0)
+            raise AblyException('invalid-padding', 0, 0)
 
-        return data[:-padding_size]
+        return padding_size
 
     def __random(self, length):
         rndfile = Random.new()
         return rndfile.read(length)
 
     def encrypt(self, plaintext):
-        if isinstance(plaintext, bytearray):
-            plaintext = six.binary_type(plaintext)
-        padded_plaintext = self.__pad(plaintext)
-        encrypted = self.__iv + self.__encryptor.encrypt(padded_plaintext)
-        self.__iv = encrypted[-self.__block_size:]
+        """Returns a bytearray with the IV followed by the padded, encrypted
+        `plaintext`. Large plaintexts are copied once, into the bytearray
+        returned, and encrypted there."""
+        block_size = self.__block_size
+        length = len(plaintext)
+        padding = _PADDINGS[block_size - (length % block_size)]
+        if not _BUFFER_API or length < self.in_place_min_size:
+            encrypted = bytearray(self.__iv)
+            encrypted += self.__encryptor.encrypt(
+                six.binary_type(plaintext) + padding)
+        else:
+            encrypted = bytearray(block_size + length + len(padding))
+            encrypted[:block_size] = self.__iv
+            encrypted[block_size:block_size + length] = plaintext
+            encrypted[block_size + length:] = padding
+            view = memoryview(encrypted)[block_size:]
+            self.__encryptor.encrypt(view, output=view)
+        self.__iv = six.binary_type(encrypted[-block_size:])
+        return encrypted
+
+    def encrypt_many(self, plaintexts, executor=None):
+        """Encrypts several messages, returning the same ciphertexts as
+        encrypting them one after the other. Small messages are encrypted
+        together, up to `chunk_size` bytes in one AES call.
+
+        Each message is encrypted with the last block of the one before as
+        its IV, so together they make up one CBC stream. That is also why,
+        unlike decryption, encryption can't be split between threads, and
+        `executor` is not used: the CTR and GCM ciphers can."""
+        encrypted = []
+        chunk = []
+        chunk_size = 0
+        for plaintext in plaintexts:
+            if chunk and (chunk_size + len(plaintext) > self.chunk_size or
+                          len(plaintext) >= self.in_place_min_size):
+                encrypted.extend(self.__encrypt_chunk(chunk))
+                chunk = []
+                chunk_size = 0
+            if len(plaintext) >= self.in_place_min_size:
+                encrypted.append(self.encrypt(plaintext))
+            else:
+                chunk.append(plaintext)
+                chunk_size += len(plaintext)
+        if chunk:
+            encrypted.extend(self.__encrypt_chunk(chunk))
+        return encrypted
+
+    def __encrypt_chunk(self, plaintexts):
+        if len(plaintexts) == 1:
+            return [self.encrypt(plaintexts[0])]
+
+        block_size = self.__block_size
+        parts = []
+        lengths = []
+        for plaintext in plaintexts:
+            padding = _PADDINGS[block_size - (len(plaintext) % block_size)]
+            parts.append(six.binary_type(plaintext))
+            parts.append(padding)
+            lengths.append(len(plaintext) + len(padding))
+        stream = self.__encryptor.encrypt(b''.join(parts))
+
+        encrypted = []
+        offset = 0
+        for length in lengths:
+            message = bytearray(self.__iv)
+            message += stream[offset:offset + length]
+            offset += length
+            self.__iv = stream[offset - block_size:offset]
+            encrypted.append(message)
         return encrypted
 
     def decrypt(self, ciphertext):
-        if isinstance(ciphertext, bytearray):
-            ciphertext = six.binary_type(ciphertext)
-        iv = ciphertext[:self.__block_size]
-        ciphertext = ciphertext[self.__block_size:]
-        decryptor = AES.new(self.__secret_key, AES.MODE_CBC, iv)
-        decrypted = decryptor.decrypt(ciphertext)
-        return bytearray(self.__unpad(decrypted))
+        return self.decrypt_many([ciphertext])[0]
+
+    def decrypt_many(self, ciphertexts, executor=None):
+        """Decrypts several messages, each with its IV first, at once.
+
+        In CBC a block decrypts to AES^-1(block) xor the block before it,
+        the IV for the first, which for a whole message is its ciphertext
+        without the last block. So the blocks of many small messages can go
+        through a single AES call, up to `chunk_size` bytes, and
+        the chunks can be decrypted in parallel by the threads of a
+        `concurrent.futures.Executor`, pycryptodome releasing the GIL."""
+        block_size = self.__block_size
+        chunks = []
+        chunk = []
+        chunk_size = 0
+        for ciphertext in ciphertexts:
+            if isinstance(ciphertext, bytearray) and not _BUFFER_API:
+                ciphertext = six.binary_type(ciphertext)
+            if len(ciphertext) < 2 * block_size or len(ciphertext) % block_size:
+                raise AblyException('invalid-ciphertext', 0, 0)
+            if chunk and chunk_size + len(ciphertext) > self.chunk_size:
+                chunks.append(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(ciphertext)
+            chunk_size += len(ciphertext)
+        if chunk:
+            chunks.append(chunk)
+
+        if executor is not None and len(chunks) > 1:
+            decrypted = executor.map(self.__decrypt_chunk, chunks)
+        else:
+            decrypted = map(self.__decrypt_chunk, chunks)
+        return [plaintext for plaintexts in decrypted for plaintext in plaintexts]
+
+    def __decrypt_chunk(self, ciphertexts):
+        block_size = self.__block_size
+        if (len(ciphertexts) == 1 and _BUFFER_API and
+                len(ciphertexts[0]) >= self.in_place_min_size):
+            # decrypted straight into the bytearray returned
+            ciphertext = memoryview(ciphertexts[0])
+            decrypted = bytearray(len(ciphertext) - block_size)
+            self.__decryptor.decrypt(ciphertext[block_size:], output=decrypted)
+            strxor(decrypted, ciphertext[:-block_size], output=decrypted)
+            del decrypted[len(decrypted) - self.__padding_size(decrypted):]
+            return [decrypted]
+
+        decrypted = memoryview(strxor(
+            self.__decryptor.decrypt(b''.join(
+                [ciphertext[block_size:] for ciphertext in ciphertexts])),
+            b''.join([ciphertext[:-block_size] for ciphertext in ciphertexts])))
+        plaintexts = []
+        offset = 0
+        for ciphertext in ciphertexts:
+            end = offset + len(ciphertext) - block_size
+            padding_size = self.__padding_size(decrypted[offset:end])
+            plaintexts.append(bytearray(decrypted[offset:end - padding_size]))
+            offset = end
+        return plaintexts
 
     @property
     def secret_key(self):
@@ -120,8 +289,221 @@ class CbcChannelCipher(object):
                 self.__mode)).lower()
 
 
+class NonceChannelCipher(ChannelCipher):
+    """Base of the ciphers encrypting every message on its own, with a
+    random nonce sent before its ciphertext.
+
+    Unlike CBC messages need no padding and don't depend on the messages
+    before them, so `encrypt_many` and `decrypt_many` can spread them over
+    the threads of a `concurrent.futures.Executor`."""
+    mode = None
+    nonce_size = 12
+    # bytes after the ciphertext
+    tag_size = 0
+    # most bytes encrypted, or decrypted, by one task of an executor
+    chunk_size = 64 * 1024
+
+    def __init__(self, cipher_params):
+        super(NonceChannelCipher, self).__init__()
+        if cipher_params.algorithm.lower() != 'aes':
+            raise NotImplementedError('Only AES algorithm is supported')
+        self.__secret_key = (cipher_params.secret_key or
+                             Random.get_random_bytes(cipher_params.key_length // 8))
+        self.__key_length = len(self.__secret_key) * 8
+
+    def encrypt(self, plaintext):
+        """Returns a bytearray with a new nonce followed by the encrypted
+        `plaintext` (and its tag)"""
+        return self._encrypt_chunk([plaintext])[0]
+
+    def encrypt_many(self, plaintexts, executor=None):
+        return self.__map(self._encrypt_chunk, plaintexts, executor)
+
+    def decrypt(self, ciphertext):
+        return self.decrypt_many([ciphertext])[0]
+
+    def decrypt_many(self, ciphertexts, executor=None):
+        minimum_size = self.nonce_size + self.tag_size
+        if any(len(ciphertext) < minimum_size for ciphertext in ciphertexts):
+            raise AblyException('invalid-ciphertext', 0, 0)
+        return self.__map(self._decrypt_chunk, ciphertexts, executor)
+
+    def _encrypt_chunk(self, plaintexts):
+        return [self._encrypt(Random.get_random_bytes(self.nonce_size), plaintext)
+                for plaintext in plaintexts]
+
+    def _decrypt_chunk(self, ciphertexts):
+        return [self._decrypt(ciphertext) for ciphertext in ciphertexts]
+
+    def _encrypt(self, nonce, plaintext):
+        raise NotImplementedError()
+
+    def _decrypt(self, ciphertext):
+        raise NotImplementedError()
+
+    def __map(self, function, items, executor):
+        chunks = []
+        chunk = []
+        chunk_size = 0
+        for item in items:
+            if chunk and chunk_size + len(item) > self.chunk_size:
+                chunks.append(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(item)
+            chunk_size += len(item)
+        if chunk:
+            chunks.append(chunk)
+
+        if executor is not None and len(chunks) > 1:
+            results = executor.map(function, chunks)
+        else:
+            results = map(function, chunks)
+        return [result for chunk in results for result in chunk]
+
+    @property
+    def secret_key(self):
+        return self.__secret_key
+
+    @property
+    def cipher_type(self):
+        return 'aes-%s-%s' % (self.__key_length, self.mode)
+
+
+# CTR counter blocks 0, 1, 2... with zeros in place of the nonce
+_counter_blocks = b''
+
+
+def _get_counter_blocks(count):
+    global _counter_blocks
+    if len(_counter_blocks) < 16 * count:
+        _counter_blocks = b''.join([
+            struct.pack('>12xI', i)
+            for i in range(max(count, 2 * len(_counter_blocks) // 16))])
+    return _counter_blocks[:16 * count]
+
+
+class CtrChannelCipher(NonceChannelCipher):
+    """AES in CTR mode: a 12 byte nonce, then the ciphertext, with the
+    counter of the last 4 bytes of a block starting at 0.
+
+    The key stream of messages of up to `max_batched_size` bytes is made
+    here, with one AES call for a whole chunk of messages: each counter
+    block is the nonce xor a cached block holding just the counter."""
+    mode = 'ctr'
+    max_batched_size = 256 * 1024
+
+    def __init__(self, cipher_params):
+        super(CtrChannelCipher, self).__init__(cipher_params)
+        self.__ecb = AES.new(self.secret_key, AES.MODE_ECB)
+
+    def _encrypt_chunk(self, plaintexts):
+        nonces = [Random.get_random_bytes(self.nonce_size) for plaintext in plaintexts]
+        return self.__xor_key_streams(nonces, plaintexts, True)
+
+    def _decrypt_chunk(self, ciphertexts):
+        nonce_size = self.nonce_size
+        if not _BUFFER_API:
+            ciphertexts = [six.binary_type(ciphertext) for ciphertext in ciphertexts]
+        else:
+            ciphertexts = [memoryview(ciphertext) for ciphertext in ciphertexts]
+        return self.__xor_key_streams(
+            [six.binary_type(ciphertext[:nonce_size]) for ciphertext in ciphertexts],
+            [ciphertext[nonce_size:] for ciphertext in ciphertexts], False)
+
+    def __xor_key_streams(self, nonces, texts, with_nonces):
+        """Returns bytearrays with each text xor the key stream of its
+        nonce, after the nonce if `with_nonces`"""
+        if any(len(text) > self.max_batched_size for text in texts):
+            return [self.__xor_key_stream(nonce, text, with_nonces)
+                    for nonce, text in zip(nonces, texts)]
+
+        # texts are xored whole blocks at a time, their last block with
+        # zeros after the text
+        counts = [(len(text) + 15) // 16 for text in texts]
+        counter_blocks = _get_counter_blocks(max(counts) if counts else 0)
+        key_stream = self.__ecb.encrypt(strxor(
+            b''.join([(nonce + b'\0\0\0\0') * count
+                      for nonce, count in zip(nonces, counts)]),
+            b''.join([counter_blocks[:16 * count] for count in counts])))
+        parts = []
+        for text, count in zip(texts, counts):
+            parts.append(six.binary_type(text))
+            parts.append(b'\0' * (16 * count - len(text)))
+        xored = strxor(key_stream, b''.join(parts))
+
+        results = []
+        offset = 0
+        for nonce, text, count in zip(nonces, texts, counts):
+            result = bytearray(nonce if with_nonces else b'')
+            result += xored[offset:offset + len(text)]
+            results.append(result)
+            offset += 16 * count
+        return results
+
+    def __xor_key_stream(self, nonce, text, with_nonce):
+        counter = Counter.new(32, prefix=nonce, initial_value=0)
+        aes = AES.new(self.secret_key, AES.MODE_CTR, counter=counter)
+        result = bytearray(nonce if with_nonce else b'')
+        if _BUFFER_API:
+            start = len(result)
+            result += text
+            view = memoryview(result)[start:]
+            aes.encrypt(view, output=view)
+        else:
+            result += aes.encrypt(six.binary_type(text))
+        return result
+
+
+class GcmChannelCipher(NonceChannelCipher):
+    """AES in GCM mode: a 12 byte nonce, then the ciphertext and its 16
+    byte tag, authenticating the message. Requires pycryptodome."""
+    mode = 'gcm'
+    tag_size = 16
+
+    def __init__(self, cipher_params):
+        if not hasattr(AES, 'MODE_GCM'):
+            raise NotImplementedError('GCM mode requires pycryptodome')
+        super(GcmChannelCipher, self).__init__(cipher_params)
+
+    def __new_aes(self, nonce):
+        return AES.new(self.secret_key, AES.MODE_GCM, nonce=six.binary_type(nonce),
+                       mac_len=self.tag_size)
+
+    def _encrypt(self, nonce, plaintext):
+        aes = self.__new_aes(nonce)
+        if not _BUFFER_API:
+            ciphertext, tag = aes.encrypt_and_digest(six.binary_type(plaintext))
+            return bytearray(nonce + ciphertext + tag)
+
+        nonce_size = self.nonce_size
+        encrypted = bytearray(nonce_size + len(plaintext) + self.tag_size)
+        encrypted[:nonce_size] = nonce
+        encrypted[nonce_size:-self.tag_size] = plaintext
+        view = memoryview(encrypted)[nonce_size:-self.tag_size]
+        aes.encrypt(view, output=view)
+        encrypted[-self.tag_size:] = aes.digest()
+        return encrypted
+
+    def _decrypt(self, ciphertext):
+        nonce_size = self.nonce_size
+        if _BUFFER_API:
+            ciphertext = memoryview(ciphertext)
+        else:
+            ciphertext = six.binary_type(ciphertext)
+        aes = self.__new_aes(ciphertext[:nonce_size])
+        try:
+            decrypted = aes.decrypt_and_verify(ciphertext[nonce_size:-self.tag_size],
+                                               ciphertext[-self.tag_size:])
+        except ValueError:
+            # Tampered with, or encrypted with another key
+            raise AblyException('invalid-tag', 0, 0)
+        return bytearray(decrypted)
+
+
 class CipherData(TypedBuffer):
     ENCODING_ID = 'cipher'
+    __slots__ = ('__cipher_type',)
 
     def __init__(self, buffer, type, cipher_type=None, **kwargs):
         self.__cipher_type = cipher_type
@@ -131,6 +513,13 @@ class CipherData(TypedBuffer):
     def encoding_str(self):
         return self.ENCODING_ID + '+' + self.__cipher_type
 
+# channel cipher classes by CipherParams.mode
+CHANNEL_CIPHERS = {
+    'cbc': CbcChannelCipher,
+    'ctr': CtrChannelCipher,
+    'gcm': GcmChannelCipher,
+}
+
 DEFAULT_KEYLENGTH = 16
 DEFAULT_BLOCKLENGTH = 16
 
@@ -149,4 +538,8 @@ def get_cipher(cipher_params):
         params = cipher_params
     else:
         raise AblyException("ChannelOptions not supported", 400, 40000)
-    return CbcChannelCipher(params)
+    try:
+        cipher_class = CHANNEL_CIPHERS[params.mode.lower()]
+    except KeyError:
+        raise NotImplementedError('Only CBC, CTR and GCM modes are supported')
+    return cipher_class(params)
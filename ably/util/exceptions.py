@@ -20,6 +20,8 @@ class AblyException(Exception, UnicodeMixin):
         self.message = message
         self.code = code
         self.status_code = status_code
+        # the failed response, when raised by raise_for_response
+        self.response = None
 
     def __unicode__(self):
         return six.u('%s %s %s') % (self.code, self.status_code, self.message)
@@ -33,6 +35,14 @@ class AblyException(Exception, UnicodeMixin):
 
     @staticmethod
     def raise_for_response(response):
+        try:
+            AblyException._raise_for_response(response)
+        except AblyException as e:
+            e.response = response
+            raise
+
+    @staticmethod
+    def _raise_for_response(response):
         if response.status_code >= 200 and response.status_code < 300:
             # Valid response
             return
@@ -88,3 +98,9 @@ class AblyAuthException(AblyException):
 
 class IncompatibleClientIdException(AblyException):
     pass
+
+
+class CircuitOpenException(AblyException):
+    """Raised, with code 50390, instead of sending a request to a host
+    whose circuit breaker is open"""
+    pass
@@ -0,0 +1,88 @@
+from __future__ import absolute_import
+
+import json
+import logging
+
+import six
+
+log = logging.getLogger(__name__)
+
+
+class StdlibJSONBackend(object):
+    """Serialises with the json module of the standard library"""
+    name = 'stdlib'
+
+    def dumps(self, obj, compact=False):
+        if compact:
+            return json.dumps(obj, separators=(',', ':'))
+        return json.dumps(obj)
+
+    def loads(self, data):
+        if isinstance(data, (six.binary_type, bytearray)):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonBackend(object):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.__orjson = orjson
+
+    def dumps(self, obj, compact=False):
+        return self.__orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, data):
+        return self.__orjson.loads(data)
+
+
+class UjsonBackend(object):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self.__ujson = ujson
+
+    def dumps(self, obj, compact=False):
+        return self.__ujson.dumps(obj, escape_forward_slashes=False)
+
+    def loads(self, data):
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        return self.__ujson.loads(data)
+
+
+_backend_classes = {
+    'stdlib': StdlibJSONBackend,
+    'orjson': OrjsonBackend,
+    'ujson': UjsonBackend,
+}
+_backends = {}
+
+default_json_backend = StdlibJSONBackend()
+
+
+def get_json_backend(backend=None):
+    """Returns the JSON backend called `backend`, one of 'stdlib', 'orjson'
+    or 'ujson', falling back to the standard library if its module can't
+    be imported. An object with `dumps` and `loads` is returned as is.
+
+    `dumps(obj, compact=False)` serialises without whitespace when
+    `compact` is set, which request bodies use; otherwise its output may
+    be that of json.dumps, which JSON message data keeps."""
+    if backend is None:
+        return default_json_backend
+    if not isinstance(backend, six.string_types):
+        return backend
+    if backend not in _backend_classes:
+        raise ValueError("Unknown json_backend %r, use one of %s" % (
+            backend, ', '.join(sorted(_backend_classes))))
+    if backend not in _backends:
+        try:
+            _backends[backend] = _backend_classes[backend]()
+        except ImportError:
+            log.warning("json_backend %r is not installed, using the standard"
+                        " library json module", backend)
+            _backends[backend] = default_json_backend
+    return _backends[backend]
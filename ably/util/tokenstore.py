@@ -0,0 +1,151 @@
+"""Stores sharing tokens between the clients of several processes.
+
+A client given a `token_store` looks there for a valid token before
+requesting one, and puts there the tokens it obtains. While a token is
+requested the store is locked, so that when many processes start or
+renew their token at once only one of them asks for it.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ably.types.tokendetails import TokenDetails
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TokenStore(object):
+    """The interface of token stores. Keys are strings identifying the
+    credentials and token params a token was obtained with."""
+
+    def get(self, key):
+        """Returns the TokenDetails stored for `key`, or None"""
+        raise NotImplementedError
+
+    def set(self, key, token_details):
+        raise NotImplementedError
+
+    def lock(self, key):
+        """Returns a lock, held while the token for `key` is requested,
+        with `acquire()` and `release()` methods that may be called from
+        different threads. `acquire()` returns False if it gave up."""
+        raise NotImplementedError
+
+
+class FileTokenStore(TokenStore):
+    """Keeps tokens in files of `directory`, locked with flock, for the
+    processes of a host. Putting the directory in memory (such as
+    /dev/shm on Linux) spares the disk. Requires a POSIX system."""
+
+    def __init__(self, directory=None):
+        if fcntl is None:
+            raise ImportError("FileTokenStore needs the fcntl module")
+        self.__directory = directory or os.path.join(
+            tempfile.gettempdir(), 'ably-tokens')
+        if not os.path.isdir(self.__directory):
+            try:
+                os.makedirs(self.__directory, 0o700)
+            except OSError:
+                # created by another process meanwhile
+                if not os.path.isdir(self.__directory):
+                    raise
+
+    def get(self, key):
+        try:
+            with open(self.__path(key, '.json')) as f:
+                return TokenDetails.from_dict(json.load(f))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, token_details):
+        # written to another file first so that readers don't see it partly
+        # written
+        fd, tmp_path = tempfile.mkstemp(dir=self.__directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(token_details.to_dict(), f)
+        os.rename(tmp_path, self.__path(key, '.json'))
+
+    def lock(self, key):
+        return _FileLock(self.__path(key, '.lock'))
+
+    def __path(self, key, suffix):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.__directory, name + suffix)
+
+    @property
+    def directory(self):
+        return self.__directory
+
+
+class _FileLock(object):
+    def __init__(self, path):
+        self.__path = path
+        self.__file = None
+
+    def acquire(self):
+        f = open(self.__path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        except Exception:
+            f.close()
+            raise
+        self.__file = f
+        return True
+
+    def release(self):
+        f, self.__file = self.__file, None
+        try:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *excinfo):
+        self.release()
+
+
+class RedisTokenStore(TokenStore):
+    """Keeps tokens in Redis, or a server speaking its protocol, for the
+    processes of one or more hosts. `client` is a `redis.Redis` or an
+    object with the same `get`, `set` and `lock` methods. Tokens are
+    removed by Redis when they expire, and locks after `lock_timeout`
+    seconds if their holder died."""
+
+    def __init__(self, client, prefix='ably:token:', lock_timeout=30):
+        self.__client = client
+        self.__prefix = prefix
+        self.__lock_timeout = lock_timeout
+
+    def get(self, key):
+        value = self.__client.get(self.__prefix + key)
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return TokenDetails.from_dict(json.loads(value))
+
+    def set(self, key, token_details):
+        kwargs = {}
+        if token_details.expires:
+            ttl = int(token_details.expires - time.time() * 1000)
+            if ttl <= 0:
+                return
+            kwargs['px'] = ttl
+        self.__client.set(self.__prefix + key,
+                          json.dumps(token_details.to_dict()), **kwargs)
+
+    def lock(self, key):
+        return self.__client.lock(self.__prefix + key + ':lock',
+                                  timeout=self.__lock_timeout,
+                                  blocking_timeout=self.__lock_timeout,
+                                  thread_local=False)
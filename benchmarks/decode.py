@@ -0,0 +1,49 @@
+"""Measures how fast binary message payloads are decoded.
+
+    python benchmarks/decode.py
+
+Prints the time `Message.from_dict` takes to decode the data of 1KB, 64KB
+and 1MB binary messages as received with the JSON protocol (base64), and of
+the same messages encrypted, as received with the JSON protocol and with
+msgpack.
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from ably.types.message import Message  # noqa
+from ably.util.crypto import CipherParams, get_cipher  # noqa
+
+SIZES = [('1KB', 1024), ('64KB', 64 * 1024), ('1MB', 1024 * 1024)]
+KEY = b'0123456789abcdef'
+
+
+def microseconds(decode):
+    number = 20
+    best = min(timeit.repeat(decode, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    cipher = get_cipher(CipherParams(secret_key=KEY))
+    print('%-6s %12s %20s %20s' % ('', 'base64', 'encrypted base64', 'encrypted msgpack'))
+    for name, size in SIZES:
+        message = Message('binary', bytearray(os.urandom(size)))
+        plain = message.as_dict()
+        message.encrypt(cipher)
+        encrypted = message.as_dict()
+        encrypted_binary = message.as_dict(binary=True)
+
+        print('%-6s %10.1fus %18.1fus %18.1fus' % (
+            name,
+            microseconds(lambda: Message.from_dict(plain)),
+            microseconds(lambda: Message.from_dict(encrypted, cipher)),
+            microseconds(lambda: Message.from_dict(encrypted_binary, cipher))))
+
+
+if __name__ == '__main__':
+    main()
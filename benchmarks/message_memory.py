@@ -0,0 +1,50 @@
+"""Measures the memory held by decoded history messages.
+
+    python benchmarks/message_memory.py [count]
+
+Prints the bytes allocated per Message and PresenceMessage built from a
+typical wire dict, including everything they reference but not the
+payload strings shared with the wire dicts. Requires Python 3.4+.
+"""
+from __future__ import absolute_import, print_function
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from ably.types.message import Message  # noqa
+from ably.types.presence import PresenceMessage  # noqa
+
+
+def wire_dicts(count):
+    return [{'id': 'id:%d' % i, 'name': 'event', 'clientId': 'client',
+             'connectionId': 'connection', 'timestamp': 1500000000000 + i,
+             'data': 'payload %d' % i, 'encoding': 'utf-8', 'action': 1}
+            for i in range(count)]
+
+
+def bytes_per_object(from_dict, count):
+    dicts = wire_dicts(count)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [from_dict(d) for d in dicts]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return allocated / float(count)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for cls in (Message, PresenceMessage):
+        print('%-16s %7.1f bytes per object' % (
+            cls.__name__, bytes_per_object(cls.from_dict, count)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Measures how fast publish bodies are serialised with the binary protocol.
+
+    python benchmarks/publish_msgpack.py
+
+For batches of 1, 100 and 1000 messages prints the messages per second
+serialised by MessagePacker and by packing `Message.as_dict` dicts.
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import msgpack  # noqa
+
+from ably.types.message import Message, message_packer  # noqa
+
+
+def pack_dicts(messages):
+    return msgpack.packb([message.as_dict(binary=True) for message in messages],
+                         use_bin_type=True)
+
+
+def messages_per_second(pack, messages):
+    number = max(1, 20000 // len(messages))
+    best = min(timeit.repeat(lambda: pack(messages), number=number, repeat=5))
+    return len(messages) * number / best
+
+
+def main():
+    for size in (1, 100, 1000):
+        messages = [Message('event', 'payload %d' % i, client_id='client')
+                    for i in range(size)]
+        print('%4d messages: MessagePacker %9.0f msg/s, as_dict + packb %9.0f msg/s' % (
+            size, messages_per_second(message_packer.pack, messages),
+            messages_per_second(pack_dicts, messages)))
+
+
+if __name__ == '__main__':
+    main()
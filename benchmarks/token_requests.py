@@ -0,0 +1,60 @@
+"""Measures how fast signed token requests are created.
+
+    python benchmarks/token_requests.py
+
+Prints the token requests per second created by `Auth.create_token_request`,
+by `TokenRequestFactory.create` and by `TokenRequestFactory.create_many` in
+batches of 100, for browser clients with their own client id and one of a
+few capabilities.
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from ably import AblyRest  # noqa
+from ably.types.tokenrequest import TokenRequestFactory  # noqa
+
+KEY = 'appid.keyid:keysecret'
+CAPABILITIES = [
+    {'chat:%d' % i: ['publish', 'subscribe', 'presence'], 'notifications': ['subscribe']}
+    for i in range(10)
+]
+TOKEN_PARAMS = [
+    {'client_id': 'user%d' % i, 'capability': CAPABILITIES[i % len(CAPABILITIES)],
+     'ttl': 3600000}
+    for i in range(100)
+]
+
+
+def requests_per_second(create_batch):
+    number = 50
+    best = min(timeit.repeat(create_batch, number=number, repeat=5))
+    return len(TOKEN_PARAMS) * number / best
+
+
+def main():
+    auth = AblyRest(key=KEY).auth
+    factory = TokenRequestFactory(key=KEY)
+
+    def with_auth():
+        for params in TOKEN_PARAMS:
+            auth.create_token_request(params)
+
+    def with_factory():
+        for params in TOKEN_PARAMS:
+            factory.create(**params)
+
+    def with_factory_batch():
+        factory.create_many(TOKEN_PARAMS)
+
+    print('Auth.create_token_request       %8.0f req/s' % requests_per_second(with_auth))
+    print('TokenRequestFactory.create      %8.0f req/s' % requests_per_second(with_factory))
+    print('TokenRequestFactory.create_many %8.0f req/s' % requests_per_second(with_factory_batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -26,9 +26,19 @@ setup(
     install_requires=['msgpack-python>=0.4.6',
                       'pycrypto>=2.6.1',
                       'requests>=2.7.0,<2.8',
-                      'six>=1.9.0'],  # remember to update these
+                      'six>=1.9.0',
+                      'futures>=3.0.0;python_version<"3.2"'],  # remember to update these
                                       # according to requirements.txt!
                                       # there's no easy way to reuse this.
+    extras_require={
+        # AsyncAblyRest, Python 3.5+ only
+        'async': ['aiohttp>=3.3.0'],
+        # json_backend='orjson' / 'ujson'
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+        # RedisTokenStore
+        'redis': ['redis>=3.0'],
+    },
     author="Ably",
     author_email='support@ably.io',
     url='https://github.com/ably/ably-python',
@@ -11,7 +11,7 @@ import msgpack
 from ably import AblyRest
 from ably import ChannelOptions, CipherParams
 from ably.util.crypto import get_cipher, get_default_params
-from ably.types.message import Message
+from ably.types.message import Message, message_packer
 
 from test.ably.restsetup import RestSetup
 from test.ably.utils import BaseTestCase
@@ -147,6 +147,21 @@ class TestTextEncodersNoEncryption(BaseTestCase):
         self.assertEqual(decoded_data['data'], data)
         self.assertEqual(decoded_data['encoding'], 'foo/bar')
 
+    def test_decode_base64(self):
+        data = bytearray(b'\x00\xfffoo')
+        encoded = base64.b64encode(data)
+        for encoded_data in (encoded, encoded.decode('ascii')):
+            decoded_data = Message.decode(encoded_data, 'base64')
+            self.assertEqual(decoded_data['data'], data)
+            self.assertIsInstance(decoded_data['data'], bytearray)
+            self.assertEqual(decoded_data['encoding'], '')
+
+        # left encrypted, without a cipher
+        decoded_data = Message.decode(encoded, 'cipher+aes-128-cbc/base64')
+        self.assertEqual(decoded_data['data'], data)
+        self.assertIsInstance(decoded_data['data'], bytearray)
+        self.assertEqual(decoded_data['encoding'], 'cipher+aes-128-cbc')
+
 
 class TestTextEncodersEncryption(BaseTestCase):
     @classmethod
@@ -491,3 +506,77 @@ class TestBinaryEncodersEncryption(BaseTestCase):
         message = channel.history().items[0]
         self.assertEqual(message.data, data)
         self.assertFalse(message.encoding)
+
+
+class TestLazyDecoding(BaseTestCase):
+
+    def test_metadata_does_not_decode(self):
+        obj = Message('event', {'a': 1}, client_id='client').as_dict()
+        with mock.patch.object(Message, 'decode') as decode_mock:
+            message = Message.from_dict(obj, lazy=True)
+            self.assertEqual(message.name, 'event')
+            self.assertEqual(message.client_id, 'client')
+            self.assertFalse(decode_mock.called)
+
+    def test_data_is_decoded_once(self):
+        obj = Message('event', bytearray(b'foo')).as_dict()
+        message = Message.from_dict(obj, lazy=True)
+        with mock.patch.object(Message, 'decode',
+                               wraps=Message.decode) as decode_mock:
+            self.assertEqual(message.data, bytearray(b'foo'))
+            self.assertIsInstance(message.data, bytearray)
+            self.assertFalse(message.encoding)
+            self.assertEqual(decode_mock.call_count, 1)
+
+    def test_same_result_as_eager(self):
+        cipher = get_cipher(get_default_params(b'keyfordecrypt_16'))
+        for data in (six.u('fóo'), bytearray(b'foob'), {'a': [1, 2]}):
+            message = Message('event', data)
+            message.encrypt(cipher)
+            obj = message.as_dict()
+            for channel_cipher in (cipher, None):
+                eager = Message.from_dict(obj, channel_cipher)
+                lazy = Message.from_dict(obj, channel_cipher, lazy=True)
+                self.assertEqual(lazy.encoding, eager.encoding)
+                self.assertEqual(lazy, eager)
+                self.assertEqual(lazy.as_dict(), eager.as_dict())
+
+    def test_decoding_failure_is_raised_again(self):
+        message = Message.from_dict({'data': 'abc', 'encoding': 'json'}, lazy=True)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                message.data
+
+        message = Message.from_dict({'data': '[1]', 'encoding': 'json'}, lazy=True)
+        self.assertEqual(message.data, [1])
+        self.assertEqual(message.encoding, '')
+
+
+class TestMessagePacker(BaseTestCase):
+
+    def test_same_bytes_as_packing_as_dict(self):
+        cipher = get_cipher(get_default_params(b'keyfordecrypt_16'))
+        encrypted = Message('event', six.u('secret'), timestamp=1)
+        encrypted.encrypt(cipher)
+        messages = [
+            Message('event', six.u('fóo'), timestamp=1),
+            Message(None, None, timestamp=1),
+            Message('event', bytearray(b'foo'), client_id='client', id='id',
+                    connection_id='connection', timestamp=1),
+            Message('event', {'a': [1, 2]}, timestamp=1),
+            Message('event', six.u('foo'), encoding='utf-8', timestamp=1),
+            encrypted,
+        ]
+        for message in messages:
+            self.assertEqual(
+                message.as_msgpack(),
+                msgpack.packb(message.as_dict(binary=True), use_bin_type=True))
+        self.assertEqual(
+            message_packer.pack(messages),
+            msgpack.packb([m.as_dict(binary=True) for m in messages],
+                          use_bin_type=True))
+
+    def test_timestamp_defaults_to_now(self):
+        packed = msgpack.unpackb(Message('event', 'data').as_msgpack(),
+                                 encoding='utf-8')
+        self.assertGreater(packed['timestamp'], 1500000000000)
@@ -0,0 +1,297 @@
+from __future__ import absolute_import
+
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+import msgpack
+import six
+
+try:
+    from multidict import CIMultiDict
+    from ably.rest.asyncrest import AsyncAblyRest
+    from ably.http.asynchttp import AsyncHttp
+    from ably.http.asyncpaginatedresult import AsyncPaginatedResult
+except (ImportError, SyntaxError):
+    AsyncAblyRest = None
+
+from ably.types.channeloptions import ChannelOptions
+from ably.types.message import Message
+from ably.types.tokendetails import TokenDetails
+from ably.util.tokenstore import FileTokenStore
+from test.ably.utils import BaseTestCase
+
+
+def resolved(value):
+    future = asyncio.get_event_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+class FakeResponse(object):
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = CIMultiDict(headers)
+        self.charset = None
+        self.__body = body
+
+    def read(self):
+        return resolved(self.__body)
+
+    def __aenter__(self):
+        return resolved(self)
+
+    def __aexit__(self, *excinfo):
+        return resolved(None)
+
+
+class FakeSession(object):
+    """Stands in for aiohttp.ClientSession, answering with `handler`"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        self.requests.append((method, url, data, headers))
+        result = self.handler(method, url, data, headers)
+        if isinstance(result, Exception):
+            raise result
+        return FakeResponse(*result)
+
+    def close(self):
+        self.closed = True
+        return resolved(None)
+
+
+def json_response(obj, status=200, headers=None):
+    headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+    return status, headers, json.dumps(obj).encode('utf-8')
+
+
+@unittest.skipIf(AsyncAblyRest is None, 'requires Python 3.5+ and aiohttp')
+class TestAsyncRest(BaseTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def ably_with_session(self, handler, **kwargs):
+        kwargs.setdefault('key', 'fake.key:secret')
+        kwargs.setdefault('use_binary_protocol', False)
+        ably = AsyncAblyRest(**kwargs)
+        session = FakeSession(handler)
+        patcher = mock.patch.object(AsyncHttp, 'session',
+                                    new_callable=mock.PropertyMock,
+                                    return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return ably, session
+
+    def test_no_blocking_session(self):
+        ably = AsyncAblyRest(key='fake.key:secret')
+        self.assertIsNone(ably.http._Http__session)
+        self.assertEqual(ably.http.pool_stats(), {})
+        with self.assertRaises(ValueError):
+            AsyncAblyRest(key='fake.key:secret', hedge_requests=True)
+
+    def test_time(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response([1234]))
+        self.assertEqual(self.run_async(ably.time()), 1234)
+        method, url, __, headers = session.requests[0]
+        self.assertEqual(method, 'GET')
+        self.assertTrue(url.endswith('/time'))
+        self.assertNotIn('Authorization', headers)
+
+    def test_concurrent_publishes_share_session(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201))
+        channel = ably.channels.get('async')
+
+        self.run_async(asyncio.gather(
+            *[channel.publish('event', six.text_type(i)) for i in range(50)]))
+
+        self.assertEqual(len(session.requests), 50)
+        bodies = [json.loads(data) for (__, __, data, __) in session.requests]
+        self.assertEqual(sorted(int(b['data']) for b in bodies), list(range(50)))
+        for method, url, __, headers in session.requests:
+            self.assertEqual(method, 'POST')
+            self.assertTrue(url.endswith('/channels/async/publish'))
+            self.assertTrue(headers['Authorization'].startswith('Basic '))
+
+    def test_publish_binary_protocol(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201),
+            use_binary_protocol=True)
+        channel = ably.channels.get('async')
+        self.run_async(channel.publish(messages=[Message('a', 'b'),
+                                                 Message('c', 'd')]))
+        data = session.requests[0][2]
+        decoded = msgpack.unpackb(data, encoding='utf-8')
+        self.assertEqual([m['name'] for m in decoded], ['a', 'c'])
+
+    def test_history_pagination(self):
+        def handler(method, url, data, headers):
+            if 'page=2' in url:
+                return json_response([{'name': 'second', 'data': 'bar'}])
+            return json_response(
+                [{'name': 'first', 'data': 'eyJhIjoxfQ==',
+                  'encoding': 'json/base64'}],
+                headers={'Link': '<./history?page=2>; rel="next"'})
+        ably, session = self.ably_with_session(handler)
+        channel = ably.channels.get('async')
+
+        page = self.run_async(channel.history())
+        self.assertEqual(page.items[0].name, 'first')
+        self.assertEqual(page.items[0].data, {'a': 1})
+        self.assertTrue(page.has_next())
+
+        page = self.run_async(page.next())
+        self.assertEqual(page.items[0].data, 'bar')
+        self.assertTrue(page.is_last())
+        self.assertIsNone(self.run_async(page.next()))
+
+    def test_history_stream(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response([{'name': 'first', 'data': 'foo'},
+                                         {'name': 'second', 'data': 'bar'}]))
+        channel = ably.channels.get('async')
+        page = self.run_async(AsyncPaginatedResult.paginated_query(
+            ably.http, channel._history_path(), None,
+            channel._message_response_handler(stream=True), stream=True))
+        self.assertEqual([message.data for message in page.items], ['foo', 'bar'])
+
+    def test_presence_get(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response([{'clientId': 'c1', 'action': 1}]))
+        page = self.run_async(ably.channels.get('async').presence.get())
+        self.assertEqual(page.items[0].client_id, 'c1')
+        self.assertTrue(session.requests[0][1].endswith('/channels/async/presence'))
+
+    def test_token_auth(self):
+        def handler(method, url, data, headers):
+            if 'requestToken' in url:
+                return json_response({'token': 'a_token', 'issued': 1,
+                                      'expires': 2 ** 50})
+            return json_response({}, status=201)
+        ably, session = self.ably_with_session(handler, use_token_auth=True)
+
+        token_details = self.run_async(ably.auth.authorise())
+        self.assertEqual(token_details.token, 'a_token')
+        self.run_async(ably.channels.get('async').publish('event', 'data'))
+
+        self.assertEqual(len(session.requests), 2)
+        self.assertEqual(session.requests[1][3]['Authorization'],
+                         'Bearer %s' % ably.auth.token_credentials)
+
+    def test_auth_callback_coroutine(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201),
+            key=None, auth_callback=lambda params: resolved('cb_token'))
+        self.run_async(ably.channels.get('async').publish('event', 'data'))
+        self.assertEqual(ably.auth.token_details.token, 'cb_token')
+
+    def test_background_token_renewal(self):
+        now = time.time() * 1000
+        tokens = [TokenDetails('first', issued=now - 20000, expires=now + 20000),
+                  TokenDetails('second', issued=now, expires=now + 3600000)]
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201), key=None,
+            auth_callback=lambda params: tokens.pop(0), token_renew_fraction=0.5)
+        self.run_async(ably.auth.authorise())
+        self.assertEqual(ably.auth.token_details.token, 'first')
+        self.run_async(asyncio.sleep(0.05))
+        self.assertEqual(ably.auth.token_details.token, 'second')
+        self.run_async(ably.close())
+
+    def test_concurrent_authorise_requests_one_token(self):
+        calls = []
+
+        async def callback(token_params):
+            calls.append(token_params)
+            await asyncio.sleep(0.05)
+            return 'cb_token'
+
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201), key=None,
+            auth_callback=callback)
+        channel = ably.channels.get('async')
+        self.run_async(asyncio.gather(
+            *[channel.publish('event', 'data') for _ in range(5)]))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(session.requests), 5)
+
+    def test_token_store(self):
+        calls = []
+
+        def callback(token_params):
+            calls.append(token_params)
+            return TokenDetails('stored_token', expires=time.time() * 1000 + 3600000)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = FileTokenStore(directory)
+        for _ in range(2):
+            ably, session = self.ably_with_session(
+                lambda *args: json_response({}, status=201), key=None,
+                auth_callback=callback, token_store=store)
+            self.assertEqual(self.run_async(ably.auth.authorise()).token,
+                             'stored_token')
+        self.assertEqual(len(calls), 1)
+
+    def test_host_fallback(self):
+        def handler(method, url, data, headers):
+            if len(session.requests) == 1:
+                return IOError('unreachable')
+            return json_response([1])
+        ably, session = self.ably_with_session(handler)
+        self.assertEqual(self.run_async(ably.time()), 1)
+        self.assertEqual(len(session.requests), 2)
+        self.assertNotEqual(session.requests[0][1], session.requests[1][1])
+
+    def test_batch_publish(self):
+        ably, session = self.ably_with_session(
+            lambda *args: json_response({}, status=201))
+        channel = ably.channels.get(
+            'async', ChannelOptions(batch_publish=True, batch_linger=0.01,
+                                    batch_max_messages=20))
+
+        self.run_async(asyncio.gather(
+            *[channel.publish('event', six.text_type(i)) for i in range(50)]))
+
+        self.assertEqual(len(session.requests), 3)
+        batches = [json.loads(data) for (__, __, data, __) in session.requests]
+        self.assertEqual([len(batch) for batch in batches], [20, 20, 10])
+        self.assertTrue(self.run_async(channel.flush()))
+
+    def test_history_iter_items(self):
+        def handler(method, url, data, headers):
+            page = int(url.split('page=')[1]) if 'page=' in url else 1
+            link = {'Link': '<./history?page=%d>; rel="next"' % (page + 1)}
+            return json_response([{'name': 'page%d' % page, 'data': 'x'}],
+                                 headers=link if page < 4 else None)
+        ably, session = self.ably_with_session(handler)
+        page = self.run_async(ably.channels.get('async').history())
+
+        for prefetch in (0, 2):
+            names = []
+            iterator = page.iter_items(prefetch=prefetch)
+            while True:
+                try:
+                    names.append(self.run_async(iterator.__anext__()).name)
+                except StopAsyncIteration:
+                    break
+            self.assertEqual(names, ['page1', 'page2', 'page3', 'page4'])
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import logging
+import threading
 import time
 import json
 from six.moves.urllib.parse import parse_qs, urlparse
@@ -52,6 +53,152 @@ class TestAuth(BaseTestCase):
         self.assertEqual(Auth.Method.TOKEN, ably.auth.auth_mechanism)
         self.assertIs(ably.auth.token_details, td)
 
+    def test_background_token_renewal(self):
+        now = time.time() * 1000
+        tokens = [TokenDetails('first', issued=now - 20000, expires=now + 20000),
+                  TokenDetails('second', issued=now, expires=now + 3600000)]
+        renewed = threading.Event()
+
+        def callback(token_params):
+            if len(tokens) == 1:
+                renewed.set()
+            return tokens.pop(0)
+
+        ably = AblyRest(auth_callback=callback, token_renew_fraction=0.5)
+        self.assertEqual(ably.auth.authorise().token, 'first')
+        self.assertTrue(renewed.wait(5))
+        for _ in range(100):
+            if ably.auth.token_details.token == 'second':
+                break
+            time.sleep(0.01)
+        self.assertEqual(ably.auth.token_details.token, 'second')
+        ably.auth.stop_token_renewal()
+
+        with self.assertRaises(ValueError):
+            AblyRest(auth_callback=callback, token_renew_fraction=1)
+
+    def test_renewal_stops_for_token_expiring_no_later(self):
+        now = time.time() * 1000
+        token = TokenDetails('a_token', issued=now - 20000, expires=now + 20000)
+        calls = []
+
+        def callback(token_params):
+            calls.append(token_params)
+            return token
+
+        ably = AblyRest(auth_callback=callback, token_renew_fraction=0.5)
+        self.assertIs(ably.auth.authorise(), token)
+        # renewed straight away, and not again as it got the same token
+        for _ in range(100):
+            if len(calls) == 2:
+                break
+            time.sleep(0.01)
+        time.sleep(0.2)
+        self.assertEqual(len(calls), 2)
+        self.assertIsNone(ably.auth._Auth__renewal)
+
+    def test_no_background_renewal_without_means_to_renew(self):
+        ably = AblyRest(token='a_token', token_renew_fraction=0.5)
+        now = time.time() * 1000
+        token = TokenDetails('a_token', issued=now - 20000, expires=now + 20000)
+        self.assertIsNone(ably.auth._renewal_delay(token))
+
+        ably = AblyRest(auth_callback=lambda params: token, token_renew_fraction=0.5)
+        self.assertIs(ably.auth.authorise(), token)
+        self.assertAlmostEqual(ably.auth._renewal_delay(token), 0, delta=0.1)
+        token = TokenDetails('a_token', issued=now, expires=now + 3600000)
+        self.assertAlmostEqual(ably.auth._renewal_delay(token), 1800, delta=1)
+        ably.auth.stop_token_renewal()
+
+    def test_concurrent_authorise_requests_one_token(self):
+        calls = []
+
+        def callback(token_params):
+            calls.append(token_params)
+            time.sleep(0.1)
+            if len(calls) == 2:
+                raise AblyAuthException("auth server down", 401, 40170)
+            return 'token%d' % len(calls)
+
+        ably = AblyRest(auth_callback=callback)
+
+        def authorise_in_threads():
+            results = []
+
+            def authorise():
+                try:
+                    results.append(ably.auth.authorise(force=True).token)
+                except AblyAuthException as e:
+                    results.append(e.code)
+
+            threads = [threading.Thread(target=authorise) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        self.assertEqual(authorise_in_threads(), ['token1'] * 10)
+        self.assertEqual(len(calls), 1)
+        # the failure goes to every thread
+        self.assertEqual(authorise_in_threads(), [40170] * 10)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ably.auth.authorise(force=True).token, 'token3')
+
+    def test_concurrent_authorise_with_expired_token(self):
+        calls = []
+        now = time.time() * 1000
+
+        def callback(token_params):
+            calls.append(token_params)
+            time.sleep(0.1)
+            return TokenDetails('new', issued=now, expires=now + 3600000)
+
+        expired = TokenDetails('old', issued=now - 7200000, expires=now - 3600000)
+        ably = AblyRest(token_details=expired, auth_callback=callback)
+
+        # every other thread finds the token expired while the first one is
+        # getting a new token, but only gets the lock once it has it
+        acquire_token = ably.auth._acquire_token
+        first = []
+        obtained = threading.Event()
+
+        def delayed_acquire_token(*args, **kwargs):
+            if not first:
+                first.append(threading.current_thread())
+                try:
+                    return acquire_token(*args, **kwargs)
+                finally:
+                    obtained.set()
+            obtained.wait()
+            return acquire_token(*args, **kwargs)
+
+        results = []
+        errors = []
+
+        def authorise(index):
+            try:
+                if index % 2:
+                    results.append(ably.auth.authorise().token)
+                else:
+                    headers = ably.auth._get_auth_headers()
+                    results.append(headers['Authorization'])
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(ably.auth, '_acquire_token', delayed_acquire_token):
+            threads = [threading.Thread(target=authorise, args=(i,)) for i in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(ably.auth.token_details.token, 'new')
+        self.assertEqual(set(results) - {'new'}, {ably.auth._get_auth_headers()['Authorization']})
+
     def test_auth_init_with_token_callback(self):
         callback_called = []
 
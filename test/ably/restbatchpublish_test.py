@@ -0,0 +1,158 @@
+from __future__ import absolute_import
+
+import json
+
+import mock
+import msgpack
+import requests
+
+from ably import AblyRest
+from ably import ChannelOptions
+from ably.http.http import Http
+from ably.types.message import Message
+from ably.util.crypto import get_default_params
+from ably.util.exceptions import AblyException
+from test.ably.utils import BaseTestCase
+
+
+class FakeResponse(object):
+    def __init__(self, native):
+        self.native = native
+
+    def to_native(self):
+        return self.native
+
+
+class TestBatchPublish(BaseTestCase):
+
+    def setUp(self):
+        self.bodies = []
+
+    def ably(self, use_binary_protocol=False):
+        return AblyRest(key='fake.key:secret',
+                        use_binary_protocol=use_binary_protocol)
+
+    def decode(self, body, use_binary_protocol=False):
+        if use_binary_protocol:
+            return msgpack.unpackb(body, encoding='utf-8')
+        return json.loads(body)
+
+    def succeed(self, url, body=None, **kwargs):
+        self.bodies.append(body)
+        specs = self.decode(body)
+        return FakeResponse([[{'channel': channel, 'messageId': 'id:' + channel}
+                              for channel in spec['channels']]
+                             for spec in specs])
+
+    def test_fan_out_shares_messages(self):
+        ably = self.ably()
+        messages = [Message('event', 'data')]
+        batch = dict(('channel%d' % i, messages) for i in range(10))
+
+        with mock.patch.object(Http, 'post', side_effect=self.succeed) as post:
+            results = ably.publish_batch(batch)
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(post.call_args[0][0], '/messages')
+        specs = self.decode(self.bodies[0])
+        self.assertEqual(len(specs), 1)
+        self.assertEqual(sorted(specs[0]['channels']), sorted(batch))
+        self.assertEqual(specs[0]['messages'][0]['data'], 'data')
+        self.assertEqual(len(results), 10)
+        for name, result in results.items():
+            self.assertTrue(result.success)
+            self.assertEqual(result.channel, name)
+            self.assertEqual(result.message_id, 'id:' + name)
+
+    def test_splits_requests_by_channel_count(self):
+        ably = self.ably()
+        batch = dict(('channel%d' % i, Message('event', 'data %d' % i))
+                     for i in range(250))
+
+        with mock.patch.object(Http, 'post', side_effect=self.succeed) as post:
+            results = ably.publish_batch(batch)
+
+        self.assertEqual(post.call_count, 3)
+        counts = [sum(len(spec['channels']) for spec in self.decode(body))
+                  for body in self.bodies]
+        self.assertEqual(counts, [100, 100, 50])
+        self.assertTrue(all(result.success for result in results.values()))
+
+    def test_binary_protocol(self):
+        ably = self.ably(use_binary_protocol=True)
+        with mock.patch.object(Http, 'post', return_value=FakeResponse([])) as post:
+            ably.publish_batch({'ch': [Message('event', bytearray(b'\x00\x01'))]})
+        specs = self.decode(post.call_args[1]['body'], use_binary_protocol=True)
+        self.assertEqual(specs[0]['messages'][0]['data'], b'\x00\x01')
+
+    def test_encrypted_channel_gets_its_own_spec(self):
+        ably = self.ably()
+        ably.channels.get('secret', ChannelOptions(
+            encrypted=True, cipher_params=get_default_params()))
+        messages = [Message('event', 'data')]
+
+        with mock.patch.object(Http, 'post', side_effect=self.succeed):
+            ably.publish_batch({'secret': messages, 'plain': messages})
+
+        specs = self.decode(self.bodies[0])
+        self.assertEqual(len(specs), 2)
+        by_channel = dict((spec['channels'][0], spec) for spec in specs)
+        self.assertIn('cipher+aes-128-cbc', by_channel['secret']['messages'][0]['encoding'])
+        self.assertEqual(by_channel['plain']['messages'][0]['data'], 'data')
+        # the messages passed in are left untouched
+        self.assertEqual(messages[0].data, 'data')
+
+    def test_partial_failure(self):
+        ably = self.ably()
+        response = requests.Response()
+        response.status_code = 400
+        response.headers['content-type'] = 'application/json'
+        response._content = json.dumps({
+            'error': {'message': 'Batched response includes errors',
+                      'statusCode': 400, 'code': 40020},
+            'batchResponse': [
+                {'channel': 'ok', 'messageId': 'id:ok'},
+                {'channel': 'denied', 'error': {
+                    'message': 'Denied', 'statusCode': 401, 'code': 40160}},
+            ]}).encode('utf-8')
+
+        def fail(url, body=None, **kwargs):
+            AblyException.raise_for_response(response)
+
+        with mock.patch.object(Http, 'post', side_effect=fail):
+            results = ably.publish_batch({'ok': Message('a', 'b'),
+                                          'denied': Message('a', 'b')})
+
+        self.assertTrue(results['ok'].success)
+        self.assertFalse(results['denied'].success)
+        self.assertEqual(results['denied'].error.code, 40160)
+
+    def test_connection_error_fails_only_its_channels(self):
+        ably = self.ably()
+        calls = []
+
+        def post(url, body=None, **kwargs):
+            calls.append(body)
+            if len(calls) == 2:
+                raise requests.exceptions.ConnectionError('refused')
+            return self.succeed(url, body)
+
+        batch = dict(('channel%d' % i, Message('a', 'b')) for i in range(3))
+        with mock.patch.object(ably, 'batch_max_channels', 1), \
+                mock.patch.object(Http, 'post', side_effect=post):
+            results = ably.publish_batch(batch)
+
+        self.assertEqual(set(results), set(batch))
+        failed = [name for name, result in results.items() if not result.success]
+        self.assertEqual(failed, self.decode(calls[1])[0]['channels'])
+        self.assertEqual(results[failed[0]].error.code, 50000)
+
+    def test_request_failure_fails_every_channel(self):
+        ably = self.ably()
+        error = AblyException('boom', 500, 50000)
+        with mock.patch.object(Http, 'post', side_effect=error):
+            results = ably.publish_batch({'a': Message('a', 'b'),
+                                          'b': Message('a', 'b')})
+        self.assertEqual(set(results), set(['a', 'b']))
+        for result in results.values():
+            self.assertIs(result.error, error)
@@ -1,9 +1,12 @@
 from __future__ import absolute_import
 
+import threading
+
+import mock
 import six
 
 from ably import AblyRest
-from ably.types.capability import Capability
+from ably.types.capability import Capability, FrozenCapability
 from ably.util.exceptions import AblyException
 
 from test.ably.restsetup import RestSetup
@@ -254,3 +257,75 @@ class TestRestCapability(BaseTestCase):
         the_exception = cm.exception
         self.assertEqual(400, the_exception.status_code)
         self.assertEqual(40000, the_exception.code)
+
+
+class TestCapabilityCanonical(BaseTestCase):
+
+    def test_canonical_string_is_cached(self):
+        capability = Capability({'b': ['subscribe', 'publish'], 'a': '*'})
+        string = six.text_type(capability)
+        self.assertEqual(string, '{"a": ["*"], "b": ["publish", "subscribe"]}')
+        self.assertIs(six.text_type(capability), string)
+        self.assertIs(Capability.canonical({'a': ['*'], 'b': ['publish', 'subscribe']}),
+                      string)
+        self.assertIs(Capability.canonical('{"b": ["publish", "subscribe"], "a": ["*"]}'),
+                      Capability.canonical('{"b": ["publish", "subscribe"], "a": ["*"]}'))
+        self.assertEqual(Capability.canonical({}), '{}')
+
+    def test_changes_update_canonical_string(self):
+        capability = Capability({'a': ['publish']})
+        self.assertEqual(six.text_type(capability), '{"a": ["publish"]}')
+        capability.add_resource('b', 'subscribe')
+        self.assertEqual(six.text_type(capability), '{"a": ["publish"], "b": ["subscribe"]}')
+        capability.add_operation_to_resource('presence', 'a')
+        self.assertEqual(six.text_type(capability),
+                         '{"a": ["presence", "publish"], "b": ["subscribe"]}')
+        del capability['b']
+        self.assertEqual(six.text_type(capability), '{"a": ["presence", "publish"]}')
+        with self.assertRaises(AttributeError):
+            capability['a'].add('history')
+
+    def test_frozen_capability(self):
+        frozen = Capability.frozen({'b': ['subscribe', 'publish'], 'a': '*'})
+        self.assertIsInstance(frozen, FrozenCapability)
+        self.assertIs(Capability.frozen('{"a": ["*"], "b": ["publish", "subscribe"]}'),
+                      Capability.frozen('{"a": ["*"], "b": ["publish", "subscribe"]}'))
+        self.assertEqual(six.text_type(frozen), '{"a": ["*"], "b": ["publish", "subscribe"]}')
+        self.assertEqual(frozen['b'], frozenset(['publish', 'subscribe']))
+
+        capability = Capability({'a': ['*'], 'b': ['publish', 'subscribe']})
+        self.assertEqual(frozen, capability)
+        self.assertEqual(capability, frozen)
+        self.assertIs(capability.freeze(), frozen)
+        self.assertNotEqual(frozen, Capability({'a': ['*']}))
+        self.assertEqual({frozen: 1}[FrozenCapability(capability)], 1)
+
+        with self.assertRaises(TypeError):
+            frozen['c'] = ['publish']
+        with self.assertRaises(TypeError):
+            del frozen['a']
+        self.assertFalse(hasattr(frozen, 'add_resource'))
+
+    def test_frozen_cache_is_thread_safe(self):
+        errors = []
+
+        def freeze():
+            try:
+                for i in range(500):
+                    Capability.frozen({'channel%d' % (i % 20): ['publish']})
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(Capability, 'max_cached', 10):
+            threads = [threading.Thread(target=freeze) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+    def test_invalid_capability(self):
+        with self.assertRaises(ValueError):
+            Capability.canonical({'a': [1]})
+        with self.assertRaises(ValueError):
+            Capability.canonical({'a': [['publish']]})
@@ -4,16 +4,18 @@ import json
 import os
 import logging
 import base64
+from concurrent import futures
 
 import six
 
 from ably import AblyException
 from ably import AblyRest
 from ably import ChannelOptions
-from ably.types.message import Message
+from ably.types.message import Message, decrypt_message_dicts
 from ably.util.crypto import CipherParams, get_cipher, get_default_params
 
 from Crypto import Random
+from Crypto.Cipher import AES
 
 from test.ably.restsetup import RestSetup
 from test.ably.utils import dont_vary_protocol, VaryByProtocolTestsMetaclass, BaseTestCase
@@ -232,6 +234,203 @@ class TestRestCrypto(BaseTestCase):
         self.assertEqual(params.mode, 'CBC')
         self.assertEqual(params.key_length, 256)
 
+    @dont_vary_protocol
+    def test_cbc_decrypt_many(self):
+        key = Random.new().read(16)
+        plaintexts = [Random.new().read(size)
+                      for size in (0, 1, 15, 16, 17, 1000, 40000, 40000, 3)]
+        ciphertexts = []
+        for plaintext in plaintexts:
+            cipher = get_cipher(CipherParams(secret_key=key))
+            ciphertexts.append(cipher.encrypt(plaintext))
+
+        cipher = get_cipher(CipherParams(secret_key=key))
+        decrypted = cipher.decrypt_many(ciphertexts)
+        self.assertEqual(decrypted, plaintexts)
+        self.assertTrue(all(isinstance(d, bytearray) for d in decrypted))
+        self.assertEqual(cipher.decrypt(bytearray(ciphertexts[5])), plaintexts[5])
+        self.assertEqual(cipher.decrypt_many([]), [])
+
+        with self.assertRaises(AblyException):
+            cipher.decrypt_many([ciphertexts[0], ciphertexts[1][:20]])
+        with self.assertRaises(AblyException):
+            cipher.decrypt(ciphertexts[0][:16])
+
+    @dont_vary_protocol
+    def test_cbc_encrypt_many(self):
+        key = Random.new().read(16)
+        iv = Random.new().read(16)
+        plaintexts = [Random.new().read(size)
+                      for size in (5, 16, 1000, 20000, 3, 0, 1000, 1000, 40000)]
+        cipher = get_cipher(CipherParams(secret_key=key, iv=iv))
+        expected = [cipher.encrypt(plaintext) for plaintext in plaintexts]
+
+        many = get_cipher(CipherParams(secret_key=key, iv=iv))
+        many.chunk_size = 2000
+        self.assertEqual(many.encrypt_many(plaintexts), expected)
+        self.assertEqual(many.iv, cipher.iv)
+        self.assertEqual(many.encrypt_many([b'abc']), [cipher.encrypt(b'abc')])
+        self.assertEqual(many.encrypt_many([]), [])
+
+    @dont_vary_protocol
+    def test_cbc_decrypt_many_executor(self):
+        key = Random.new().read(16)
+        cipher = get_cipher(CipherParams(secret_key=key))
+        cipher.chunk_size = 1024
+        plaintexts = [Random.new().read(size % 3000) for size in range(0, 100000, 997)]
+        ciphertexts = cipher.encrypt_many(plaintexts)
+        with futures.ThreadPoolExecutor(4) as executor:
+            self.assertEqual(cipher.decrypt_many(ciphertexts, executor), plaintexts)
+
+    @dont_vary_protocol
+    def test_message_encrypt_many(self):
+        key = Random.new().read(16)
+        iv = Random.new().read(16)
+        cipher = get_cipher(CipherParams(secret_key=key, iv=iv))
+        many = get_cipher(CipherParams(secret_key=key, iv=iv))
+        data = [six.u('f\xf3o'), bytearray(b'bar'), {'a': 1}, [1, 2]]
+
+        messages = [Message('name', d, timestamp=1) for d in data]
+        for message in messages:
+            message.encrypt(cipher)
+        encrypted = [Message('name', d, timestamp=1) for d in data]
+        Message.encrypt_many(encrypted, many)
+        self.assertEqual([m.as_dict() for m in encrypted], [m.as_dict() for m in messages])
+
+        # already encrypted messages are left alone
+        Message.encrypt_many(encrypted, many)
+        self.assertEqual([m.as_dict() for m in encrypted], [m.as_dict() for m in messages])
+
+    @dont_vary_protocol
+    def test_cbc_in_place(self):
+        key = Random.new().read(16)
+        iv = Random.new().read(16)
+        for size in (0, 15, 16, 17, 40000, 40001):
+            plaintext = bytearray(Random.new().read(size))
+            cipher = get_cipher(CipherParams(secret_key=key, iv=iv))
+            in_place = get_cipher(CipherParams(secret_key=key, iv=iv))
+            in_place.in_place_min_size = 0
+            encrypted = cipher.encrypt(plaintext)
+            self.assertEqual(in_place.encrypt(plaintext), encrypted)
+            self.assertEqual(in_place.encrypt(plaintext), cipher.encrypt(plaintext))
+            self.assertIsInstance(encrypted, bytearray)
+            self.assertEqual(len(encrypted), 16 * (size // 16 + 2))
+            self.assertEqual(cipher.decrypt(encrypted), plaintext)
+            self.assertEqual(in_place.decrypt(encrypted), plaintext)
+
+    @dont_vary_protocol
+    def test_cbc_invalid_padding(self):
+        cipher = get_cipher(CipherParams(secret_key=Random.new().read(16)))
+        for size in (16, 40000):
+            # the block padding the plaintext cut off, leaving one that
+            # ends with 5 after bytes other than 5
+            plaintext = b'a' * (size - 1) + b'\x05'
+            encrypted = cipher.encrypt(plaintext)[:-16]
+            with self.assertRaises(AblyException):
+                cipher.decrypt(encrypted)
+            with self.assertRaises(AblyException):
+                cipher.decrypt_many([encrypted, cipher.encrypt(b'')])
+
+    @dont_vary_protocol
+    def test_nonce_channel_ciphers(self):
+        key = Random.new().read(32)
+        plaintexts = [Random.new().read(size)
+                      for size in (0, 1, 15, 16, 17, 1000, 5000, 70000, 3)]
+        for mode in ('CTR', 'GCM'):
+            cipher = get_cipher(CipherParams(secret_key=key, mode=mode))
+            self.assertEqual(cipher.cipher_type, 'aes-256-%s' % mode.lower())
+            cipher.chunk_size = 4096
+            cipher.max_batched_size = 60000
+
+            ciphertexts = cipher.encrypt_many(plaintexts)
+            self.assertEqual([len(c) for c in ciphertexts],
+                             [len(p) + 12 + cipher.tag_size for p in plaintexts])
+            self.assertEqual(cipher.decrypt_many(ciphertexts), plaintexts)
+            self.assertEqual([cipher.decrypt(bytes(c)) for c in ciphertexts], plaintexts)
+            with futures.ThreadPoolExecutor(4) as executor:
+                ciphertexts = cipher.encrypt_many(plaintexts, executor)
+                self.assertEqual(cipher.decrypt_many(ciphertexts, executor), plaintexts)
+            # a new nonce for every message
+            self.assertNotEqual(cipher.encrypt(b'abc'), cipher.encrypt(b'abc'))
+            with self.assertRaises(AblyException):
+                cipher.decrypt(b'short')
+
+    @dont_vary_protocol
+    def test_ctr_channel_cipher(self):
+        key = Random.new().read(16)
+        cipher = get_cipher(CipherParams(secret_key=key, mode='CTR'))
+        for plaintext in (b'', b'The quick brown fox', Random.new().read(300000)):
+            encrypted = cipher.encrypt(plaintext)
+            nonce = bytes(encrypted[:12])
+            expected = AES.new(key, AES.MODE_CTR, nonce=nonce).encrypt(plaintext)
+            self.assertEqual(encrypted[12:], expected)
+
+    @dont_vary_protocol
+    def test_gcm_channel_cipher_authenticates(self):
+        cipher = get_cipher(CipherParams(secret_key=Random.new().read(16), mode='GCM'))
+        encrypted = cipher.encrypt(b'The quick brown fox')
+        encrypted[15] ^= 1
+        with self.assertRaises(AblyException):
+            cipher.decrypt(encrypted)
+        other = get_cipher(CipherParams(secret_key=Random.new().read(16), mode='GCM'))
+        with self.assertRaises(AblyException):
+            other.decrypt(cipher.encrypt(b'The quick brown fox'))
+
+    @dont_vary_protocol
+    def test_cipher_modes(self):
+        with self.assertRaises(NotImplementedError):
+            get_cipher(CipherParams(secret_key=Random.new().read(16), mode='OFB'))
+
+        # messages encrypted in another mode with the same key are decrypted
+        key = Random.new().read(16)
+        cbc = get_cipher(CipherParams(secret_key=key))
+        gcm = get_cipher(CipherParams(secret_key=key, mode='GCM'))
+        self.assertIs(cbc.cipher_for_type('aes-128-cbc'), cbc)
+        self.assertEqual(cbc.cipher_for_type('aes-128-gcm').cipher_type, 'aes-128-gcm')
+        self.assertIs(cbc.cipher_for_type('aes-128-gcm'), cbc.cipher_for_type('aes-128-gcm'))
+        self.assertIsNone(cbc.cipher_for_type('aes-256-gcm'))
+        self.assertIsNone(cbc.cipher_for_type('aes-128-ofb'))
+
+        messages = [Message('cbc', 'foo'), Message('gcm', {'a': 1})]
+        messages[0].encrypt(cbc)
+        messages[1].encrypt(gcm)
+        self.assertEqual(messages[1].as_dict()['encoding'], 'json/utf-8/cipher+aes-128-gcm/base64')
+        wire = [message.as_dict() for message in messages]
+        for cipher in (cbc, gcm):
+            self.assertEqual([Message.from_dict(m, cipher).data for m in wire], ['foo', {'a': 1}])
+            decrypted = decrypt_message_dicts(wire, cipher)
+            self.assertEqual([Message.from_dict(m, cipher).data for m in decrypted],
+                             ['foo', {'a': 1}])
+
+        # or left encrypted, if the key length differs
+        other = get_cipher(CipherParams(secret_key=Random.new().read(32), mode='GCM'))
+        self.assertEqual(Message.from_dict(wire[0], other).encoding,
+                         'utf-8/cipher+aes-128-cbc')
+        self.assertIs(decrypt_message_dicts(wire, other)[0], wire[0])
+
+    @dont_vary_protocol
+    def test_decrypt_message_dicts(self):
+        cipher = get_cipher(get_default_params(Random.new().read(16)))
+        messages = [Message('text', six.u('f\xf3o')), Message('binary', bytearray(b'bar')),
+                    Message('json', {'a': 1}), Message('plain', 'unencrypted')]
+        for message in messages[:3]:
+            message.encrypt(cipher)
+        wire = [messages[0].as_dict(), messages[1].as_dict(binary=True),
+                messages[2].as_dict(), messages[3].as_dict()]
+
+        decrypted = decrypt_message_dicts(wire, cipher)
+        self.assertEqual(decrypted[0]['encoding'], 'utf-8')
+        self.assertEqual(decrypted[1]['encoding'], '')
+        self.assertEqual(decrypted[2]['encoding'], 'json/utf-8')
+        self.assertIs(decrypted[3], wire[3])
+
+        messages = [Message.from_dict(m, cipher) for m in decrypted]
+        self.assertEqual(messages[0].data, six.u('f\xf3o'))
+        self.assertEqual(messages[1].data, bytearray(b'bar'))
+        self.assertEqual(messages[2].data, {'a': 1})
+        self.assertEqual(messages[3].data, 'unencrypted')
+        self.assertTrue(all(not m.encoding for m in messages))
+
 
 class AbstractTestCryptoWithFixture(object):
 
@@ -264,6 +463,14 @@ class AbstractTestCryptoWithFixture(object):
             expected_data = self.get_encoded(item['encoded'])
             self.assertEqual(expected_data, message.data)
 
+    def test_decrypt_message_dicts(self):
+        decrypted = decrypt_message_dicts(
+            [item['encrypted'] for item in self.items], self.cipher)
+        for item, message in zip(self.items, decrypted):
+            message = Message.from_dict(message, self.cipher)
+            self.assertEqual(message.encoding, '')
+            self.assertEqual(self.get_encoded(item['encoded']), message.data)
+
     def test_encode(self):
         for item in self.items:
             # need to reset iv
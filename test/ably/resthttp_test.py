@@ -1,18 +1,45 @@
 from __future__ import absolute_import
 
+import threading
 import time
 
 import mock
 import requests
-from six.moves.urllib.parse import urljoin
+from requests.structures import CaseInsensitiveDict
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urljoin, urlparse
 
 from ably import AblyRest
+from ably.http.circuitbreaker import CircuitBreaker, CircuitBreakers
+from ably.http.hosthealth import HostHealthTracker
+from ably.http.retrybudget import RetryBudget
 from ably.transport.defaults import Defaults
 from ably.types.options import Options
-from ably.util.exceptions import AblyException
+from ably.types.tokendetails import TokenDetails
+from ably.util.exceptions import AblyException, CircuitOpenException
 from test.ably.utils import BaseTestCase
 
 
+class TimeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        body = b'[1000]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
 class TestRestHttp(BaseTestCase):
     def test_max_retry_attempts_and_timeouts_defaults(self):
         ably = AblyRest(token="foo")
@@ -135,3 +162,408 @@ class TestRestHttp(BaseTestCase):
         self.assertEqual(ably.http.http_open_timeout, 8)
         self.assertEqual(ably.http.http_max_retry_count, 6)
         self.assertEqual(ably.http.http_max_retry_duration, 20)
+
+    def local_server(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), TimeHandler)
+        server.client_ports = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_pool_options(self):
+        ably = AblyRest(token="foo")
+        self.assertTrue(ably.options.keep_alive)
+        self.assertEqual(ably.options.http_pool_connections, 10)
+        self.assertEqual(ably.options.http_pool_maxsize, 10)
+
+        ably = AblyRest(token="foo", http_pool_connections=4,
+                        http_pool_maxsize=32, keep_alive=False)
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=requests.exceptions.RequestException) as send_mock:
+            with self.assertRaises(requests.exceptions.RequestException):
+                ably.http.make_request('GET', '/', skip_auth=True)
+        self.assertEqual(send_mock.call_args[0][0].headers['Connection'], 'close')
+
+        session = ably.http._Http__session
+        default_adapter = session.get_adapter('https://auth.example.com/')
+        self.assertEqual(default_adapter._pool_connections, 4)
+        self.assertEqual(default_adapter._pool_maxsize, 32)
+
+        # each host tried got a pool of its own
+        urls = set(call[0][0].url for call in send_mock.call_args_list)
+        adapters = set(session.get_adapter(url) for url in urls)
+        self.assertEqual(len(adapters), len(urls))
+        self.assertNotIn(default_adapter, adapters)
+        for adapter in adapters:
+            self.assertEqual(adapter._pool_maxsize, 32)
+
+    def test_pool_stats(self):
+        server = self.local_server()
+        port = server.server_address[1]
+        ably = AblyRest(token="foo", rest_host='127.0.0.1', port=port,
+                        tls=False, use_binary_protocol=False)
+        for i in range(3):
+            self.assertEqual(ably.time(), 1000)
+
+        stats = ably.http.pool_stats()
+        self.assertEqual(stats, {'http://127.0.0.1:%d' % port: {
+            'connections': 1, 'requests': 3, 'idle': 1, 'maxsize': 10}})
+        self.assertEqual(len(set(server.client_ports)), 1)
+
+    def test_without_keep_alive(self):
+        server = self.local_server()
+        ably = AblyRest(token="foo", rest_host='127.0.0.1',
+                        port=server.server_address[1], tls=False,
+                        use_binary_protocol=False, keep_alive=False)
+        for i in range(3):
+            ably.time()
+
+        self.assertEqual(len(set(server.client_ports)), 3)
+
+    def test_sticky_fallback_host(self):
+        ably = AblyRest(token="foo", fallback_retry_timeout=0.3)
+        primary = ably.http.preferred_host
+
+        def send(request, **kwargs):
+            if primary in request.url:
+                raise requests.exceptions.ConnectionError
+            response = requests.Response()
+            response.status_code = 200
+            response.headers['Content-Type'] = 'application/json'
+            response._content = b'[1000]'
+            return response
+
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=send) as send_mock:
+            ably.http.make_request('GET', '/time', skip_auth=True)
+            self.assertEqual(send_mock.call_count, 2)
+            fallback_url = send_mock.call_args[0][0].url
+            self.assertNotIn(primary, fallback_url)
+
+            # the fallback that answered is tried first from now on
+            for i in range(3):
+                ably.http.make_request('GET', '/time', skip_auth=True)
+                self.assertEqual(send_mock.call_args[0][0].url, fallback_url)
+            self.assertEqual(send_mock.call_count, 5)
+
+            # until fallback_retry_timeout passes
+            time.sleep(0.3)
+            ably.http.make_request('GET', '/time', skip_auth=True)
+            self.assertIn(primary, send_mock.call_args_list[5][0][0].url)
+
+    def test_host_health_ordering(self):
+        tracker = HostHealthTracker('primary', ['a', 'b', 'c'], 60)
+        self.assertEqual(tracker.ordered_hosts(), ['primary', 'a', 'b', 'c'])
+
+        tracker.record_success('a', 0.5)
+        tracker.record_success('b', 0.1)
+        tracker.record_failure('c')
+        self.assertEqual(tracker.sticky_host, 'a')
+        self.assertEqual(tracker.ordered_hosts(), ['a', 'primary', 'b', 'c'])
+
+        tracker.record_failure('a')
+        tracker.record_failure('primary')
+        self.assertIsNone(tracker.sticky_host)
+        # hosts that failed go last, the least recently failed first
+        self.assertEqual(tracker.ordered_hosts(), ['b', 'c', 'a', 'primary'])
+
+    def hedged_ably(self, primary_delay, primary_fails=False, **options):
+        ably = AblyRest(token="foo", hedge_requests=True, **options)
+        primary = ably.http.preferred_host
+        responses = []
+        primary_threads = []
+
+        def send(request, **kwargs):
+            if primary in request.url:
+                primary_threads.append(threading.current_thread())
+                time.sleep(primary_delay)
+                if primary_fails:
+                    raise requests.exceptions.ConnectionError()
+            response = mock.Mock(spec=requests.Response)
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+            response.content = ('["%s"]' % request.url).encode('ascii')
+            responses.append(response)
+            return response
+
+        ably.primary_threads = primary_threads
+        return ably, primary, send, responses
+
+    def test_hedged_get(self):
+        ably, primary, send, responses = self.hedged_ably(primary_delay=0.3,
+                                                          primary_fails=True)
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.05), \
+                mock.patch('requests.sessions.Session.send', side_effect=send) as send_mock:
+            started = time.time()
+            url = ably.http.get('/time', skip_auth=True).to_native()[0]
+            self.assertLess(time.time() - started, 0.5)
+            self.assertNotIn(primary, url)
+            self.assertEqual(send_mock.call_count, 2)
+            self.assertEqual(ably.primary_threads, [threading.current_thread()])
+
+    def test_hedged_get_first_host_slow(self):
+        ably, primary, send, responses = self.hedged_ably(primary_delay=0.3)
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.05), \
+                mock.patch('requests.sessions.Session.send', side_effect=send) as send_mock:
+            url = ably.http.get('/time', skip_auth=True).to_native()[0]
+            self.assertIn(primary, url)
+            self.assertEqual(send_mock.call_count, 2)
+            self.assertEqual(ably.primary_threads, [threading.current_thread()])
+
+            # the hedge response isn't used, so is closed
+            self.assertEqual(len(responses), 2)
+            self.assertTrue(responses[0].close.called)
+            self.assertFalse(responses[1].close.called)
+
+    def test_hedged_get_first_host_fast(self):
+        ably, primary, send, responses = self.hedged_ably(primary_delay=0)
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.2), \
+                mock.patch('requests.sessions.Session.send', side_effect=send) as send_mock:
+            url = ably.http.get('/time', skip_auth=True).to_native()[0]
+            self.assertIn(primary, url)
+            self.assertEqual(send_mock.call_count, 1)
+
+    def test_hedged_get_first_host_fails_fast(self):
+        # the hedge isn't sent, so the next host is the first fallback
+        ably, primary, send, responses = self.hedged_ably(primary_delay=0,
+                                                          primary_fails=True,
+                                                          http_retry_backoff=0)
+        hosts = ably.http._get_hosts()
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.2), \
+                mock.patch.object(ably.http, '_get_hosts', return_value=hosts), \
+                mock.patch('requests.sessions.Session.send', side_effect=send) as send_mock:
+            url = ably.http.get('/time', skip_auth=True).to_native()[0]
+            self.assertIn(hosts[1].lower(), url)
+            self.assertEqual(send_mock.call_count, 2)
+
+    def test_hedged_get_hedge_host_not_retried(self):
+        ably = AblyRest(token="foo", hedge_requests=True, http_retry_backoff=0)
+        hosts = ably.http._get_hosts()
+        self.assertEqual(len(set(hosts)), 3)
+        urls = []
+
+        def send(request, **kwargs):
+            urls.append(request.url)
+            if hosts[2].lower() not in request.url:
+                time.sleep(0.1)
+                raise requests.exceptions.ConnectionError()
+            response = mock.Mock(spec=requests.Response)
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+            response.content = b'[1]'
+            return response
+
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.02), \
+                mock.patch.object(ably.http, '_get_hosts', return_value=hosts), \
+                mock.patch('requests.sessions.Session.send', side_effect=send):
+            self.assertEqual(ably.http.get('/time', skip_auth=True).to_native(), [1])
+        # each host is asked once
+        self.assertEqual(sorted(urlparse(url).hostname for url in urls),
+                         sorted(host.lower() for host in hosts))
+
+    def test_post_is_not_hedged(self):
+        ably, primary, send, responses = self.hedged_ably(primary_delay=0.2)
+        with mock.patch.object(ably.http, 'HEDGE_DEFAULT_DELAY', 0.05), \
+                mock.patch('requests.sessions.Session.send', side_effect=send) as send_mock:
+            ably.http.post('/time', body='{}', skip_auth=True)
+            self.assertEqual(send_mock.call_count, 1)
+
+    def test_hedge_delay_percentile(self):
+        ably = AblyRest(token="foo", hedge_requests=True, hedge_percentile=90)
+        self.assertEqual(ably.http.hedge_delay, ably.http.HEDGE_DEFAULT_DELAY)
+        for i in range(1, 101):
+            ably.http.host_health.record_success(ably.http.preferred_host, i / 100.0)
+        self.assertAlmostEqual(ably.http.hedge_delay, 0.9, places=2)
+
+    def test_retry_budget(self):
+        budget = RetryBudget(ratio=0.5, min_retries_per_second=0, max_tokens=2)
+        self.assertTrue(budget.try_retry())
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+        budget.record_request()
+        self.assertFalse(budget.try_retry())
+        budget.record_request()
+        self.assertTrue(budget.try_retry())
+
+        budget = RetryBudget(ratio=0, min_retries_per_second=20, max_tokens=1)
+        self.assertTrue(budget.try_retry())
+        self.assertFalse(budget.try_retry())
+        time.sleep(0.06)
+        self.assertTrue(budget.try_retry())
+
+    def test_no_retry_budget_by_default(self):
+        ably = AblyRest(token="foo")
+        for _ in range(100):
+            self.assertTrue(ably.http.retry_budget.try_retry())
+
+    def test_no_retries_once_budget_is_spent(self):
+        budget = RetryBudget(ratio=0, min_retries_per_second=0, max_tokens=1)
+        ably = AblyRest(token="foo", retry_budget=budget)
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=requests.exceptions.RequestException) as send_mock:
+            with self.assertRaises(requests.exceptions.RequestException):
+                ably.http.make_request('GET', '/', skip_auth=True)
+            self.assertEqual(send_mock.call_count, 2)
+
+            with self.assertRaises(requests.exceptions.RequestException):
+                ably.http.make_request('GET', '/', skip_auth=True)
+            self.assertEqual(send_mock.call_count, 3)
+
+    def server_error_response(self, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 503
+        response.headers['Content-Type'] = 'application/json'
+        response._content = b'{"error": {"code": 50300, "message": "unavailable"}}'
+        return response
+
+    def test_server_errors_respect_max_retry_duration(self):
+        ably = AblyRest(token="foo", http_max_retry_duration=0.5,
+                        retry_budget=RetryBudget())
+
+        def slow_server_error(*args, **kwargs):
+            time.sleep(0.3)
+            return self.server_error_response()
+
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=slow_server_error) as send_mock:
+            with self.assertRaises(AblyException) as cm:
+                ably.http.make_request('GET', '/', skip_auth=True)
+            self.assertTrue(cm.exception.is_server_error)
+            self.assertEqual(send_mock.call_count, 2)
+
+    def test_backoff_between_attempts(self):
+        ably = AblyRest(token="foo", http_retry_backoff=0.1,
+                        http_retry_backoff_max=0.15, retry_budget=RetryBudget())
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=self.server_error_response), \
+                mock.patch('time.sleep') as sleep_mock:
+            with self.assertRaises(AblyException):
+                ably.http.make_request('GET', '/', skip_auth=True)
+        delays = [call[0][0] for call in sleep_mock.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 0.1)
+        self.assertTrue(0 <= delays[1] <= 0.15)
+
+    def test_circuit_breaker_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        # a single probe at a time
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_circuit_breakers_by_path(self):
+        breakers = CircuitBreakers(by_path=True)
+        publish = breakers.get('rest.ably.io', '/channels/foo/publish')
+        history = breakers.get('rest.ably.io', '/channels/foo/history')
+        self.assertIsNot(publish, history)
+        self.assertIs(publish, breakers.get('rest.ably.io', '/channels/bar/publish'))
+        self.assertIs(publish, breakers.get('rest.ably.io', '/messages'))
+        self.assertIs(history, breakers.get('rest.ably.io', '/channels/bar/history?limit=5'))
+        self.assertIsNot(publish, breakers.get('a.ably-realtime.com', '/channels/foo/publish'))
+        self.assertEqual(CircuitBreakers.path_class('/channels/foo/publish'), 'publish')
+        self.assertEqual(CircuitBreakers.path_class('/channels/foo/history'), 'history')
+        self.assertEqual(CircuitBreakers.path_class('/keys/abc/requestToken'), 'auth')
+        self.assertEqual(CircuitBreakers.path_class('/channels/foo/presence?limit=5'), 'presence')
+        self.assertEqual(CircuitBreakers.path_class('/time'), 'other')
+
+        breakers = CircuitBreakers()
+        self.assertIs(breakers.get('rest.ably.io', '/channels/foo/publish'),
+                      breakers.get('rest.ably.io', '/channels/foo/history'))
+
+    def test_circuit_open_fails_fast(self):
+        breakers = CircuitBreakers(failure_threshold=2, reset_timeout=60)
+        ably = AblyRest(token="foo", rest_host="some.other.host",
+                        circuit_breakers=breakers)
+        with mock.patch('requests.sessions.Session.send',
+                        side_effect=self.server_error_response) as send_mock:
+            for _ in range(2):
+                with self.assertRaises(AblyException):
+                    ably.http.make_request('GET', '/', skip_auth=True)
+            self.assertEqual(breakers.states(), {'some.other.host': 'open'})
+
+            with self.assertRaises(CircuitOpenException) as cm:
+                ably.http.make_request('GET', '/', skip_auth=True)
+            self.assertEqual(cm.exception.code, 50390)
+            self.assertEqual(send_mock.call_count, 2)
+
+    def test_half_open_probe_not_lost_if_request_fails_to_prepare(self):
+        breakers = CircuitBreakers(failure_threshold=1, reset_timeout=0)
+        ably = AblyRest(token="foo", rest_host="some.other.host",
+                        circuit_breakers=breakers)
+        breakers.get('some.other.host', '/').record_failure()
+
+        with mock.patch('requests.sessions.Session.prepare_request',
+                        side_effect=ValueError('bad request')):
+            with self.assertRaises(ValueError):
+                ably.http.make_request('GET', '/', skip_auth=True)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = b'[1000]'
+        with mock.patch('requests.sessions.Session.send', return_value=response):
+            ably.http.make_request('GET', '/', skip_auth=True)
+        self.assertEqual(breakers.states(), {'some.other.host': 'closed'})
+
+    def test_circuit_open_skips_to_next_host(self):
+        breakers = CircuitBreakers(failure_threshold=1, reset_timeout=60)
+        ably = AblyRest(token="foo", circuit_breakers=breakers,
+                        retry_budget=RetryBudget())
+        breakers.get(ably.http.preferred_host, '/').record_failure()
+
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = b'[1000]'
+        with mock.patch('requests.sessions.Session.send',
+                        return_value=response) as send_mock, \
+                mock.patch('time.sleep') as sleep_mock:
+            ably.http.make_request('GET', '/', skip_auth=True)
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertNotIn(ably.http.preferred_host, send_mock.call_args[0][0].url)
+        self.assertFalse(sleep_mock.called)
+
+    def test_headers_are_cached(self):
+        ably = AblyRest(auth_callback=lambda params: TokenDetails('first'))
+        get_headers = ably.http._prepare_headers(None, None, False)
+        self.assertEqual(get_headers['Authorization'],
+                         'Bearer %s' % ably.auth.token_credentials)
+        self.assertIs(ably.http._prepare_headers(None, None, False), get_headers)
+        post_headers = ably.http._prepare_headers(b'body', None, False)
+        self.assertIn('Content-Type', post_headers)
+        self.assertIs(ably.http._prepare_headers(b'body', None, False), post_headers)
+        self.assertNotIn('Authorization', ably.http._prepare_headers(None, None, True))
+
+        extra = ably.http._prepare_headers(None, {'X-Extra': '1'}, False)
+        self.assertEqual(extra['X-Extra'], '1')
+        self.assertNotIn('X-Extra', ably.http._prepare_headers(None, None, False))
+
+        ably.auth._store_token_details(TokenDetails('second'))
+        headers = ably.http._prepare_headers(None, None, False)
+        self.assertIsNot(headers, get_headers)
+        self.assertEqual(headers['Authorization'], 'Bearer %s' % 'c2Vjb25k')
+
+        ably.options.use_binary_protocol = not ably.options.use_binary_protocol
+        self.assertNotEqual(ably.http._prepare_headers(None, None, False)['Accept'],
+                            headers['Accept'])
@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import json
+
 import six
 from mock import patch
 from requests import Session
@@ -7,7 +9,9 @@ from requests import Session
 from ably import AblyRest
 from ably import AblyException
 from ably.transport.defaults import Defaults
+from ably.types.message import Message, MessageJSONEncoder
 from ably.types.tokendetails import TokenDetails
+from ably.util.jsonbackend import StdlibJSONBackend
 
 from test.ably.restsetup import RestSetup
 from test.ably.utils import VaryByProtocolTestsMetaclass, dont_vary_protocol, BaseTestCase
@@ -198,3 +202,39 @@ class TestRestInit(BaseTestCase):
         self.assertEqual(ably.options.http_open_timeout, 8)
         self.assertEqual(ably.options.http_max_retry_count, 6)
         self.assertEqual(ably.options.http_max_retry_duration, 20)
+
+    @dont_vary_protocol
+    def test_json_backend(self):
+        self.assertEqual(AblyRest(token="foo").options.json_backend.name, 'stdlib')
+        ably = AblyRest(token="foo", json_backend='stdlib')
+        self.assertEqual(ably.options.json_backend.name, 'stdlib')
+        with self.assertRaises(ValueError):
+            AblyRest(token="foo", json_backend='simplejson-ish')
+
+    @dont_vary_protocol
+    def test_stdlib_json_backend_keeps_json_format(self):
+        message = Message('event', {'a': [1, 2]})
+        self.assertEqual(message.as_dict()['data'], json.dumps({'a': [1, 2]}))
+
+        # request bodies are compact
+        def compact(body):
+            return json.dumps(json.loads(body), separators=(',', ':'))
+
+        self.assertEqual(message.as_json(), compact(message.as_json()))
+        ably = AblyRest(token="foo", use_binary_protocol=False)
+        self.assertEqual(ably.http.dump_body({'a': [1, 2]}), '{"a":[1,2]}')
+        channel = ably.channels.get('channel')
+        body = channel._publish_body(messages=[Message('a', 'b'), Message('c', 'd')])
+        self.assertEqual(body, compact(body))
+
+        backend = StdlibJSONBackend()
+        with patch.object(backend, 'dumps', wraps=backend.dumps) as dumps:
+            json.dumps([message], cls=MessageJSONEncoder, json_backend=backend)
+        dumps.assert_called_once_with({'a': [1, 2]})
+
+    @dont_vary_protocol
+    def test_missing_json_backend_falls_back_to_stdlib(self):
+        with patch.dict('ably.util.jsonbackend._backends', clear=True), \
+                patch.dict('sys.modules', {'ujson': None}):
+            ably = AblyRest(token="foo", json_backend='ujson')
+        self.assertEqual(ably.options.json_backend.name, 'stdlib')
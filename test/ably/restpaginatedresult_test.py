@@ -1,11 +1,15 @@
 from __future__ import absolute_import
 
 import re
+import threading
+import time
 
+import mock
 import responses
 
 from ably import AblyRest
 from ably.http.paginatedresult import PaginatedResult
+from ably.util.exceptions import AblyException
 
 from test.ably.restsetup import RestSetup
 from test.ably.utils import BaseTestCase
@@ -24,6 +28,19 @@ class TestPaginatedResult(BaseTestCase):
 
         return callback
 
+    def get_pages_callback(self, num_pages):
+        def callback(request):
+            res = re.search(r'page=(\d+)', request.url)
+            page = int(res.group(1)) if res else 1
+            self.requested_pages.append(page)
+            headers = {}
+            if page < num_pages:
+                headers['link'] = (
+                    '<http://rest.ably.io/channels/channel_name/ch3?page=%d>;'
+                    ' rel="next"' % (page + 1))
+            return (200, headers, '[{"page": %d}, {"page": %d}]' % (page, page))
+        return callback
+
     def setUp(self):
         self.ably = AblyRest(key=test_vars["keys"][0]["key_str"],
                              rest_host=test_vars["host"],
@@ -52,6 +69,14 @@ class TestPaginatedResult(BaseTestCase):
                 status=200),
             content_type='application/json')
 
+        # five pages, linked with next
+        self.requested_pages = []
+        responses.add_callback(
+            responses.GET,
+            re.compile(r'http://rest.ably.io/channels/channel_name/ch3.*'),
+            self.get_pages_callback(5),
+            content_type='application/json')
+
         # start intercepting requests
         responses.start()
 
@@ -90,3 +115,55 @@ class TestPaginatedResult(BaseTestCase):
         pag = self.paginated_result_with_headers
         pag = pag.next()
         self.assertEquals(pag.items[0]['page'], 2)
+
+    def paginated_result_with_pages(self):
+        return PaginatedResult.paginated_query(
+            self.ably.http,
+            'http://rest.ably.io/channels/channel_name/ch3',
+            {}, lambda response: response.to_native())
+
+    def test_iter_items(self):
+        for prefetch in (0, 1, 3):
+            pag = self.paginated_result_with_pages()
+            pages = [item['page'] for item in pag.iter_items(prefetch=prefetch)]
+            self.assertEqual(pages, [1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+
+    def test_iter_items_prefetch_is_bounded(self):
+        pag = self.paginated_result_with_pages()
+        items = pag.iter_items(prefetch=2)
+        next(items)
+        time.sleep(0.3)
+        # the first page plus two prefetched ones
+        self.assertEqual(self.requested_pages, [1, 2, 3])
+        self.assertEqual(len(list(items)), 9)
+        self.assertEqual(self.requested_pages, [1, 2, 3, 4, 5])
+
+    def test_iter_items_closes_prefetched_pages(self):
+        pag = self.paginated_result_with_pages()
+        closed = []
+        with mock.patch.object(PaginatedResult, 'close', autospec=True,
+                               side_effect=closed.append):
+            items = pag.iter_items(prefetch=2)
+            next(items)
+            for _ in range(100):
+                if len(self.requested_pages) == 3:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.05)
+            threads = [thread for thread in threading.enumerate()
+                       if thread.name == 'ably-prefetch']
+            items.close()
+            for thread in threads:
+                thread.join(1)
+                self.assertFalse(thread.is_alive())
+        self.assertEqual([page.items[0]['page'] for page in closed], [2, 3])
+
+    def test_iter_items_raises_fetch_errors(self):
+        pag = self.paginated_result_with_pages()
+        with mock.patch.object(PaginatedResult, 'next',
+                               side_effect=AblyException('boom', 500, 50000)):
+            items = pag.iter_items(prefetch=1)
+            self.assertEqual(next(items)['page'], 1)
+            self.assertEqual(next(items)['page'], 1)
+            with self.assertRaises(AblyException):
+                next(items)
@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+
+import json
+import threading
+
+import mock
+import msgpack
+
+from ably import AblyRest
+from ably import ChannelOptions
+from ably.http.http import Http
+from ably.types.message import Message
+from ably.util.exceptions import AblyException
+from ably.util.jsonbackend import StdlibJSONBackend
+from test.ably.utils import BaseTestCase
+
+
+class TestPublishBuffer(BaseTestCase):
+
+    def setUp(self):
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def fake_post(self, url, body=None, **kwargs):
+        with self.lock:
+            self.bodies.append(body)
+        return 'response %d' % len(self.bodies)
+
+    def channel(self, use_binary_protocol=False, **options):
+        ably = AblyRest(key='fake.key:secret',
+                        use_binary_protocol=use_binary_protocol)
+        options.setdefault('batch_linger', 60)
+        return ably.channels.get('batched',
+                                 ChannelOptions(batch_publish=True, **options))
+
+    def published(self, use_binary_protocol=False):
+        if use_binary_protocol:
+            return [msgpack.unpackb(body, encoding='utf-8') for body in self.bodies]
+        return [json.loads(body) for body in self.bodies]
+
+    def test_merges_messages_in_one_request(self):
+        channel = self.channel()
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            futures = [channel.publish('event', 'data %d' % i) for i in range(10)]
+            self.assertTrue(channel.flush(timeout=5))
+
+        self.assertEqual(len(self.bodies), 1)
+        batch = self.published()[0]
+        self.assertEqual([m['data'] for m in batch],
+                         ['data %d' % i for i in range(10)])
+        self.assertEqual(set(f.result() for f in futures), set(['response 1']))
+
+    def test_linger_sends_without_flush(self):
+        channel = self.channel(batch_linger=0.01)
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            future = channel.publish('event', 'data')
+            self.assertEqual(future.result(timeout=5), 'response 1')
+
+    def test_max_messages(self):
+        channel = self.channel(batch_max_messages=4)
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            futures = channel.publish(
+                messages=[Message('event', 'data %d' % i) for i in range(10)])
+            self.assertEqual(len(futures), 10)
+            self.assertTrue(channel.flush(timeout=5))
+
+        self.assertEqual([len(batch) for batch in self.published()], [4, 4, 2])
+
+    def test_max_bytes_counts_bytes_of_json(self):
+        class Utf8Backend(StdlibJSONBackend):
+            # like orjson and ujson, doesn't escape non ASCII characters
+            def dumps(self, obj, compact=False):
+                return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+        channel = self.channel(batch_max_bytes=200)
+        channel.ably.options.json_backend = Utf8Backend()
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            for i in range(10):
+                channel.publish('event', u'\u00e9' * 30)
+            self.assertTrue(channel.flush(timeout=5))
+
+        self.assertEqual(sum(len(batch) for batch in self.published()), 10)
+        for body in self.bodies:
+            self.assertIsInstance(body, bytes)
+            self.assertLessEqual(len(body), 200 + 2)
+
+    def test_messages_left_keep_their_deadline(self):
+        channel = self.channel(batch_max_messages=2)
+        buffer = channel.publish_buffer
+        with mock.patch.object(buffer, '_wake'):
+            channel.publish(messages=[Message('event', 'data %d' % i) for i in range(3)])
+        pending_since = buffer._pending_since
+        with buffer._condition:
+            self.assertEqual(len(buffer._take_batch()), 2)
+            self.assertEqual(buffer._pending_since, pending_since)
+            self.assertEqual(len(buffer._take_batch()), 1)
+            self.assertIsNone(buffer._pending_since)
+
+    def test_max_bytes(self):
+        channel = self.channel(batch_max_bytes=200, use_binary_protocol=True)
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            for i in range(10):
+                channel.publish('event', 'x' * 60)
+            self.assertTrue(channel.flush(timeout=5))
+
+        batches = self.published(use_binary_protocol=True)
+        self.assertEqual(sum(len(batch) for batch in batches), 10)
+        self.assertGreater(len(batches), 1)
+        for body in self.bodies:
+            self.assertLessEqual(len(body), 200 + 5)
+
+    def test_failure_is_set_on_every_future(self):
+        channel = self.channel()
+        error = AblyException('boom', 500, 50000)
+        with mock.patch.object(Http, 'post', side_effect=error):
+            futures = [channel.publish('event', 'data') for i in range(3)]
+            channel.flush(timeout=5)
+
+        for future in futures:
+            self.assertIs(future.exception(), error)
+
+    def test_without_batching_publish_is_synchronous(self):
+        ably = AblyRest(key='fake.key:secret', use_binary_protocol=False)
+        channel = ably.channels.get('not_batched')
+        self.assertIsNone(channel.publish_buffer)
+        with mock.patch.object(Http, 'post', side_effect=self.fake_post):
+            self.assertEqual(channel.publish('event', 'data'), 'response 1')
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+
+import json
+import types
+
+import msgpack
+import responses
+
+from ably import AblyRest
+from ably.http.http import _iter_json_array, _iter_msgpack_array
+from ably.util.jsonbackend import StdlibJSONBackend
+from test.ably.utils import BaseTestCase
+
+
+def chunked(data, size):
+    return iter([data[i:i + size] for i in range(0, len(data), size)])
+
+
+class TestStreamDecoding(BaseTestCase):
+
+    documents = [
+        [],
+        [None, True, False, 0, -1.5e3, 12345],
+        [{'name': u'caf\xe9 ☃', 'data': 'x' * 300}, [1, [2, []]], '], ['],
+    ]
+
+    def test_json_array_any_chunk_size(self):
+        for document in self.documents:
+            for indent in (None, 2):
+                data = json.dumps(document, indent=indent).encode('utf-8')
+                for size in (1, 2, 7, len(data)):
+                    self.assertEqual(
+                        list(_iter_json_array(chunked(data, size))), document)
+
+    def test_msgpack_array_any_chunk_size(self):
+        for document in self.documents:
+            data = msgpack.packb(document, use_bin_type=False)
+            for size in (1, 3, len(data)):
+                self.assertEqual(
+                    list(_iter_msgpack_array(chunked(data, size))), document)
+
+    def test_invalid_documents(self):
+        for data in (b'[1, 2', b'[1 2]', b'{"a": 1}', b'[1,, 2]', b'',
+                     b'[1,]', b'[1, ]', b'[,]', b'[,1]'):
+            for size in (1, len(data) or 1):
+                with self.assertRaises(ValueError):
+                    list(_iter_json_array(chunked(data, size)))
+        with self.assertRaises(ValueError):
+            list(_iter_msgpack_array(chunked(msgpack.packb([1, 2])[:-1], 1)))
+
+
+class TestStreamHistory(BaseTestCase):
+
+    url = 'https://rest.ably.io:443/channels/streamed/'
+
+    def setUp(self):
+        responses.start()
+
+    def tearDown(self):
+        responses.stop()
+        responses.reset()
+
+    def ably(self, use_binary_protocol):
+        return AblyRest(key='fake.key:secret', rest_host='rest.ably.io',
+                        use_binary_protocol=use_binary_protocol)
+
+    def add_response(self, path, items, use_binary_protocol, headers=None):
+        if use_binary_protocol:
+            body = msgpack.packb(items, use_bin_type=False)
+            content_type = 'application/x-msgpack'
+        else:
+            body = json.dumps(items)
+            content_type = 'application/json'
+        responses.add(responses.GET, self.url + path, body=body,
+                      content_type=content_type, headers=headers)
+
+    def test_history_stream(self):
+        for use_binary_protocol in (False, True):
+            responses.reset()
+            self.add_response(
+                'history',
+                [{'name': 'event%d' % i, 'data': 'eyJhIjoxfQ==',
+                  'encoding': 'json/base64'} for i in range(100)],
+                use_binary_protocol,
+                headers={'Link': '<./history?page=2>; rel="next"'})
+            channel = self.ably(use_binary_protocol).channels.get('streamed')
+
+            page = channel.history(stream=True)
+            self.assertIsInstance(page.items, types.GeneratorType)
+            messages = list(page.items)
+            self.assertEqual([m.name for m in messages],
+                             ['event%d' % i for i in range(100)])
+            self.assertEqual(messages[0].data, {'a': 1})
+            self.assertTrue(page.has_next())
+
+            self.add_response('history?page=2', [{'name': 'last'}],
+                              use_binary_protocol)
+            next_page = page.next()
+            self.assertIsInstance(next_page.items, types.GeneratorType)
+            self.assertEqual([m.name for m in next_page.items], ['last'])
+
+    def test_presence_stream(self):
+        self.add_response('presence', [{'clientId': 'c%d' % i, 'action': 1}
+                                       for i in range(10)], False)
+        presence = self.ably(False).channels.get('streamed').presence
+        page = presence.get(stream=True)
+        self.assertEqual([m.client_id for m in page.items],
+                         ['c%d' % i for i in range(10)])
+
+    def test_history_without_stream_is_a_list(self):
+        self.add_response('history', [{'name': 'event'}], False)
+        page = self.ably(False).channels.get('streamed').history()
+        self.assertIsInstance(page.items, list)
+
+    def test_history_lazy(self):
+        self.add_response('history', [{'name': 'event', 'data': 'eyJhIjoxfQ==',
+                                       'encoding': 'json/base64'}], False)
+        channel = self.ably(False).channels.get('streamed')
+        for stream in (False, True):
+            message = list(channel.history(stream=stream, lazy=True).items)[0]
+            self.assertEqual(message.name, 'event')
+            self.assertEqual(message.data, {'a': 1})
+            self.assertFalse(message.encoding)
+
+    def test_history_uses_json_backend(self):
+        calls = []
+
+        class RecordingBackend(StdlibJSONBackend):
+            def loads(self, data):
+                calls.append(data)
+                return super(RecordingBackend, self).loads(data)
+
+        self.add_response('history', [{'name': 'event', 'data': '{"a":1}',
+                                       'encoding': 'json'}], False)
+        ably = AblyRest(key='fake.key:secret', use_binary_protocol=False,
+                        json_backend=RecordingBackend())
+        message = ably.channels.get('streamed').history().items[0]
+        self.assertEqual(message.data, {'a': 1})
+        # the response body and the payload of the message
+        self.assertEqual(len(calls), 2)
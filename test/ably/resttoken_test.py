@@ -9,7 +9,7 @@ from ably import AblyException
 from ably import AblyRest
 from ably import Capability
 from ably.types.tokendetails import TokenDetails
-from ably.types.tokenrequest import TokenRequest
+from ably.types.tokenrequest import TokenRequest, TokenRequestFactory
 
 from test.ably.restsetup import RestSetup
 from test.ably.utils import VaryByProtocolTestsMetaclass, dont_vary_protocol, BaseTestCase
@@ -306,3 +306,49 @@ class TestCreateTokenRequest(BaseTestCase):
             token_params, key_secret='a_secret', key_name='a_key_name')
         self.assertEqual(
             token_request.mac, 'sYkCH0Un+WgzI7/Nhy0BoQIKq9HmjKynCRs4E3qAbGQ=')
+
+
+class TestTokenRequestFactory(BaseTestCase):
+
+    def test_signs_like_token_request(self):
+        factory = TokenRequestFactory(key='a_key_name:a_secret')
+        token_request = factory.create(ttl=1000, client_id='a_id',
+                                       timestamp=1000, nonce='abcde100')
+        self.assertEqual(
+            token_request.mac, 'sYkCH0Un+WgzI7/Nhy0BoQIKq9HmjKynCRs4E3qAbGQ=')
+        self.assertEqual(token_request.key_name, 'a_key_name')
+
+        capability = {'channel': ['subscribe', 'publish']}
+        token_request = factory.create(ttl=1000, capability=capability)
+        expected = TokenRequest(
+            key_name='a_key_name', client_id=None, nonce=token_request.nonce,
+            capability=six.text_type(Capability(capability)), ttl=1000,
+            timestamp=token_request.timestamp)
+        expected.sign_request(b'a_secret')
+        self.assertEqual(token_request.to_dict(), expected.to_dict())
+        self.assertEqual(len(token_request.nonce), 16)
+
+    def test_create_many(self):
+        factory = TokenRequestFactory(key_name='a_key_name', key_secret='a_secret',
+                                      ttl=2000, capability={'*': ['subscribe']})
+        token_requests = factory.create_many(
+            [{'client_id': 'client%d' % i} for i in range(3)] +
+            [{'ttl': 1000, 'capability': '{"a":["publish"]}', 'timestamp': 5}],
+            timestamp=1000)
+        self.assertEqual([r.client_id for r in token_requests],
+                         ['client0', 'client1', 'client2', None])
+        self.assertEqual([r.ttl for r in token_requests], [2000] * 3 + [1000])
+        self.assertEqual([r.timestamp for r in token_requests], [1000] * 3 + [5])
+        self.assertEqual(token_requests[0].capability, '{"*": ["subscribe"]}')
+        self.assertEqual(token_requests[3].capability, '{"a": ["publish"]}')
+        self.assertEqual(len(set(r.nonce for r in token_requests)), 4)
+        self.assertEqual(len(set(r.mac for r in token_requests)), 4)
+
+    def test_capability_strings_are_cached(self):
+        factory = TokenRequestFactory(key='a_key_name:a_secret')
+        string = factory.capability_string({'b': ['subscribe', 'publish'], 'a': '*'})
+        self.assertEqual(string, '{"a": ["*"], "b": ["publish", "subscribe"]}')
+        self.assertIs(factory.capability_string({'a': ['*'], 'b': ['publish', 'subscribe']}),
+                      factory.capability_string({'a': '*', 'b': ['subscribe', 'publish']}))
+        self.assertEqual(factory.capability_string({}), '{}')
+        self.assertEqual(factory.capability_string(None), '')
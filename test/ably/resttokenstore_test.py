@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+import threading
+import time
+
+from ably import AblyRest
+from ably.types.tokendetails import TokenDetails
+from ably.util.tokenstore import FileTokenStore, RedisTokenStore
+from test.ably.utils import BaseTestCase
+
+
+class FakeRedis(object):
+    """The part of redis.Redis used by RedisTokenStore"""
+
+    def __init__(self):
+        self.values = {}
+        self.locks = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, px=None):
+        self.values[key] = value.encode('utf-8')
+        self.px = px
+
+    def lock(self, name, timeout=None, blocking_timeout=None, thread_local=True):
+        return self.locks.setdefault(name, threading.Lock())
+
+
+class TestTokenStore(BaseTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.token_requests = []
+
+    def auth_callback(self, token_params):
+        self.token_requests.append(token_params)
+        now = time.time() * 1000
+        return TokenDetails('token%d' % len(self.token_requests),
+                            issued=now, expires=now + 3600000,
+                            capability={'*': ['*']})
+
+    def client(self, store, **kwargs):
+        return AblyRest(auth_callback=self.auth_callback, token_store=store,
+                        **kwargs)
+
+    def test_file_store(self):
+        store = FileTokenStore(self.directory)
+        self.assertIsNone(store.get('key'))
+        token = TokenDetails('a_token', issued=1, expires=2, client_id='client',
+                             capability={'channel': ['publish']})
+        store.set('key', token)
+        stored = store.get('key')
+        self.assertEqual(stored.token, 'a_token')
+        self.assertEqual(stored.expires, 2)
+        self.assertEqual(stored.client_id, 'client')
+        self.assertEqual(stored.capability, token.capability)
+        with store.lock('key'):
+            pass
+
+    def test_clients_share_stored_token(self):
+        store = FileTokenStore(self.directory)
+        first = self.client(store).auth.authorise()
+        second = self.client(store).auth.authorise()
+        self.assertEqual(second.token, first.token)
+        self.assertEqual(len(self.token_requests), 1)
+
+        # different token params get a token of their own
+        self.client(store, default_token_params={'ttl': 1000}).auth.authorise()
+        self.assertEqual(len(self.token_requests), 2)
+
+    def test_concurrent_clients_request_one_token(self):
+        store = FileTokenStore(self.directory)
+        auth_callback = self.auth_callback
+
+        def slow_auth_callback(token_params):
+            time.sleep(0.1)
+            return auth_callback(token_params)
+        self.auth_callback = slow_auth_callback
+
+        clients = [self.client(store) for _ in range(4)]
+        threads = [threading.Thread(target=client.auth.authorise)
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.token_requests), 1)
+        self.assertEqual(set(client.auth.token_details.token for client in clients),
+                         set(['token1']))
+
+    def test_forced_authorise_skips_stored_token(self):
+        store = FileTokenStore(self.directory)
+        ably = self.client(store)
+        first = ably.auth.authorise()
+        second = ably.auth.authorise(force=True)
+        self.assertNotEqual(second.token, first.token)
+        self.assertEqual(self.client(store).auth.authorise().token, second.token)
+
+    def test_expired_stored_token_is_not_used(self):
+        store = FileTokenStore(self.directory)
+        ably = self.client(store)
+        key = ably.auth._token_store_key(
+            {'client_id': None}, ably.auth.auth_options.auth_options)
+        store.set(key, TokenDetails('expired', expires=time.time() * 1000))
+        self.assertEqual(ably.auth.authorise().token, 'token1')
+        self.assertEqual(store.get(key).token, 'token1')
+
+    def test_redis_store(self):
+        redis = FakeRedis()
+        store = RedisTokenStore(redis)
+        first = self.client(store).auth.authorise()
+        self.assertEqual(self.client(store).auth.authorise().token, first.token)
+        self.assertEqual(len(self.token_requests), 1)
+        key, = redis.values
+        self.assertTrue(key.startswith('ably:token:'))
+        self.assertTrue(3590000 < redis.px <= 3600000)
+
+    def test_failing_lock_release_keeps_token(self):
+        class ExpiredLock(object):
+            def acquire(self):
+                return True
+
+            def release(self):
+                raise RuntimeError("Cannot release a lock that's no longer owned")
+
+        redis = FakeRedis()
+        redis.lock = lambda name, **kwargs: ExpiredLock()
+        ably = self.client(RedisTokenStore(redis))
+        self.assertEqual(ably.auth.authorise().token, 'token1')
+        self.assertEqual(ably.auth.token_details.token, 'token1')